@@ -3,8 +3,12 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import Awaitable, Callable, Dict, List
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Mapping, Optional, Set, Tuple
 
+from .automation_metrics import AutomationMetrics
+from .automation_queue import BoundedEventQueue, coalesce_key
+from .automation_routing import RuleIndex, RuleSubscription
 from .device_models import Schedule, SensorEvent, UserContext
 from .lighting import LightingController
 from .state import ScheduleStore
@@ -12,42 +16,329 @@ from .state import ScheduleStore
 LOGGER = logging.getLogger(__name__)
 
 AutomationRule = Callable[[SensorEvent, LightingController], Awaitable[None]]
+ShardKey = Callable[[SensorEvent], Hashable]
+
+
+def default_shard_key(event: SensorEvent) -> Hashable:
+    """Serialise events per fixture when the payload names one, else per zone, else per topic."""
+
+    payload = event.payload if isinstance(event.payload, dict) else {}
+    for field in ("fixture", "address", "zone"):
+        value = payload.get(field)
+        if value is not None and isinstance(value, Hashable):
+            return value
+    return event.topic
+
+
+class EventCoalescer:
+    """Keep only the newest event per (zone, measurement) within a window.
+
+    The first event for a key is delivered at once (leading edge) and opens
+    a window; later events in the window replace one another, and whichever
+    is newest is delivered when the window closes (trailing edge), opening
+    the next window.  A steady stream is thus cut to about one event per
+    window while an isolated reading is never delayed.  Events without a
+    zone or measurement pass straight through.  ``windows`` overrides the
+    window per measurement; a window of zero disables coalescing for that
+    measurement.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[SensorEvent], None],
+        window_seconds: float,
+        windows: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        self._deliver = deliver
+        self._window = max(window_seconds, 0.0)
+        self._windows = dict(windows or {})
+        self._pending: Dict[Tuple[Hashable, Hashable], SensorEvent] = {}
+        self._timers: Dict[Tuple[Hashable, Hashable], asyncio.TimerHandle] = {}
+        self.coalesced = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def window_for(self, measurement: Hashable) -> float:
+        return self._windows.get(measurement, self._window) if isinstance(measurement, str) else self._window
+
+    def offer(self, event: SensorEvent) -> bool:
+        """Hold ``event`` for coalescing; returns ``False`` if it should be delivered now."""
+
+        key = coalesce_key(event)
+        if key is None or self.window_for(key[1]) <= 0:
+            return False
+        if key not in self._timers:
+            self._open(key)
+            return False
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = event
+        return True
+
+    def _open(self, key: Tuple[Hashable, Hashable]) -> None:
+        self._timers[key] = asyncio.get_running_loop().call_later(self.window_for(key[1]), self._release, key)
+
+    def _release(self, key: Tuple[Hashable, Hashable]) -> None:
+        self._timers.pop(key, None)
+        event = self._pending.pop(key, None)
+        if event is not None:
+            # The burst is still going: keep throttling from this delivery.
+            self._open(key)
+            self._deliver(event)
+
+    def flush(self) -> None:
+        """Deliver every held event now and close all open windows."""
+
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        pending, self._pending = self._pending, {}
+        for event in pending.values():
+            self._deliver(event)
+
+    def clear(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._pending.clear()
+
+
+class _Shard:
+    """One worker's queue plus its in-flight bookkeeping."""
+
+    def __init__(self, max_in_flight: int, queue_size: int, queue_policy: str) -> None:
+        self.queue = BoundedEventQueue(queue_size, queue_policy)
+        self.slots = asyncio.Semaphore(max_in_flight)
+        # Most recent task per key; the next event for that key waits on it.
+        self.tails: Dict[Hashable, "asyncio.Task[None]"] = {}
+        self.tasks: Set["asyncio.Task[None]"] = set()
+        self.worker: Optional["asyncio.Task[None]"] = None
 
 
 class AutomationEngine:
-    """Simple event-driven automation engine."""
+    """Event-driven automation engine.
+
+    Events carrying a zone and measurement first pass through an
+    ``EventCoalescer`` (``coalesce_seconds``), so a burst of samples from one
+    sensor becomes a single dispatch of the newest reading.  Events are then
+    sharded by ``shard_key`` across ``workers`` queues.  Each shard
+    runs up to ``max_in_flight`` events concurrently, but events sharing a key
+    are dispatched strictly in arrival order, so one fixture never sees its
+    commands reordered while a slow rule in another zone cannot stall it.
+
+    Shard queues hold at most ``queue_size`` events; ``queue_policy`` (see
+    ``QUEUE_POLICIES``) decides whether publishers wait or events are dropped
+    or coalesced when a shard falls behind.
+    """
 
-    def __init__(self, controller: LightingController, schedule_store: ScheduleStore) -> None:
+    def __init__(
+        self,
+        controller: LightingController,
+        schedule_store: ScheduleStore,
+        workers: int = 4,
+        max_in_flight: int = 4,
+        shard_key: ShardKey = default_shard_key,
+        coalesce_seconds: float = 0.0,
+        coalesce_windows: Optional[Mapping[str, float]] = None,
+        queue_size: int = 1024,
+        queue_policy: str = "block",
+        recorder: Optional[Callable[[SensorEvent], None]] = None,
+    ) -> None:
         self._controller = controller
         self._schedule_store = schedule_store
         self._rules: List[AutomationRule] = []
-        self._queue: "asyncio.Queue[SensorEvent]" = asyncio.Queue()
+        self._rule_names: List[str] = []
+        self._index = RuleIndex()
+        self.metrics = AutomationMetrics()
+        self._shard_key = shard_key
+        self._shards = [
+            _Shard(max(max_in_flight, 1), queue_size, queue_policy) for _ in range(max(workers, 1))
+        ]
+        # Puts waiting on a full ``block`` queue for events released by the coalescer.
+        self._deferred_puts: Set["asyncio.Task[None]"] = set()
+        self._coalescer = EventCoalescer(self._enqueue, coalesce_seconds, coalesce_windows)
+        # Sees every published event before coalescing, e.g. EventLogWriter.append.
+        self._recorder = recorder
         self._running = False
 
-    def register_rule(self, rule: AutomationRule) -> None:
-        LOGGER.debug("Registering automation rule %s", rule)
+    def register_rule(
+        self,
+        rule: AutomationRule,
+        subscription: Optional[RuleSubscription] = None,
+        name: Optional[str] = None,
+    ) -> str:
+        """Register ``rule`` for the events matching ``subscription``.
+
+        Without an explicit subscription the rule's ``subscription`` attribute
+        is used; rules declaring neither receive every event.  Returns the name
+        the rule is reported under in metrics (its factory name by default,
+        suffixed ``#n`` when registered more than once).
+        """
+
+        subscription = subscription or getattr(rule, "subscription", None) or RuleSubscription()
+        base = name or getattr(rule, "__qualname__", None) or repr(rule)
+        base = base.split(".<locals>", 1)[0]
+        rule_name, suffix = base, 1
+        while rule_name in self._rule_names:
+            suffix += 1
+            rule_name = f"{base}#{suffix}"
+        LOGGER.debug("Registering automation rule %s for %s", rule_name, subscription)
+        self._index.add(len(self._rules), subscription)
         self._rules.append(rule)
+        self._rule_names.append(rule_name)
+        self.metrics.register(rule_name)
+        return rule_name
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _shard_for(self, key: Hashable) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    @property
+    def coalesced_events(self) -> int:
+        return self._coalescer.coalesced
+
+    def queue_stats(self) -> Dict[str, object]:
+        """Depth, drop, coalesce and high-water counters summed over the shards."""
+
+        shards = [shard.queue.stats() for shard in self._shards]
+        return {
+            "policy": shards[0]["policy"],
+            "shards": len(shards),
+            "capacity": sum(stats["capacity"] for stats in shards),
+            "depth": sum(stats["depth"] for stats in shards),
+            "highWater": max(stats["highWater"] for stats in shards),
+            "dropped": sum(stats["dropped"] for stats in shards),
+            "coalesced": sum(stats["coalesced"] for stats in shards),
+            "windowCoalesced": self._coalescer.coalesced,
+            "windowPending": self._coalescer.pending,
+        }
+
+    def _enqueue(self, event: SensorEvent) -> None:
+        queue = self._shard_for(self._shard_key(event)).queue
+        if not queue.offer(event):
+            # At most one held event per coalescer key can be waiting here.
+            task = asyncio.get_running_loop().create_task(queue.put(event))
+            self._deferred_puts.add(task)
+            task.add_done_callback(self._deferred_puts.discard)
 
     async def publish(self, event: SensorEvent) -> None:
-        await self._queue.put(event)
+        if self._recorder is not None:
+            self._recorder(event)
+        if not self._coalescer.offer(event):
+            await self._shard_for(self._shard_key(event)).queue.put(event)
+
+    def offer(self, event: SensorEvent) -> bool:
+        """Publish without waiting, for producers that must never block (MQTT).
+
+        Must be called on the engine's event loop.  Under the ``block`` policy
+        a full shard refuses the event and counts it as dropped instead of
+        parking a waiter per event, so a stalled engine cannot accumulate an
+        unbounded backlog.  Returns ``False`` if the event was refused.
+        """
+
+        if self._recorder is not None:
+            self._recorder(event)
+        if self._coalescer.offer(event):
+            return True
+        queue = self._shard_for(self._shard_key(event)).queue
+        if queue.offer(event):
+            return True
+        queue.dropped += 1
+        return False
 
     async def start(self) -> None:
-        LOGGER.info("Starting automation engine")
+        """Spawn the shard workers; events published earlier are processed now."""
+
+        if self._running:
+            return
+        LOGGER.info("Starting automation engine with %d workers", len(self._shards))
         self._running = True
-        while self._running:
-            event = await self._queue.get()
-            await self._dispatch(event)
+        for shard in self._shards:
+            shard.worker = asyncio.create_task(self._consume(shard))
 
     async def stop(self) -> None:
         LOGGER.info("Stopping automation engine")
         self._running = False
+        self._coalescer.clear()
+        pending = list(self._deferred_puts)
+        for task in pending:
+            task.cancel()
+        for shard in self._shards:
+            if shard.worker is not None:
+                shard.worker.cancel()
+                pending.append(shard.worker)
+                shard.worker = None
+            for task in shard.tasks:
+                task.cancel()
+            pending.extend(shard.tasks)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def join(self) -> None:
+        """Wait until every published event has been dispatched."""
+
+        self._coalescer.flush()
+        if self._deferred_puts:
+            await asyncio.gather(*self._deferred_puts)
+        for shard in self._shards:
+            await shard.queue.join()
+
+    async def _consume(self, shard: _Shard) -> None:
+        while True:
+            event, enqueued_at = await shard.queue.get_timed()
+            await shard.slots.acquire()
+            key = self._shard_key(event)
+            task = asyncio.create_task(self._run_in_order(shard, key, event, enqueued_at, shard.tails.get(key)))
+            shard.tails[key] = task
+            shard.tasks.add(task)
+            task.add_done_callback(shard.tasks.discard)
+
+    async def _run_in_order(
+        self,
+        shard: _Shard,
+        key: Hashable,
+        event: SensorEvent,
+        enqueued_at: float,
+        previous: Optional["asyncio.Task[None]"],
+    ) -> None:
+        try:
+            if previous is not None and not previous.done():
+                await asyncio.wait((previous,))
+            self.metrics.observe_queue_wait(time.perf_counter() - enqueued_at)
+            await self._dispatch(event)
+        finally:
+            shard.slots.release()
+            shard.queue.task_done()
+            if shard.tails.get(key) is asyncio.current_task():
+                del shard.tails[key]
+
+    def matching_rules(self, event: SensorEvent) -> List[AutomationRule]:
+        return [self._rules[rule_id] for rule_id in self._index.route(event)]
 
     async def _dispatch(self, event: SensorEvent) -> None:
-        for rule in self._rules:
+        for rule_id in self._index.route(event):
+            rule_name = self._rule_names[rule_id]
+            failed = False
+            started = time.perf_counter()
             try:
-                await rule(event, self._controller)
+                await self._rules[rule_id](event, self._controller)
             except Exception as exc:  # pylint: disable=broad-except
-                LOGGER.error("Automation rule %s failed: %s", rule, exc)
+                failed = True
+                LOGGER.error("Automation rule %s failed: %s", rule_name, exc)
+            finally:
+                self.metrics.observe_rule(rule_name, time.perf_counter() - started, failed)
+
+    def stats(self) -> Dict[str, object]:
+        """Per-rule timings, queue wait time and queue counters as JSON."""
+
+        snapshot = self.metrics.snapshot()
+        snapshot["queue"] = self.queue_stats()
+        return snapshot
 
     def apply_schedule(self, schedule: Schedule, user: UserContext) -> None:
         if not user.can_access_group(schedule.group):
@@ -55,9 +346,9 @@ class AutomationEngine:
         LOGGER.info("Applying schedule %s for group %s", schedule.name, schedule.group)
         self._schedule_store.upsert(schedule)
         try:
-            self._controller.set_output(schedule.group, schedule.brightness, schedule.spectrum)
+            self._controller.set_target_output(schedule.group, schedule.brightness, schedule.spectrum)
         except ValueError:
-            LOGGER.warning("Schedule %s references unknown fixture %s", schedule.schedule_id, schedule.group)
+            LOGGER.warning("Schedule %s references unknown fixture or group %s", schedule.schedule_id, schedule.group)
 
     def enforce_fail_safe(self) -> None:
         LOGGER.info("Enforcing lighting fail-safe defaults")
@@ -65,7 +356,11 @@ class AutomationEngine:
 
 
 def lux_balancing_rule(zone_to_fixture: Dict[str, str], target_lux: int) -> AutomationRule:
-    """Create a rule that adjusts lighting based on lux sensor events."""
+    """Create a rule that adjusts lighting based on lux sensor events.
+
+    ``zone_to_fixture`` values may be fixture addresses or ``zone:``/``group:``
+    targets; the first fixture's level is the reference for the whole target.
+    """
 
     async def rule(event: SensorEvent, controller: LightingController) -> None:
         if event.payload.get("measurement") != "illuminance":
@@ -73,16 +368,18 @@ def lux_balancing_rule(zone_to_fixture: Dict[str, str], target_lux: int) -> Auto
         zone = event.payload.get("zone")
         if zone not in zone_to_fixture:
             return
-        fixture_address = zone_to_fixture[zone]
+        target = zone_to_fixture[zone]
         current_lux = event.payload.get("value")
         if current_lux is None:
             return
         delta = target_lux - int(current_lux)
-        state = controller.last_known_state(fixture_address) or {"brightness": 0, "spectrum": None}
+        reference = (controller.index.resolve(target) or [target])[0]
+        state = controller.last_known_state(reference) or {"brightness": 0, "spectrum": None}
         new_brightness = max(0, min(100, state.get("brightness", 0) + int(delta * 0.1)))
-        LOGGER.debug("Lux rule adjusting %s to %s based on delta %s", fixture_address, new_brightness, delta)
-        controller.set_output(fixture_address, new_brightness, state.get("spectrum"))
+        LOGGER.debug("Lux rule adjusting %s to %s based on delta %s", target, new_brightness, delta)
+        controller.set_target_output(target, new_brightness, state.get("spectrum"))
 
+    rule.subscription = RuleSubscription.of(measurements=("illuminance",), zones=zone_to_fixture)
     return rule
 
 
@@ -95,17 +392,21 @@ def occupancy_rule(zone_to_fixture: Dict[str, str], occupied_brightness: int, va
         zone = event.payload.get("zone")
         if zone not in zone_to_fixture:
             return
-        fixture_address = zone_to_fixture[zone]
+        target = zone_to_fixture[zone]
         occupied = bool(event.payload.get("value"))
         target_brightness = occupied_brightness if occupied else vacant_brightness
-        LOGGER.debug("Occupancy rule setting %s to %s", fixture_address, target_brightness)
-        controller.set_output(fixture_address, target_brightness)
+        LOGGER.debug("Occupancy rule setting %s to %s", target, target_brightness)
+        controller.set_target_output(target, target_brightness)
 
+    rule.subscription = RuleSubscription.of(measurements=("occupancy",), zones=zone_to_fixture)
     return rule
 
 
 __all__ = [
     "AutomationEngine",
+    "EventCoalescer",
+    "RuleSubscription",
+    "default_shard_key",
     "lux_balancing_rule",
     "occupancy_rule",
 ]
@@ -0,0 +1,169 @@
+"""Latency histograms and counters for automation rules, with Prometheus text export."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Upper bounds in seconds; sized around a control loop budget of tens of milliseconds.
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations in seconds."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "maximum")
+
+    def __init__(self, bounds: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.bounds: Tuple[float, ...] = tuple(sorted(bounds))
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside the bucket that holds it."""
+
+        if not self.count:
+            return None
+        rank = min(max(q, 0.0), 1.0) * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = min(self.bounds[index], self.maximum) if index < len(self.bounds) else self.maximum
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.maximum
+
+    def summary(self) -> Dict[str, Any]:
+        def millis(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 3) if value is not None else None
+
+        return {
+            "count": self.count,
+            "meanMs": millis(self.total / self.count) if self.count else None,
+            "p50Ms": millis(self.quantile(0.5)),
+            "p95Ms": millis(self.quantile(0.95)),
+            "p99Ms": millis(self.quantile(0.99)),
+            "maxMs": millis(self.maximum) if self.count else None,
+        }
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        running = 0
+        rows = []
+        for bound, bucket_count in zip(self.bounds + (float("inf"),), self.counts):
+            running += bucket_count
+            rows.append(("+Inf" if bound == float("inf") else repr(bound), running))
+        return rows
+
+
+class RuleMetrics:
+    __slots__ = ("invocations", "errors", "latency")
+
+    def __init__(self) -> None:
+        self.invocations = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+
+class AutomationMetrics:
+    """Per-rule execution timings plus event queue wait time.
+
+    Updated only from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self) -> None:
+        self._rules: Dict[str, RuleMetrics] = {}
+        self.queue_wait = LatencyHistogram()
+
+    def register(self, rule_name: str) -> None:
+        self._rules.setdefault(rule_name, RuleMetrics())
+
+    def observe_rule(self, rule_name: str, seconds: float, failed: bool = False) -> None:
+        metrics = self._rules.get(rule_name)
+        if metrics is None:
+            metrics = self._rules[rule_name] = RuleMetrics()
+        metrics.invocations += 1
+        if failed:
+            metrics.errors += 1
+        metrics.latency.observe(seconds)
+
+    def observe_queue_wait(self, seconds: float) -> None:
+        self.queue_wait.observe(max(seconds, 0.0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "rules": {
+                name: {"invocations": metrics.invocations, "errors": metrics.errors, "latency": metrics.latency.summary()}
+                for name, metrics in sorted(self._rules.items())
+            },
+            "queueWait": self.queue_wait.summary(),
+        }
+
+    def render_prometheus(self, queue: Optional[Mapping[str, Any]] = None) -> str:
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, series: Iterable[Tuple[str, LatencyHistogram]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in series:
+                joiner = "," if labels else ""
+                for bound, count in hist.cumulative():
+                    lines.append(f'{name}_bucket{{{labels}{joiner}le="{bound}"}} {count}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_sum{suffix} {hist.total!r}")
+                lines.append(f"{name}_count{suffix} {hist.count}")
+
+        rules = sorted(self._rules.items())
+        histogram(
+            "automation_rule_duration_seconds",
+            "Automation rule execution time.",
+            ((f'rule="{_escape(name)}"', metrics.latency) for name, metrics in rules),
+        )
+        for metric, attribute, help_text in (
+            ("automation_rule_invocations_total", "invocations", "Automation rule invocations."),
+            ("automation_rule_errors_total", "errors", "Automation rule invocations that raised."),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, metrics in rules:
+                lines.append(f'{metric}{{rule="{_escape(name)}"}} {getattr(metrics, attribute)}')
+        histogram(
+            "automation_queue_wait_seconds",
+            "Time from publish until an event starts dispatching.",
+            [("", self.queue_wait)],
+        )
+        if queue:
+            for metric, key, kind, help_text in (
+                ("automation_queue_depth", "depth", "gauge", "Events waiting in automation queues."),
+                ("automation_queue_high_water", "highWater", "gauge", "Deepest any automation shard queue has been."),
+                ("automation_queue_dropped_total", "dropped", "counter", "Events dropped by the queue policy."),
+                ("automation_queue_coalesced_total", "coalesced", "counter", "Queued events replaced by newer ones."),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric} {queue.get(key, 0)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+__all__ = [
+    "AutomationMetrics",
+    "LATENCY_BUCKETS",
+    "LatencyHistogram",
+    "PROMETHEUS_CONTENT_TYPE",
+]
@@ -0,0 +1,173 @@
+"""Bounded event queue for the automation engine with configurable overflow policies."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+from .device_models import SensorEvent
+
+# What to do with a new event when the queue is full:
+#   block        - publishers wait for space (non-blocking offers are refused)
+#   drop_oldest  - evict the oldest queued event
+#   drop_newest  - discard the new event
+#   coalesce     - replace a queued event with the same (zone, measurement),
+#                  otherwise evict the oldest
+QUEUE_POLICIES: Tuple[str, ...] = ("block", "drop_oldest", "drop_newest", "coalesce")
+
+
+def coalesce_key(event: SensorEvent) -> Optional[Tuple[Hashable, Hashable]]:
+    """Return ``(zone, measurement)`` for events that may supersede each other."""
+
+    payload = event.payload if isinstance(event.payload, dict) else {}
+    zone, measurement = payload.get("zone"), payload.get("measurement")
+    if zone is None or measurement is None:
+        return None
+    if not isinstance(zone, Hashable) or not isinstance(measurement, Hashable):
+        return None
+    return zone, measurement
+
+
+def _wake_next(waiters: Deque["asyncio.Future[None]"]) -> None:
+    while waiters:
+        waiter = waiters.popleft()
+        if not waiter.done():
+            waiter.set_result(None)
+            return
+
+
+class BoundedEventQueue:
+    """FIFO of sensor events capped at ``maxsize`` with an overflow ``policy``.
+
+    Mirrors the parts of ``asyncio.Queue`` the engine uses (``put``, ``get``,
+    ``task_done``, ``join``) and keeps depth, drop, coalesce and high-water
+    counters for health reporting.
+    """
+
+    def __init__(self, maxsize: int = 1024, policy: str = "block") -> None:
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown automation queue policy {policy!r}; expected one of {QUEUE_POLICIES}")
+        self.maxsize = max(maxsize, 1)
+        self.policy = policy
+        # Slots are [key, event, enqueued_at] so a coalesced event can be swapped
+        # in place; it keeps the slot's original enqueue time.
+        self._items: Deque[List[Any]] = deque()
+        self._by_key: Dict[Hashable, List[Any]] = {}
+        self._getters: Deque["asyncio.Future[None]"] = deque()
+        self._putters: Deque["asyncio.Future[None]"] = deque()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def full(self) -> bool:
+        return len(self._items) >= self.maxsize
+
+    def offer(self, event: SensorEvent) -> bool:
+        """Queue ``event`` without waiting.
+
+        Returns ``False`` only under the ``block`` policy when the queue is
+        full; the other policies always make room or drop the event (counted
+        in ``dropped``).
+        """
+
+        key = coalesce_key(event) if self.policy == "coalesce" else None
+        if key is not None:
+            slot = self._by_key.get(key)
+            if slot is not None:
+                slot[1] = event
+                self.coalesced += 1
+                return True
+        if self.full():
+            if self.policy == "block":
+                return False
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return True
+            self._evict_oldest()
+        slot = [key, event, time.perf_counter()]
+        self._items.append(slot)
+        if key is not None:
+            self._by_key[key] = slot
+        self._unfinished += 1
+        self._finished.clear()
+        if len(self._items) > self.high_water:
+            self.high_water = len(self._items)
+        _wake_next(self._getters)
+        return True
+
+    def _evict_oldest(self) -> None:
+        slot = self._items.popleft()
+        if slot[0] is not None and self._by_key.get(slot[0]) is slot:
+            del self._by_key[slot[0]]
+        self.dropped += 1
+        self.task_done()
+
+    async def put(self, event: SensorEvent) -> None:
+        while not self.offer(event):
+            putter = asyncio.get_running_loop().create_future()
+            self._putters.append(putter)
+            try:
+                await putter
+            except BaseException:
+                putter.cancel()
+                with contextlib.suppress(ValueError):
+                    self._putters.remove(putter)
+                if not self.full() and not putter.cancelled():
+                    _wake_next(self._putters)
+                raise
+
+    async def get(self) -> SensorEvent:
+        return (await self.get_timed())[0]
+
+    async def get_timed(self) -> Tuple[SensorEvent, float]:
+        """Return the next event and its ``time.perf_counter()`` enqueue timestamp."""
+
+        while not self._items:
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                getter.cancel()
+                with contextlib.suppress(ValueError):
+                    self._getters.remove(getter)
+                if self._items and not getter.cancelled():
+                    _wake_next(self._getters)
+                raise
+        slot = self._items.popleft()
+        if slot[0] is not None and self._by_key.get(slot[0]) is slot:
+            del self._by_key[slot[0]]
+        _wake_next(self._putters)
+        return slot[1], slot[2]
+
+    def task_done(self) -> None:
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        if self._unfinished:
+            await self._finished.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "capacity": self.maxsize,
+            "depth": len(self._items),
+            "highWater": self.high_water,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+__all__ = ["BoundedEventQueue", "QUEUE_POLICIES", "coalesce_key"]
@@ -0,0 +1,272 @@
+"""Record the sensor event stream and replay it through the automation engine.
+
+Events are logged as gzip-compressed JSON lines ``[epoch_seconds, topic,
+payload]``.  Replays run on an event loop with a virtual clock: when the loop
+would sleep it jumps straight to the next timer, so coalescing windows and
+rule timers behave as they did live while a day of traffic replays in
+seconds.  Each fixture command is recorded against the virtual clock.
+"""
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import logging
+import selectors
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .automation import AutomationEngine
+from .config import LightingFixture
+from .device_models import SensorEvent
+from .lighting import LightingController
+from .state import LightingState, ScheduleStore
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _epoch(moment: datetime) -> float:
+    # MQTT events carry naive UTC timestamps (datetime.utcnow()).
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class EventLogWriter:
+    """Append sensor events to a gzip JSON-lines log; safe to call from any thread."""
+
+    def __init__(self, path: Path, flush_every: int = 256) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Appending adds a new gzip member; readers handle multi-member files.
+        self._handle = gzip.open(self.path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._flush_every = max(flush_every, 1)
+        self._unflushed = 0
+        self.written = 0
+
+    def append(self, event: SensorEvent) -> None:
+        line = json.dumps([_epoch(event.received_at), event.topic, event.payload], separators=(",", ":"), default=str)
+        with self._lock:
+            if self._handle is None:
+                return
+            self._handle.write(line + "\n")
+            self.written += 1
+            self._unflushed += 1
+            if self._unflushed >= self._flush_every:
+                self._handle.flush()
+                self._unflushed = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+
+def read_event_log(path: Path) -> Iterator[SensorEvent]:
+    """Yield the events of a log written by ``EventLogWriter``, skipping damaged lines."""
+
+    with gzip.open(Path(path), "rt", encoding="utf-8") as handle:
+        try:
+            for number, line in enumerate(handle, start=1):
+                try:
+                    ts, topic, payload = json.loads(line)
+                except (ValueError, TypeError):
+                    LOGGER.warning("Skipping unreadable event log line %d in %s", number, path)
+                    continue
+                yield SensorEvent(
+                    topic=topic,
+                    payload=payload,
+                    received_at=datetime.fromtimestamp(ts, timezone.utc),
+                )
+        except EOFError:
+            # A writer that did not close cleanly leaves a truncated last member.
+            LOGGER.warning("Event log %s ends with a truncated block", path)
+
+
+class _VirtualClock:
+    __slots__ = ("now",)
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+
+class _VirtualSelector(selectors.DefaultSelector):  # type: ignore[misc, valid-type]
+    """Poll without blocking and advance the virtual clock by the would-be timeout."""
+
+    def __init__(self, clock: _VirtualClock) -> None:
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout: Optional[float] = None):  # type: ignore[override]
+        ready = super().select(0)
+        if not ready:
+            if timeout is None:
+                raise RuntimeError("Replay stalled: no ready callbacks and no timers pending")
+            self._clock.now += timeout
+        return ready
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """Event loop whose ``time()`` only moves when the loop would otherwise sleep."""
+
+    def __init__(self) -> None:
+        self._clock = _VirtualClock()
+        super().__init__(selector=_VirtualSelector(self._clock))
+
+    def time(self) -> float:
+        return self._clock.now
+
+
+class RecordingLightingState(LightingState):
+    """LightingState that keeps every requested setting against the loop's clock.
+
+    Entries are flagged ``changed`` when they altered the fixture's output.
+    """
+
+    def __init__(self, fixtures: Iterable[LightingFixture], clock: Callable[[], float]) -> None:
+        super().__init__(fixtures)
+        self._clock = clock
+        self.timeline: List[Dict[str, Any]] = []
+
+    def apply_settings(self, settings: Mapping[str, Tuple[int, Optional[int]]]) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            before = self.version
+            applied = super().apply_settings(settings)
+        now = round(self._clock(), 6)
+        self.timeline.extend(
+            {
+                "t": now,
+                "address": address,
+                "brightness": brightness,
+                "spectrum": spectrum,
+                "changed": applied[address]["version"] > before,
+            }
+            for address, (brightness, spectrum) in settings.items()
+        )
+        return applied
+
+
+@dataclass
+class ReplayResult:
+    events: int
+    commands: int
+    virtual_seconds: float
+    wall_seconds: float
+    started_at: Optional[datetime]
+    timeline: List[Dict[str, Any]] = field(default_factory=list)
+    automation: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def speedup(self) -> float:
+        return self.virtual_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def changes(self) -> int:
+        """Commands that actually altered a fixture's output."""
+
+        return sum(1 for entry in self.timeline if entry.get("changed", True))
+
+    def commands_by_fixture(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for entry in self.timeline:
+            counts[entry["address"]] = counts.get(entry["address"], 0) + 1
+        return counts
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "events": self.events,
+            "commands": self.commands,
+            "changes": self.changes,
+            "commandsByFixture": self.commands_by_fixture(),
+            "virtualSeconds": round(self.virtual_seconds, 3),
+            "wallSeconds": round(self.wall_seconds, 3),
+            "eventsPerSecond": round(self.events_per_second, 1),
+            "speedup": round(self.speedup, 1),
+            "automation": self.automation,
+        }
+
+
+def replay_events(
+    events: Iterable[SensorEvent],
+    fixtures: Iterable[LightingFixture],
+    configure: Callable[[AutomationEngine], None],
+    settle_seconds: float = 5.0,
+    **engine_options: Any,
+) -> ReplayResult:
+    """Replay ``events`` (oldest first) through a fresh engine on a virtual clock.
+
+    ``configure`` registers the rules under test.  Event ``received_at``
+    gaps become virtual sleeps; after the last event the clock runs on for
+    ``settle_seconds`` so pending coalescing windows close.  Must be called
+    outside a running event loop.
+    """
+
+    fixtures = list(fixtures)
+    loop = VirtualClockEventLoop()
+    state = RecordingLightingState(fixtures, loop.time)
+    engine: Optional[AutomationEngine] = None
+    count = 0
+    first: Optional[datetime] = None
+
+    async def drive() -> None:
+        nonlocal engine, count, first
+        engine = AutomationEngine(LightingController(fixtures, state), ScheduleStore(), **engine_options)
+        configure(engine)
+        # Start the timeline at the first replayed command, not at the baseline defaults.
+        state.timeline.clear()
+        await engine.start()
+        origin: Optional[float] = None
+        for event in events:
+            moment = _epoch(event.received_at)
+            if origin is None:
+                origin, first = moment, event.received_at
+            delay = (moment - origin) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await engine.publish(event)
+            count += 1
+        await asyncio.sleep(settle_seconds)
+        await engine.join()
+        await engine.stop()
+
+    began = time.perf_counter()
+    try:
+        loop.run_until_complete(drive())
+    finally:
+        loop.close()
+    wall = time.perf_counter() - began
+
+    timeline = state.timeline
+    if first is not None:
+        base = first if first.tzinfo is not None else first.replace(tzinfo=timezone.utc)
+        for entry in timeline:
+            entry["at"] = (base + timedelta(seconds=entry["t"])).isoformat()
+    return ReplayResult(
+        events=count,
+        commands=len(timeline),
+        virtual_seconds=loop.time(),
+        wall_seconds=wall,
+        started_at=first,
+        timeline=timeline,
+        automation=engine.stats() if engine is not None else {},
+    )
+
+
+__all__ = [
+    "EventLogWriter",
+    "RecordingLightingState",
+    "ReplayResult",
+    "VirtualClockEventLoop",
+    "read_event_log",
+    "replay_events",
+]
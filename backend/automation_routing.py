@@ -0,0 +1,150 @@
+"""Subscription index that routes sensor events to the automation rules that want them."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .device_models import SensorEvent
+
+
+@dataclass(frozen=True)
+class RuleSubscription:
+    """What a rule listens to.
+
+    ``topics`` are MQTT-style patterns (``+`` matches one level, ``#`` the
+    rest).  ``measurements`` and ``zones`` filter on the event payload;
+    ``None`` means any value.
+    """
+
+    topics: Tuple[str, ...] = ("#",)
+    measurements: Optional[FrozenSet[str]] = None
+    zones: Optional[FrozenSet[str]] = None
+
+    @classmethod
+    def of(
+        cls,
+        topics: Iterable[str] = ("#",),
+        measurements: Optional[Iterable[str]] = None,
+        zones: Optional[Iterable[Any]] = None,
+    ) -> "RuleSubscription":
+        return cls(
+            topics=tuple(topics) or ("#",),
+            measurements=frozenset(measurements) if measurements is not None else None,
+            zones=frozenset(zones) if zones is not None else None,
+        )
+
+
+class _TrieNode:
+    __slots__ = ("children", "rules", "tail_rules")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.rules: Set[int] = set()  # patterns ending exactly here
+        self.tail_rules: Set[int] = set()  # patterns ending in "#" here
+
+
+class TopicTrie:
+    """Trie of MQTT topic patterns supporting ``+`` and ``#`` wildcards."""
+
+    def __init__(self) -> None:
+        self._root = _TrieNode()
+
+    def insert(self, pattern: str, rule_id: int) -> None:
+        node = self._root
+        levels = pattern.split("/")
+        for index, level in enumerate(levels):
+            if level == "#":
+                if index != len(levels) - 1:
+                    raise ValueError(f"'#' must be the last level in topic pattern {pattern!r}")
+                node.tail_rules.add(rule_id)
+                return
+            node = node.children.setdefault(level, _TrieNode())
+        node.rules.add(rule_id)
+
+    def match(self, topic: str) -> Set[int]:
+        matched: Set[int] = set()
+        levels = topic.split("/")
+        frontier = [self._root]
+        for level in levels:
+            next_frontier = []
+            for node in frontier:
+                matched |= node.tail_rules
+                exact = node.children.get(level)
+                if exact is not None:
+                    next_frontier.append(exact)
+                wildcard = node.children.get("+")
+                if wildcard is not None:
+                    next_frontier.append(wildcard)
+            frontier = next_frontier
+            if not frontier:
+                return matched
+        for node in frontier:
+            matched |= node.rules
+            # "a/#" also matches the parent level "a" itself.
+            matched |= node.tail_rules
+        return matched
+
+
+class RuleIndex:
+    """Route events to rule ids by topic, measurement and zone.
+
+    Topic matches are cached per concrete topic, so steady-state routing
+    costs a couple of dictionary lookups plus work proportional to the
+    number of candidate rules rather than the number registered.
+    """
+
+    def __init__(self, topic_cache_size: int = 1024) -> None:
+        self._trie = TopicTrie()
+        self._by_measurement: Dict[str, Set[int]] = {}
+        self._any_measurement: Set[int] = set()
+        self._by_zone: Dict[Any, Set[int]] = {}
+        self._any_zone: Set[int] = set()
+        self._topic_cache: Dict[str, FrozenSet[int]] = {}
+        self._topic_cache_size = topic_cache_size
+
+    def add(self, rule_id: int, subscription: RuleSubscription) -> None:
+        for pattern in subscription.topics:
+            self._trie.insert(pattern, rule_id)
+        if subscription.measurements is None:
+            self._any_measurement.add(rule_id)
+        else:
+            for measurement in subscription.measurements:
+                self._by_measurement.setdefault(measurement, set()).add(rule_id)
+        if subscription.zones is None:
+            self._any_zone.add(rule_id)
+        else:
+            for zone in subscription.zones:
+                self._by_zone.setdefault(zone, set()).add(rule_id)
+        self._topic_cache.clear()
+
+    def _topic_matches(self, topic: str) -> FrozenSet[int]:
+        cached = self._topic_cache.get(topic)
+        if cached is None:
+            if len(self._topic_cache) >= self._topic_cache_size:
+                self._topic_cache.clear()
+            cached = self._topic_cache[topic] = frozenset(self._trie.match(topic))
+        return cached
+
+    def route(self, event: SensorEvent) -> List[int]:
+        """Return the ids of rules interested in ``event`` in registration order."""
+
+        payload = event.payload if isinstance(event.payload, dict) else {}
+        measurement = payload.get("measurement")
+        zone = payload.get("zone")
+        try:
+            measurement_rules = self._by_measurement.get(measurement, ())
+            zone_rules = self._by_zone.get(zone, ())
+        except TypeError:  # unhashable payload values match only unfiltered rules
+            measurement_rules = zone_rules = ()
+        candidates = self._topic_matches(event.topic)
+        selected = [
+            rule_id
+            for rule_id in candidates
+            if (rule_id in self._any_measurement or rule_id in measurement_rules)
+            and (rule_id in self._any_zone or rule_id in zone_rules)
+        ]
+        selected.sort()
+        return selected
+
+
+__all__ = ["RuleIndex", "RuleSubscription", "TopicTrie"]
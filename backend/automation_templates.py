@@ -0,0 +1,473 @@
+"""Compile ``config/automation-templates.json`` rules into in-process automation rules.
+
+Each template rule (trigger / conditions / actions / options) is compiled
+once into a value predicate, a 1440-entry minute-of-day mask and a debounce
+interval.  Compiled rules are indexed by trigger type, so a reading only
+evaluates the thresholds declared for its own measurement.
+
+Actions run through an ``ActionRegistry``.  As in the Node engine, device
+actions (``kasa_control``, ``switchbot_control``, ``ifttt_trigger``) are
+forwarded to the integration endpoints of the Node server, and ``scenario``
+actions run their steps in order.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import operator
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import requests
+
+from .automation import AutomationRule
+from .automation_routing import RuleSubscription
+from .device_models import SensorEvent
+from .lighting import LightingController
+
+LOGGER = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+DEFAULT_DEBOUNCE_MS = 30_000  # matches the Node engine's default
+# The Node server that hosts the Kasa, SwitchBot and IFTTT integration endpoints.
+DEFAULT_ACTION_BASE_URL = "http://127.0.0.1:8091"
+ACTION_TIMEOUT_SECONDS = 10.0
+# Action types that reach real devices or services through ``base_url``.
+DEVICE_ACTION_TYPES = ("kasa_control", "switchbot_control", "ifttt_trigger")
+
+ValuePredicate = Callable[[Any], bool]
+ActionHandler = Callable[[Mapping[str, Any], "TemplateReading"], Awaitable[Any]]
+JsonPoster = Callable[[str, Mapping[str, Any]], Any]
+
+# Scenarios the Node engine ships with (lib/automation-engine.js ``getScenario``).
+SCENARIOS: Dict[str, Tuple[Mapping[str, Any], ...]] = {
+    "security-lighting": (
+        {"type": "kasa_control", "deviceId": "security-light-1", "command": "turnOn"},
+        {"type": "kasa_control", "deviceId": "security-light-2", "command": "turnOn"},
+        {"type": "ifttt_trigger", "event": "security_motion_alert", "data": {"value1": "Motion detected"}},
+    ),
+}
+
+_COMPARATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "eq": operator.eq,
+    "neq": operator.ne,
+}
+
+
+@dataclass(frozen=True)
+class TemplateReading:
+    """A sensor reading in the shape template triggers are written against."""
+
+    type: str
+    value: Any
+    source: Optional[str] = None
+    device_id: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+    @classmethod
+    def from_event(cls, event: SensorEvent) -> Optional["TemplateReading"]:
+        payload = event.payload if isinstance(event.payload, dict) else {}
+        reading_type = payload.get("type") or payload.get("measurement")
+        if not isinstance(reading_type, str):
+            return None
+        device_id = payload.get("deviceId") or payload.get("device_id") or payload.get("zone")
+        return cls(
+            type=reading_type,
+            value=payload.get("value"),
+            source=payload.get("source"),
+            device_id=str(device_id) if device_id is not None else None,
+            timestamp=event.received_at,
+        )
+
+    def interpolate(self, template: str) -> str:
+        return (
+            template.replace("{value}", str(self.value))
+            .replace("{deviceId}", str(self.device_id))
+            .replace("{type}", str(self.type))
+            .replace("{source}", str(self.source))
+            .replace("{timestamp}", self.timestamp.isoformat() if self.timestamp else "")
+        )
+
+
+def compile_value_predicate(spec: Optional[Mapping[str, Any]]) -> ValuePredicate:
+    """Turn a trigger ``value`` block into a predicate over the reading value."""
+
+    if not spec:
+        return lambda value: True
+    op = spec.get("operator")
+    if op in _COMPARATORS:
+        compare, threshold = _COMPARATORS[op], spec.get("threshold")
+        if op in ("eq", "neq"):
+            return lambda value: compare(value, threshold)
+
+        def predicate(value: Any) -> bool:
+            try:
+                return bool(compare(value, threshold))
+            except TypeError:
+                return False
+
+        return predicate
+    if op in ("between", "outside"):
+        bounds = spec.get("range") or {}
+        low, high = float(bounds["min"]), float(bounds["max"])
+        inside = op == "between"
+
+        def in_range(value: Any) -> bool:
+            if not isinstance(value, (int, float)):
+                return False
+            return (low <= value <= high) is inside
+
+        return in_range
+    LOGGER.warning("Unknown trigger operator %r; trigger will always match", op)
+    return lambda value: True
+
+
+def minute_mask(start_hour: float, end_hour: float) -> bytes:
+    """Return a per-minute ``0``/``1`` mask for ``[start, end)`` hours.
+
+    Ranges read as in the Node engine: ``start > end`` wraps past midnight,
+    an end at or beyond 24 runs to the end of the day (so ``0``-``24`` is
+    always active) and ``start == end`` is never active.
+    """
+
+    start = int(round(start_hour * 60))
+    end = int(round(end_hour * 60))
+    mask = bytearray(MINUTES_PER_DAY)
+    if start <= end:
+        low, high = max(start, 0), min(end, MINUTES_PER_DAY)
+        if low < high:
+            mask[low:high] = b"\x01" * (high - low)
+    else:
+        low, high = min(max(start, 0), MINUTES_PER_DAY), min(max(end, 0), MINUTES_PER_DAY)
+        mask[low:] = b"\x01" * (MINUTES_PER_DAY - low)
+        mask[:high] = b"\x01" * high
+    return bytes(mask)
+
+
+def _combine_masks(masks: Iterable[bytes]) -> Optional[bytes]:
+    combined: Optional[bytes] = None
+    for mask in masks:
+        combined = mask if combined is None else bytes(a & b for a, b in zip(combined, mask))
+    return combined
+
+
+@dataclass
+class CompiledTemplateRule:
+    """One template rule reduced to the checks needed at ingest time."""
+
+    rule_id: str
+    name: str
+    trigger_type: str
+    predicate: ValuePredicate
+    actions: Tuple[Mapping[str, Any], ...]
+    debounce_seconds: float
+    source: Optional[str] = None
+    device_id: Optional[str] = None
+    minutes: Optional[bytes] = None
+    days: Optional[frozenset] = None
+    template: Optional[str] = None
+    last_fired: Optional[float] = field(default=None, compare=False)
+
+    def matches(self, reading: TemplateReading) -> bool:
+        if self.source is not None and self.source != reading.source:
+            return False
+        if self.device_id is not None and self.device_id != reading.device_id:
+            return False
+        return self.predicate(reading.value)
+
+    def active_at(self, moment: datetime) -> bool:
+        if self.minutes is not None and not self.minutes[moment.hour * 60 + moment.minute]:
+            return False
+        # JavaScript day numbering (0 = Sunday), as written in the templates.
+        if self.days is not None and (moment.weekday() + 1) % 7 not in self.days:
+            return False
+        return True
+
+
+def compile_template_rule(rule: Mapping[str, Any], template: Optional[str] = None) -> CompiledTemplateRule:
+    """Compile one JSON rule; raises ``ValueError`` if it cannot be evaluated."""
+
+    rule_id = rule.get("id")
+    trigger = rule.get("trigger") or {}
+    trigger_type = trigger.get("type")
+    if not rule_id or not isinstance(trigger_type, str):
+        raise ValueError(f"Automation rule {rule_id!r} needs an id and a trigger type")
+    try:
+        predicate = compile_value_predicate(trigger.get("value"))
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ValueError(f"Automation rule {rule_id!r} has an invalid trigger value: {exc}") from exc
+
+    masks = []
+    conditions = rule.get("conditions") or {}
+    schedule = rule.get("schedule") or {}
+    for window in (conditions.get("timeRange"), schedule.get("hours")):
+        if window:
+            masks.append(minute_mask(float(window["start"]), float(window["end"])))
+    days = schedule.get("days")
+    options = rule.get("options") or {}
+    debounce_ms = options.get("debounceMs") or DEFAULT_DEBOUNCE_MS
+
+    return CompiledTemplateRule(
+        rule_id=str(rule_id),
+        name=str(rule.get("name") or rule_id),
+        trigger_type=trigger_type,
+        predicate=predicate,
+        actions=tuple(action for action in rule.get("actions") or [] if isinstance(action, Mapping)),
+        debounce_seconds=float(debounce_ms) / 1000,
+        source=trigger.get("source"),
+        device_id=trigger.get("deviceId"),
+        minutes=_combine_masks(masks),
+        days=frozenset(days) if days is not None else None,
+        template=template,
+    )
+
+
+class TemplateRuleSet:
+    """Compiled template rules indexed by trigger type."""
+
+    def __init__(self, rules: Iterable[CompiledTemplateRule] = ()) -> None:
+        self._rules: Dict[str, CompiledTemplateRule] = {}
+        self._by_type: Dict[str, List[CompiledTemplateRule]] = {}
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule: CompiledTemplateRule) -> None:
+        previous = self._rules.get(rule.rule_id)
+        if previous is not None:
+            self._by_type[previous.trigger_type].remove(previous)
+        self._rules[rule.rule_id] = rule
+        self._by_type.setdefault(rule.trigger_type, []).append(rule)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    @property
+    def trigger_types(self) -> List[str]:
+        return sorted(rtype for rtype, rules in self._by_type.items() if rules)
+
+    def get(self, rule_id: str) -> Optional[CompiledTemplateRule]:
+        return self._rules.get(rule_id)
+
+    def rules(self) -> List[CompiledTemplateRule]:
+        return list(self._rules.values())
+
+    def evaluate(self, reading: TemplateReading, now: Optional[float] = None) -> List[CompiledTemplateRule]:
+        """Return the rules that fire for ``reading`` and start their debounce window.
+
+        ``now`` is a monotonic clock value for debouncing; the minute mask is
+        checked against the reading's local wall-clock time.  Naive reading
+        timestamps are UTC, as stamped by ``datetime.utcnow()`` on ingest.
+        """
+
+        candidates = self._by_type.get(reading.type)
+        if not candidates:
+            return []
+        now = time.monotonic() if now is None else now
+        moment = reading.timestamp or datetime.now(timezone.utc)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        moment = moment.astimezone()
+        fired = []
+        for rule in candidates:
+            if rule.last_fired is not None and now - rule.last_fired < rule.debounce_seconds:
+                continue
+            if not rule.matches(reading) or not rule.active_at(moment):
+                continue
+            rule.last_fired = now
+            fired.append(rule)
+        return fired
+
+
+def compile_templates(
+    document: Mapping[str, Any], templates: Optional[Iterable[str]] = None
+) -> TemplateRuleSet:
+    """Compile the rules of ``farm_automation_templates`` (optionally only ``templates``)."""
+
+    selected = set(templates) if templates is not None else None
+    ruleset = TemplateRuleSet()
+    for key, template in (document.get("farm_automation_templates") or {}).items():
+        if selected is not None and key not in selected:
+            continue
+        for rule in (template or {}).get("rules") or []:
+            try:
+                ruleset.add(compile_template_rule(rule, template=key))
+            except ValueError as exc:
+                LOGGER.warning("Skipping automation template rule in %s: %s", key, exc)
+    return ruleset
+
+
+def load_automation_templates(path: Path, templates: Optional[Iterable[str]] = None) -> TemplateRuleSet:
+    with Path(path).open("r", encoding="utf-8") as handle:
+        document = json.load(handle)
+    ruleset = compile_templates(document, templates)
+    LOGGER.info("Compiled %d automation template rules from %s", len(ruleset), path)
+    return ruleset
+
+
+def _post_json(url: str, payload: Mapping[str, Any]) -> Any:
+    response = requests.post(url, json=payload, timeout=ACTION_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()
+
+
+class ActionRegistry:
+    """Map template action types (``kasa_control``, ``notification`` ...) to async handlers.
+
+    Every action type the templates use is handled out of the box: device
+    actions are POSTed to the same endpoints under ``base_url`` that the Node
+    engine calls, from a worker thread so the event loop never waits on them.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_ACTION_BASE_URL,
+        scenarios: Optional[Mapping[str, Sequence[Mapping[str, Any]]]] = None,
+        post: Optional[JsonPoster] = None,
+    ) -> None:
+        self._base_url = base_url.rstrip("/")
+        self._scenarios = dict(SCENARIOS if scenarios is None else scenarios)
+        self._post = post or _post_json
+        self._handlers: Dict[str, ActionHandler] = {
+            "notification": self._notification,
+            "kasa_control": self._kasa_control,
+            "switchbot_control": self._switchbot_control,
+            "ifttt_trigger": self._ifttt_trigger,
+            "scenario": self._scenario,
+        }
+
+    def register(self, action_type: str, handler: ActionHandler) -> None:
+        self._handlers[action_type] = handler
+
+    def handler_for(self, action_type: str) -> Optional[ActionHandler]:
+        return self._handlers.get(action_type)
+
+    def unhandled(self, ruleset: "TemplateRuleSet") -> List[str]:
+        """Action types used by ``ruleset`` that have no handler."""
+
+        return sorted(
+            {
+                str(action.get("type"))
+                for rule in ruleset.rules()
+                for action in rule.actions
+                if str(action.get("type")) not in self._handlers
+            }
+        )
+
+    async def run(self, rule: CompiledTemplateRule, reading: TemplateReading) -> List[Dict[str, Any]]:
+        results = []
+        for action in rule.actions:
+            action_type = str(action.get("type"))
+            try:
+                results.append({"action": action_type, "success": True, "result": await self.execute(action, reading)})
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("Rule %s action %s failed: %s", rule.rule_id, action_type, exc)
+                results.append({"action": action_type, "success": False, "error": str(exc)})
+        return results
+
+    async def execute(self, action: Mapping[str, Any], reading: TemplateReading) -> Any:
+        handler = self._handlers.get(str(action.get("type")))
+        if handler is None:
+            raise ValueError(f"Unknown action type: {action.get('type')}")
+        return await handler(action, reading)
+
+    async def _forward(self, path: str, payload: Mapping[str, Any]) -> Any:
+        return await asyncio.to_thread(self._post, f"{self._base_url}{path}", payload)
+
+    async def _kasa_control(self, action: Mapping[str, Any], reading: TemplateReading) -> Any:
+        device_id = quote(str(action.get("deviceId")), safe="")
+        payload = {"action": action.get("command"), **(action.get("parameters") or {})}
+        return await self._forward(f"/api/kasa/devices/{device_id}/control", payload)
+
+    async def _switchbot_control(self, action: Mapping[str, Any], reading: TemplateReading) -> Any:
+        device_id = quote(str(action.get("deviceId")), safe="")
+        payload = {"command": action.get("command"), "parameter": action.get("parameter") or "default"}
+        return await self._forward(f"/api/switchbot/devices/{device_id}/commands", payload)
+
+    async def _ifttt_trigger(self, action: Mapping[str, Any], reading: TemplateReading) -> Any:
+        data = dict(action.get("data") or {})
+        payload = {
+            "value1": data.get("value1") or reading.value,
+            "value2": data.get("value2") or reading.device_id,
+            "value3": data.get("value3") or reading.type,
+            **data,
+        }
+        event = quote(str(action.get("event")), safe="")
+        return await self._forward(f"/integrations/ifttt/trigger/{event}", payload)
+
+    async def _notification(self, action: Mapping[str, Any], reading: TemplateReading) -> Any:
+        title = action.get("title", "")
+        message = reading.interpolate(str(action.get("message", "")))
+        LOGGER.info("Automation notification %s: %s", title, message)
+        if action.get("iftttEvent"):
+            data = {"value1": title, "value2": message, "value3": reading.device_id}
+            return await self.execute({"type": "ifttt_trigger", "event": action["iftttEvent"], "data": data}, reading)
+        return {"sent": True, "message": message}
+
+    async def _scenario(self, action: Mapping[str, Any], reading: TemplateReading) -> Dict[str, Any]:
+        scenario_id = action.get("scenarioId")
+        steps = self._scenarios.get(str(scenario_id))
+        if steps is None:
+            raise ValueError(f"Scenario not found: {scenario_id}")
+        results = []
+        for step in steps:
+            name = step.get("name") or step.get("type")
+            try:
+                result = await self.execute({**step, **(action.get("parameters") or {})}, reading)
+                results.append({"step": name, "result": result, "success": True})
+                if step.get("delay"):
+                    await asyncio.sleep(float(step["delay"]) / 1000)
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("Scenario %s step %s failed: %s", scenario_id, name, exc)
+                results.append({"step": name, "error": str(exc), "success": False})
+                if step.get("critical"):
+                    break
+        return {"scenario": scenario_id, "steps": results}
+
+
+def template_rule(ruleset: TemplateRuleSet, actions: Optional[ActionRegistry] = None) -> AutomationRule:
+    """Wrap a compiled rule set as a single ``AutomationEngine`` rule."""
+
+    registry = actions or ActionRegistry()
+    unhandled = registry.unhandled(ruleset)
+    if unhandled:
+        LOGGER.warning("Automation template actions without a handler will fail when fired: %s", ", ".join(unhandled))
+
+    async def rule(event: SensorEvent, controller: LightingController) -> None:
+        reading = TemplateReading.from_event(event)
+        if reading is None:
+            return
+        # The loop clock debounces live runs monotonically and follows the virtual clock in replays.
+        for fired in ruleset.evaluate(reading, now=asyncio.get_running_loop().time()):
+            LOGGER.info("Automation template rule %s (%s) fired", fired.name, fired.rule_id)
+            await registry.run(fired, reading)
+
+    # Readings name their type either as "measurement" or "type", so only the
+    # former could be routed by the engine index; the rule set indexes by type itself.
+    rule.subscription = RuleSubscription()
+    return rule
+
+
+__all__ = [
+    "ActionRegistry",
+    "DEFAULT_ACTION_BASE_URL",
+    "DEVICE_ACTION_TYPES",
+    "SCENARIOS",
+    "CompiledTemplateRule",
+    "TemplateReading",
+    "TemplateRuleSet",
+    "compile_template_rule",
+    "compile_templates",
+    "compile_value_predicate",
+    "load_automation_templates",
+    "minute_mask",
+    "template_rule",
+]
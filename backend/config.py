@@ -102,6 +102,9 @@ class LightingFixture:
     control_interface: str
     spectrum_min: int
     spectrum_max: int
+    group: Optional[str] = None
+    zone: Optional[str] = None
+    room: Optional[str] = None
 
 
 @dataclass(frozen=True)
@@ -113,6 +116,17 @@ class AIConfig:
     api_url: Optional[str] = None
 
 
+@dataclass(frozen=True)
+class TelemetryConfig:
+    """Retention and persistence settings for environmental telemetry."""
+
+    retention_hours: int = 168
+    storage_dir: Optional[Path] = None
+    segment_rotation: str = "hour"
+    compaction_interval_seconds: float = 300.0
+    compressed_history_kb: Optional[int] = None
+
+
 @dataclass(frozen=True)
 class EnvironmentConfig:
     """Bundle of configuration for a specific deployment environment."""
@@ -123,6 +137,7 @@ class EnvironmentConfig:
     kasa: Optional[KasaConfig] = None
     lighting_inventory: Optional[List[LightingFixture]] = None
     ai_assist: Optional[AIConfig] = None
+    telemetry: Optional[TelemetryConfig] = None
 
 
 def get_environment() -> str:
@@ -159,6 +174,9 @@ def load_lighting_inventory(path: Optional[Path] = None) -> List[LightingFixture
                     control_interface=entry["control_interface"],
                     spectrum_min=int(entry.get("spectrum_min", 2700)),
                     spectrum_max=int(entry.get("spectrum_max", 6500)),
+                    group=entry.get("group"),
+                    zone=entry.get("zone"),
+                    room=entry.get("room"),
                 )
             )
         except KeyError as exc:
@@ -233,6 +251,16 @@ def build_environment_config(env: Optional[str] = None) -> EnvironmentConfig:
         api_url=os.getenv("AI_ASSIST_API_URL"),  # Keep existing API URL if configured
     )
 
+    telemetry_dir = os.getenv("TELEMETRY_DIR")
+    compressed_kb = os.getenv("TELEMETRY_COMPRESSED_HISTORY_KB")
+    telemetry_config = TelemetryConfig(
+        retention_hours=int(os.getenv("TELEMETRY_RETENTION_HOURS", "168")),
+        storage_dir=Path(telemetry_dir) if telemetry_dir else None,
+        segment_rotation=os.getenv("TELEMETRY_SEGMENT_ROTATION", "hour").lower(),
+        compaction_interval_seconds=float(os.getenv("TELEMETRY_COMPACTION_INTERVAL", "300")),
+        compressed_history_kb=int(compressed_kb) if compressed_kb else None,
+    )
+
     return EnvironmentConfig(
         kasa_discovery_timeout=timeout,
         mqtt=mqtt_config,
@@ -240,6 +268,7 @@ def build_environment_config(env: Optional[str] = None) -> EnvironmentConfig:
         kasa=kasa_config,
         lighting_inventory=lighting_inventory,
         ai_assist=ai_assist_config,
+        telemetry=telemetry_config,
     )
 
 
@@ -249,6 +278,7 @@ __all__ = [
     "KasaConfig",
     "LightingFixture",
     "AIConfig",
+    "TelemetryConfig",
     "EnvironmentConfig",
     "build_environment_config",
     "get_environment",
@@ -2,11 +2,10 @@
 from __future__ import annotations
 
 import asyncio
-from concurrent.futures import Future
 import json
 import logging
 from datetime import datetime
-from typing import Any, Awaitable, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import requests
 
@@ -51,12 +50,6 @@ from .state import DeviceRegistry, SensorEventBuffer
 LOGGER = logging.getLogger(__name__)
 
 
-def _log_future_exception(future: Future) -> None:
-    exc = future.exception()
-    if exc is not None:
-        LOGGER.error("MQTT event handler error: %s", exc)
-
-
 async def discover_kasa_devices(
     registry: DeviceRegistry,
     timeout: int,
@@ -106,14 +99,19 @@ async def discover_kasa_devices(
 
 
 class _MQTTDiscoveryClient:
-    """Temporary MQTT client that captures retained device messages."""
+    """Temporary MQTT client that captures retained device messages.
+
+    ``event_handler`` is called on the event loop with each sensor event and
+    must not wait (e.g. ``AutomationEngine.offer``): paho delivers messages on
+    its network thread, which only schedules the call.
+    """
 
     def __init__(
         self,
         config: MQTTConfig,
         buffer: SensorEventBuffer,
         registry: DeviceRegistry,
-        event_handler: Optional[Callable[[SensorEvent], Awaitable[None]]] = None,
+        event_handler: Optional[Callable[[SensorEvent], Any]] = None,
     ) -> None:
         self._config = config
         self._buffer = buffer
@@ -160,8 +158,15 @@ class _MQTTDiscoveryClient:
         self._registry.upsert(device)
 
         if self._event_handler:
-            future = asyncio.run_coroutine_threadsafe(self._event_handler(event), self._loop)
-            future.add_done_callback(_log_future_exception)
+            # Never block the paho network thread (keepalives, inbound delivery);
+            # the handler's non-blocking hand-off drops or coalesces on overflow.
+            self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: SensorEvent) -> None:
+        try:
+            self._event_handler(event)
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.error("MQTT event handler error: %s", exc)
 
     def connect(self) -> None:
         self._client.connect(self._config.host, self._config.port, keepalive=30)
@@ -187,7 +192,7 @@ async def discover_mqtt_devices(
     buffer: SensorEventBuffer,
     config: MQTTConfig,
     listen_seconds: float = 5.0,
-    event_handler: Optional[Callable[[SensorEvent], Awaitable[None]]] = None,
+    event_handler: Optional[Callable[[SensorEvent], Any]] = None,
 ) -> None:
     """Subscribe to MQTT topics to populate devices."""
     
@@ -437,7 +442,7 @@ async def full_discovery_cycle(
     config,
     registry: DeviceRegistry,
     buffer: SensorEventBuffer,
-    event_handler: Optional[Callable[[SensorEvent], Awaitable[None]]] = None,
+    event_handler: Optional[Callable[[SensorEvent], Any]] = None,
     logger: Optional[logging.Logger] = None,
 ) -> None:
     """Run discovery for all protocols with graceful error handling."""
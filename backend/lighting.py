@@ -2,21 +2,92 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, Iterable, Optional
+from numbers import Real
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
 
 from .config import LightingFixture
 from .state import LightingState
 
 LOGGER = logging.getLogger(__name__)
 
+# A batch entry is either a brightness or a ``(brightness, spectrum)`` pair;
+# any two-item sequence works, so JSON-decoded ``[brightness, spectrum]`` lists do too.
+OutputRequest = Union[int, Tuple[int, Optional[int]], Sequence[Optional[int]]]
+
+
+# Target prefixes that address every fixture in a scope, e.g. ``room:North``.
+FIXTURE_SCOPES = ("group", "zone", "room")
+
+
+class FixtureIndex:
+    """Address, name, group, zone and room lookups over the fixture inventory."""
+
+    def __init__(self, fixtures: Iterable[LightingFixture]) -> None:
+        self.by_address: Dict[str, LightingFixture] = {}
+        self._by_name: Dict[str, str] = {}
+        self._scopes: Dict[str, Dict[str, List[str]]] = {scope: {} for scope in FIXTURE_SCOPES}
+        for fixture in fixtures:
+            self.by_address[fixture.address] = fixture
+            self._by_name.setdefault(fixture.name, fixture.address)
+            for scope in FIXTURE_SCOPES:
+                value = getattr(fixture, scope)
+                if value:
+                    self._scopes[scope].setdefault(value, []).append(fixture.address)
+
+    def __contains__(self, address: object) -> bool:
+        return address in self.by_address
+
+    def __len__(self) -> int:
+        return len(self.by_address)
+
+    def get(self, address: str) -> Optional[LightingFixture]:
+        return self.by_address.get(address)
+
+    def by_name(self, name: str) -> Optional[LightingFixture]:
+        address = self._by_name.get(name)
+        return self.by_address[address] if address is not None else None
+
+    def members(self, scope: str, name: str) -> List[str]:
+        return list(self._scopes.get(scope, {}).get(name, ()))
+
+    def scope_names(self, scope: str) -> List[str]:
+        return sorted(self._scopes.get(scope, {}))
+
+    def resolve(self, target: str) -> List[str]:
+        """Addresses for a fixture address or name, or a ``group:``/``zone:``/``room:`` target."""
+
+        target = target.strip()
+        if target in self.by_address:
+            return [target]
+        scope, separator, name = target.partition(":")
+        if separator and scope in self._scopes:
+            return self.members(scope, name.strip())
+        address = self._by_name.get(target)
+        return [address] if address is not None else []
+
 
 class LightingController:
     """Controller responsible for validating and applying light levels."""
 
     def __init__(self, fixtures: Iterable[LightingFixture], state: LightingState) -> None:
-        self._fixtures: Dict[str, LightingFixture] = {fixture.address: fixture for fixture in fixtures}
+        self.index = FixtureIndex(fixtures)
+        self._fixtures: Dict[str, LightingFixture] = self.index.by_address
         self._state = state
 
+    @staticmethod
+    def _split_request(address: str, request: OutputRequest) -> Tuple[int, Optional[int]]:
+        if isinstance(request, Sequence) and not isinstance(request, (str, bytes)):
+            if len(request) != 2:
+                raise ValueError(f"Output for {address} must be a brightness or a (brightness, spectrum) pair")
+            brightness, spectrum = request
+        else:
+            brightness, spectrum = request, None
+        if not isinstance(brightness, Real) or isinstance(brightness, bool):
+            raise ValueError(f"Brightness for {address} must be a number, got {brightness!r}")
+        if spectrum is not None and (not isinstance(spectrum, Real) or isinstance(spectrum, bool)):
+            raise ValueError(f"Spectrum for {address} must be a number, got {spectrum!r}")
+        return brightness, spectrum
+
     def _clamp(self, fixture: LightingFixture, brightness: int, spectrum: Optional[int]) -> Dict[str, int]:
         clamped_brightness = max(fixture.min_brightness, min(brightness, fixture.max_brightness))
         clamped_spectrum = None
@@ -40,19 +111,57 @@ class LightingController:
         applied = self._state.apply_setting(address, clamped["brightness"], clamped["spectrum"])
         return applied
 
+    def set_outputs(self, outputs: Mapping[str, OutputRequest]) -> Dict[str, Dict[str, int]]:
+        """Validate and clamp a batch, then apply it as one ``LightingState`` update.
+
+        ``outputs`` maps fixture addresses to a brightness or a
+        ``(brightness, spectrum)`` pair (tuple or list).  Nothing is applied if
+        any address is unknown or any entry is malformed.  Returns the applied
+        state per fixture.
+        """
+
+        unknown = [address for address in outputs if address not in self._fixtures]
+        if unknown:
+            LOGGER.error("Attempt to control unknown fixtures %s", ", ".join(unknown))
+            raise ValueError(f"Unknown fixture {unknown[0]}" if len(unknown) == 1 else f"Unknown fixtures {unknown}")
+
+        settings: Dict[str, Tuple[int, Optional[int]]] = {}
+        for address, request in outputs.items():
+            brightness, spectrum = self._split_request(address, request)
+            clamped = self._clamp(self._fixtures[address], brightness, spectrum)
+            settings[address] = (clamped["brightness"], clamped["spectrum"])
+        LOGGER.debug("Setting %d fixtures in one batch", len(settings))
+        return self._state.apply_settings(settings)
+
+    def set_target_output(
+        self, target: str, brightness: int, spectrum: Optional[int] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """Fan one setting out to every fixture ``target`` resolves to, as one batch."""
+
+        addresses = self.index.resolve(target)
+        if not addresses:
+            LOGGER.error("Lighting target %s matches no fixtures", target)
+            raise ValueError(f"Unknown lighting target {target}")
+        return self.set_outputs({address: (brightness, spectrum) for address in addresses})
+
+    def has_fixture(self, address: str) -> bool:
+        return address in self._fixtures
+
     def apply_safe_defaults(self) -> None:
         """Apply a fail-safe state to all fixtures."""
 
+        outputs: Dict[str, OutputRequest] = {}
         for address, fixture in self._fixtures.items():
             safe_brightness = int(
                 fixture.min_brightness
                 + (fixture.max_brightness - fixture.min_brightness) * 0.5
             )
-            LOGGER.info("Applying safe default to %s: %s", address, safe_brightness)
-            self.set_output(address, safe_brightness, fixture.spectrum_min)
+            outputs[address] = (safe_brightness, fixture.spectrum_min)
+        LOGGER.info("Applying safe defaults to %d fixtures", len(outputs))
+        self.set_outputs(outputs)
 
     def last_known_state(self, address: str) -> Optional[Dict[str, int]]:
         return self._state.get_state(address)
 
 
-__all__ = ["LightingController"]
+__all__ = ["FIXTURE_SCOPES", "FixtureIndex", "LightingController", "OutputRequest"]
@@ -0,0 +1,276 @@
+"""Photoperiod intensity curves for group schedules.
+
+``PhotoperiodParams`` folds a ``GroupSchedule``'s ``offsets`` and ``override``
+into its configured cycle, and ``intensity_at`` / ``PhotoperiodCurveCache``
+evaluate many schedules at once, as NumPy array operations when NumPy is
+installed and with plain loops otherwise.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .device_models import GroupSchedule, PhotoperiodScheduleConfig
+
+LOGGER = logging.getLogger(__name__)
+
+# Optional dependency: batch evaluation falls back to pure Python without NumPy.
+NUMPY_AVAILABLE = False
+
+try:
+    import numpy as np  # type: ignore
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    LOGGER.info("numpy not available. Photoperiod curves evaluated in pure Python.")
+
+MINUTES_PER_DAY = 24 * 60
+
+# Override modes that pin the output regardless of the photoperiod.  Any other
+# mode carrying a numeric ``value`` is treated as a fixed level as well;
+# "auto"/"schedule" (or no override) follow the curve.
+_OVERRIDE_OFF = {"off", "dark", "blackout"}
+_OVERRIDE_ON = {"on", "max", "full"}
+_OVERRIDE_FOLLOW = {"auto", "schedule", "none", "resume"}
+
+
+def _cycle_fraction(duration: float, ramp_up: float, ramp_down: float, minutes_since_start: float) -> float:
+    if minutes_since_start < 0 or minutes_since_start >= duration:
+        return 0.0
+    if minutes_since_start < ramp_up:
+        return minutes_since_start / ramp_up
+    remaining = duration - minutes_since_start
+    if remaining < ramp_down:
+        return remaining / ramp_down
+    return 1.0
+
+
+def _scaled_ramps(duration: float, ramp_up: float, ramp_down: float) -> Tuple[float, float]:
+    """Ramps longer than the photoperiod itself shrink proportionally."""
+
+    ramp_up, ramp_down = max(ramp_up, 0), max(ramp_down, 0)
+    if ramp_up + ramp_down > duration:
+        scale = duration / (ramp_up + ramp_down) if ramp_up + ramp_down else 0.0
+        ramp_up, ramp_down = ramp_up * scale, ramp_down * scale
+    return ramp_up, ramp_down
+
+
+def start_minute(config: PhotoperiodScheduleConfig) -> int:
+    return config.start.hour * 60 + config.start.minute
+
+
+def _override_level(override: Optional[Mapping[str, Any]]) -> Optional[float]:
+    if not override:
+        return None
+    mode = str(override.get("mode", "")).strip().lower()
+    value = override.get("value")
+    numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if mode in _OVERRIDE_FOLLOW:
+        return None
+    if mode in _OVERRIDE_OFF:
+        return 0.0
+    if numeric:
+        return min(max(float(value) / 100, 0.0), 1.0)
+    if mode in _OVERRIDE_ON:
+        return 1.0
+    LOGGER.debug("Ignoring photoperiod override mode %r without a numeric value", mode)
+    return None
+
+
+@dataclass(frozen=True)
+class PhotoperiodParams:
+    """One schedule's cycle with ``offsets`` and ``override`` applied.
+
+    Recognised offsets: ``startMin`` shifts the start, ``durationMin``
+    lengthens (or shortens) the photoperiod, both in minutes, and
+    ``intensity`` scales the curve by a percentage (``-10`` dims it by 10%).
+    Other keys such as ``ppfd`` or spectral channels do not shape intensity.
+    A fixed ``override`` level replaces the curve entirely.
+    """
+
+    start: float
+    duration: float
+    ramp_up: float
+    ramp_down: float
+    gain: float = 1.0
+    fixed: Optional[float] = None
+
+    @classmethod
+    def from_schedule(cls, schedule: GroupSchedule) -> "PhotoperiodParams":
+        config = schedule.schedule
+        offsets = schedule.offsets or {}
+        start = (start_minute(config) + offsets.get("startMin", 0)) % MINUTES_PER_DAY
+        duration = max(config.duration_hours, 0) * 60 + offsets.get("durationMin", 0)
+        # Longer than a day would overlap the next cycle; a full day is continuous light.
+        duration = min(max(duration, 0), MINUTES_PER_DAY)
+        ramp_up, ramp_down = _scaled_ramps(duration, config.ramp_up_minutes, config.ramp_down_minutes)
+        gain = max(1 + offsets.get("intensity", 0) / 100, 0.0)
+        return cls(start, duration, ramp_up, ramp_down, gain, _override_level(schedule.override))
+
+    def fraction(self, minutes_since_start: float) -> float:
+        """Intensity in ``[0, 1]`` at ``minutes_since_start`` into one cycle."""
+
+        if self.fixed is not None:
+            return self.fixed
+        level = _cycle_fraction(self.duration, self.ramp_up, self.ramp_down, minutes_since_start)
+        return min(level * self.gain, 1.0)
+
+    def at_minute(self, minute_of_day: float) -> float:
+        """Intensity at a wall-clock minute, including a cycle carried over from yesterday."""
+
+        return self.fraction((minute_of_day - self.start) % MINUTES_PER_DAY)
+
+
+def schedule_version(schedule: GroupSchedule) -> Hashable:
+    """Everything that shapes a schedule's curve, so edits in place invalidate caches."""
+
+    config = schedule.schedule
+    return (
+        schedule.device_id,
+        schedule.updated_at,
+        start_minute(config),
+        config.duration_hours,
+        config.ramp_up_minutes,
+        config.ramp_down_minutes,
+        tuple(sorted((schedule.offsets or {}).items())),
+        tuple(sorted((str(k), repr(v)) for k, v in (schedule.override or {}).items())),
+    )
+
+
+def _columns(params: Sequence[PhotoperiodParams]):
+    fixed = [p.fixed for p in params]
+    columns = {
+        "start": [p.start for p in params],
+        "duration": [p.duration for p in params],
+        "ramp_up": [p.ramp_up for p in params],
+        "ramp_down": [p.ramp_down for p in params],
+        "gain": [p.gain for p in params],
+        "pinned": [value is not None for value in fixed],
+        "fixed": [value or 0.0 for value in fixed],
+    }
+    return {name: np.asarray(values, dtype=float if name != "pinned" else bool)[:, None] for name, values in columns.items()}
+
+
+def _evaluate_numpy(params: Sequence[PhotoperiodParams], minutes) -> "np.ndarray":
+    """Intensities with one row per schedule and ``minutes`` broadcast against the rows.
+
+    A ``(1, m)`` row of minutes gives an ``(n, m)`` matrix; an ``(n, 1)``
+    column gives each schedule its own minute.
+    """
+
+    c = _columns(params)
+    t = np.mod(np.asarray(minutes, dtype=float) - c["start"], MINUTES_PER_DAY)
+    has_up, has_down = c["ramp_up"] > 0, c["ramp_down"] > 0
+    rising = np.where(has_up, t / np.where(has_up, c["ramp_up"], 1.0), 1.0)
+    falling = np.where(has_down, (c["duration"] - t) / np.where(has_down, c["ramp_down"], 1.0), 1.0)
+    level = np.where(t < c["duration"], np.minimum(np.minimum(rising, falling), 1.0), 0.0)
+    level = np.minimum(level * c["gain"], 1.0)
+    return np.where(c["pinned"], c["fixed"], level)
+
+
+def intensity_at(schedules: Sequence[GroupSchedule], minute_of_day: Union[float, Sequence[float]]):
+    """Intensity in ``[0, 1]`` for every schedule at a wall-clock minute.
+
+    ``minute_of_day`` is either one minute shared by all schedules or a
+    sequence with one minute per schedule.  Returns a NumPy vector when NumPy
+    is installed, otherwise an ``array('d')``.
+    """
+
+    params = [PhotoperiodParams.from_schedule(schedule) for schedule in schedules]
+    if isinstance(minute_of_day, (int, float)):
+        minutes: Sequence[float] = [minute_of_day] * len(params)
+    else:
+        minutes = minute_of_day
+        if len(minutes) != len(params):
+            raise ValueError("Expected one minute per schedule")
+    if NUMPY_AVAILABLE:
+        if not params:
+            return np.zeros(0)
+        return _evaluate_numpy(params, np.asarray(minutes, dtype=float)[:, None])[:, 0]
+    return array("d", (p.at_minute(minute) for p, minute in zip(params, minutes)))
+
+
+class PhotoperiodCurveCache:
+    """LRU cache of 1440-minute day curves keyed by schedule version.
+
+    A curve samples the start of each local wall-clock minute and includes
+    the tail of the previous day's cycle when a photoperiod wraps midnight.
+    It depends only on the schedule (wall-clock minutes ignore DST shifts),
+    so one cached curve serves every date.  Misses in a ``curves`` call are
+    evaluated together in one batch.
+    """
+
+    def __init__(self, maxsize: int = 512) -> None:
+        self._maxsize = max(maxsize, 1)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def curve(self, schedule: GroupSchedule):
+        return self.curves([schedule])[0]
+
+    def curves(self, schedules: Sequence[GroupSchedule]):
+        """Day curves for ``schedules``: an ``(n, 1440)`` array, or a list of ``array('d')``."""
+
+        keys = [schedule_version(schedule) for schedule in schedules]
+        rows: List[Any] = [None] * len(keys)
+        missing: Dict[Hashable, List[int]] = {}
+        with self._lock:
+            for index, key in enumerate(keys):
+                cached = self._entries.get(key)
+                if cached is None:
+                    missing.setdefault(key, []).append(index)
+                else:
+                    self._entries.move_to_end(key)
+                    rows[index] = cached
+            self.hits += len(keys) - sum(len(indexes) for indexes in missing.values())
+            self.misses += len(missing)
+        if missing:
+            pending = [schedules[indexes[0]] for indexes in missing.values()]
+            for (key, indexes), row in zip(missing.items(), self._evaluate(pending)):
+                for index in indexes:
+                    rows[index] = row
+                self._store(key, row)
+        if NUMPY_AVAILABLE:
+            return np.vstack(rows) if rows else np.zeros((0, MINUTES_PER_DAY))
+        return [array("d", row) for row in rows]
+
+    def _evaluate(self, schedules: Sequence[GroupSchedule]) -> List[Any]:
+        params = [PhotoperiodParams.from_schedule(schedule) for schedule in schedules]
+        if NUMPY_AVAILABLE:
+            matrix = _evaluate_numpy(params, np.arange(MINUTES_PER_DAY)[None, :])
+            matrix.setflags(write=False)
+            return list(matrix)
+        return [array("d", (p.at_minute(minute) for minute in range(MINUTES_PER_DAY))) for p in params]
+
+    def _store(self, key: Hashable, row: Any) -> None:
+        with self._lock:
+            self._entries[key] = row
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+__all__ = [
+    "MINUTES_PER_DAY",
+    "NUMPY_AVAILABLE",
+    "PhotoperiodCurveCache",
+    "PhotoperiodParams",
+    "intensity_at",
+    "schedule_version",
+    "start_minute",
+]
@@ -0,0 +1,373 @@
+"""Fire lighting schedule transitions on time from a single timer heap.
+
+Every ``Schedule`` (fixed on/off window) and ``GroupSchedule`` (photoperiod
+with ramps) contributes only its *next* transition to a min-heap.  Firing a
+transition pushes that schedule's following one, so the heap holds one item
+per schedule and a single task sleeps until the earliest is due.  Replacing
+or removing a schedule bumps its generation; superseded heap items are
+discarded lazily when they surface, keeping updates at O(log n).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import threading
+import time as time_module
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from .device_models import GroupSchedule, Schedule
+from .lighting import LightingController
+from .photoperiod import MINUTES_PER_DAY, PhotoperiodParams, intensity_at
+
+LOGGER = logging.getLogger(__name__)
+
+TargetResolver = Callable[[str], List[str]]
+# Brightness and spectrum to apply; brightness 0 is clamped to the fixture minimum.
+Setting = Tuple[int, Optional[int]]
+
+
+class _Timeline:
+    """Local-time helpers shared by the transition calculators."""
+
+    def __init__(self, tz: Optional[tzinfo]) -> None:
+        self._tz = tz
+
+    def at(self, day: date, moment: time) -> float:
+        # Naive datetimes resolve through the host timezone (and its DST rules).
+        return datetime.combine(day, moment.replace(tzinfo=None), tzinfo=self._tz).timestamp()
+
+    def local(self, epoch: float) -> datetime:
+        return datetime.fromtimestamp(epoch, self._tz)
+
+
+class _ScheduleTransitions:
+    """On at ``start_time`` and off at ``end_time`` every day; windows may wrap midnight."""
+
+    def __init__(self, schedule: Schedule, timeline: _Timeline) -> None:
+        self.target = schedule.group
+        self._start, self._end = schedule.start_time, schedule.end_time
+        self._on: Setting = (schedule.brightness, schedule.spectrum)
+        self._timeline = timeline
+
+    def next_after(self, epoch: float) -> Optional[float]:
+        if self._start == self._end:
+            return None
+        today = self._timeline.local(epoch).date()
+        candidates = (
+            self._timeline.at(day, moment)
+            for day in (today, today + timedelta(days=1))
+            for moment in (self._start, self._end)
+        )
+        return min((when for when in candidates if when > epoch), default=None)
+
+    def setting_at(self, epoch: float) -> Setting:
+        moment = self._timeline.local(epoch).time()
+        if self._start < self._end:
+            inside = self._start <= moment < self._end
+        else:
+            inside = moment >= self._start or moment < self._end
+        return self._on if inside else (0, None)
+
+
+class _PhotoperiodTransitions:
+    """Photoperiod breakpoints: lights on, ramp steps, plateau, ramp down, lights off.
+
+    Offsets and overrides are folded in through ``PhotoperiodParams``.
+    """
+
+    def __init__(self, schedule: GroupSchedule, timeline: _Timeline, ramp_step_minutes: float) -> None:
+        self.target = schedule.device_id
+        self.schedule = schedule
+        self._params = params = PhotoperiodParams.from_schedule(schedule)
+        self._start = time(int(params.start // 60), int(params.start % 60))
+        self._timeline = timeline
+        duration, ramp_up, ramp_down = params.duration, params.ramp_up, params.ramp_down
+        self._duration = duration
+        offsets = {0.0, ramp_up, duration - ramp_down, float(duration)}
+        step = max(ramp_step_minutes, 1e-3)
+        for begin, length in ((0.0, ramp_up), (duration - ramp_down, ramp_down)):
+            for index in range(1, int(length / step) + 1):
+                offsets.add(min(begin + index * step, begin + length))
+        # Drop breakpoints that would re-apply the level already in effect
+        # (lights are off before each cycle starts).
+        self._breakpoints: List[float] = []
+        previous = 0
+        for offset in sorted(offsets):
+            level = self._level(offset)
+            if level != previous:
+                self._breakpoints.append(offset)
+                previous = level
+
+    def _level(self, minutes: float) -> int:
+        return int(round(self._params.fraction(minutes) * 100))
+
+    def _cycle_starts(self, epoch: float) -> List[float]:
+        today = self._timeline.local(epoch).date()
+        return [self._timeline.at(today + timedelta(days=delta), self._start) for delta in (-1, 0, 1)]
+
+    def next_after(self, epoch: float) -> Optional[float]:
+        if self._duration <= 0:
+            return None
+        candidates = (
+            start + offset * 60 for start in self._cycle_starts(epoch) for offset in self._breakpoints
+        )
+        return min((when for when in candidates if when > epoch), default=None)
+
+    def setting_at(self, epoch: float) -> Setting:
+        level = max(self._level((epoch - start) / 60) for start in self._cycle_starts(epoch))
+        return level, None
+
+    def minute_at(self, epoch: float) -> float:
+        """Wall-clock minute for ``intensity_at`` that lands as far into the current cycle as ``epoch``.
+
+        Elapsed time is measured from the latest cycle start, so a DST shift
+        inside the cycle does not move ramps and lights-off by an hour.
+        """
+
+        start = max(start for start in self._cycle_starts(epoch) if start <= epoch)
+        # Past a full day (a 25-hour DST day) the cycle is over; don't wrap into the next one.
+        elapsed = min((epoch - start) / 60, MINUTES_PER_DAY - 1e-3)
+        return self._params.start + elapsed
+
+
+class _Entry:
+    __slots__ = ("generation", "transitions")
+
+    def __init__(self, generation: int, transitions) -> None:
+        self.generation = generation
+        self.transitions = transitions
+
+
+class ScheduleExecutor:
+    """Apply schedule transitions through the ``LightingController`` when they fall due.
+
+    ``resolve_targets`` maps a schedule target (fixture address, device id or
+    ``group:<name>``) to fixture addresses at fire time.  Transitions more
+    than ``catch_up_seconds`` late (e.g. after a suspend) apply the setting
+    in effect *now* rather than the stale one.
+    """
+
+    def __init__(
+        self,
+        controller: LightingController,
+        resolve_targets: Optional[TargetResolver] = None,
+        clock: Callable[[], float] = time_module.time,
+        tz: Optional[tzinfo] = None,
+        ramp_step_minutes: float = 1.0,
+        catch_up_seconds: float = 5.0,
+    ) -> None:
+        self._controller = controller
+        self._resolve = resolve_targets or (lambda target: [target])
+        self._clock = clock
+        self._timeline = _Timeline(tz)
+        self._ramp_step = ramp_step_minutes
+        self._catch_up = catch_up_seconds
+        self._heap: List[Tuple[float, int, Hashable, int]] = []
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._generations = itertools.count(1)
+        self._sequence = itertools.count()
+        self._stale = 0
+        self._lock = threading.RLock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.fired = 0
+        self.errors = 0
+        self.max_lateness = 0.0
+        self.last_lateness: Optional[float] = None
+
+    # -- registration -------------------------------------------------
+
+    def upsert_schedule(self, schedule: Schedule) -> None:
+        self._upsert(("schedule", schedule.schedule_id), _ScheduleTransitions(schedule, self._timeline))
+
+    def upsert_group_schedule(self, schedule: GroupSchedule) -> None:
+        self._upsert(
+            ("group", schedule.device_id), _PhotoperiodTransitions(schedule, self._timeline, self._ramp_step)
+        )
+
+    def remove_schedule(self, schedule_id: str) -> None:
+        self._remove(("schedule", schedule_id))
+
+    def remove_group_schedule(self, device_id: str) -> None:
+        self._remove(("group", device_id))
+
+    def sync(self, schedules: Iterable[Schedule], group_schedules: Iterable[GroupSchedule]) -> None:
+        for schedule in schedules:
+            self.upsert_schedule(schedule)
+        for group_schedule in group_schedules:
+            self.upsert_group_schedule(group_schedule)
+
+    def _upsert(self, key: Hashable, transitions) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._stale += 1
+            entry = self._entries[key] = _Entry(next(self._generations), transitions)
+            self._push(key, entry, self._clock())
+            self._maybe_compact()
+        self._notify()
+
+    def _remove(self, key: Hashable) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stale += 1
+                self._maybe_compact()
+
+    def _push(self, key: Hashable, entry: _Entry, after: float) -> None:
+        when = entry.transitions.next_after(after)
+        if when is not None:
+            heapq.heappush(self._heap, (when, next(self._sequence), key, entry.generation))
+
+    def _maybe_compact(self) -> None:
+        # Rebuild once superseded items outnumber live ones; amortised O(1) per update.
+        if self._stale > 64 and self._stale > len(self._entries):
+            self._heap = [item for item in self._heap if self._is_live(item)]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _is_live(self, item: Tuple[float, int, Hashable, int]) -> bool:
+        entry = self._entries.get(item[2])
+        return entry is not None and entry.generation == item[3]
+
+    # -- firing -------------------------------------------------------
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            while self._heap and not self._is_live(self._heap[0]):
+                heapq.heappop(self._heap)
+                self._stale = max(self._stale - 1, 0)
+            return self._heap[0][0] if self._heap else None
+
+    def upcoming(self, limit: int = 20) -> List[Dict[str, object]]:
+        """Return the next ``limit`` live transitions, soonest first."""
+
+        with self._lock:
+            live = [item for item in heapq.nsmallest(limit + self._stale, self._heap) if self._is_live(item)]
+            return [
+                {"at": when, "schedule": list(key), "target": self._entries[key].transitions.target}
+                for when, _, key, _ in live[:limit]
+            ]
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Apply every transition due at or before ``now``; returns how many fired."""
+
+        now = self._clock() if now is None else now
+        due: List[Tuple[float, object]] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                item = heapq.heappop(self._heap)
+                if not self._is_live(item):
+                    self._stale = max(self._stale - 1, 0)
+                    continue
+                when, _, key, _ = item
+                entry = self._entries[key]
+                due.append((when, entry.transitions))
+                self._push(key, entry, max(when, now))
+        photoperiod_levels = self._photoperiod_levels(due, now)
+        for index, (when, transitions) in enumerate(due):
+            lateness = now - when
+            self.last_lateness = lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+            try:
+                setting = photoperiod_levels.get(index)
+                if setting is None:
+                    setting = transitions.setting_at(self._fire_time(when, now))
+                self._apply(transitions, setting)
+            except Exception:  # pylint: disable=broad-except
+                # One failing target (driver error, vanished group) must not stall the others.
+                self.errors += 1
+                LOGGER.exception("Schedule transition for %s failed", transitions.target)
+        self.fired += len(due)
+        return len(due)
+
+    def _fire_time(self, when: float, now: float) -> float:
+        return now if now - when > self._catch_up else when
+
+    def _photoperiod_levels(self, due: List[Tuple[float, object]], now: float) -> Dict[int, Setting]:
+        """Evaluate every due photoperiod in one ``intensity_at`` batch, keyed by index into ``due``."""
+
+        batch = [
+            (index, when, transitions)
+            for index, (when, transitions) in enumerate(due)
+            if isinstance(transitions, _PhotoperiodTransitions)
+        ]
+        if not batch:
+            return {}
+        try:
+            levels = intensity_at(
+                [transitions.schedule for _, _, transitions in batch],
+                [transitions.minute_at(self._fire_time(when, now)) for _, when, transitions in batch],
+            )
+        except Exception:  # pylint: disable=broad-except
+            # Fall back to evaluating each schedule on its own so one bad schedule is isolated.
+            LOGGER.exception("Batched photoperiod evaluation failed; evaluating schedules one by one")
+            return {}
+        return {index: (int(round(float(level) * 100)), None) for (index, _, _), level in zip(batch, levels)}
+
+    def _apply(self, transitions, setting: Setting) -> None:
+        outputs = {}
+        for address in self._resolve(transitions.target):
+            if self._controller.has_fixture(address):
+                outputs[address] = setting
+            else:
+                LOGGER.warning("Schedule target %s resolved to unknown fixture %s", transitions.target, address)
+        if outputs:
+            self._controller.set_outputs(outputs)
+
+    # -- asyncio driver -----------------------------------------------
+
+    def _notify(self) -> None:
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def run(self) -> None:
+        """Sleep until the next transition and fire it; survives errors until cancelled."""
+
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                self._wakeup.clear()
+                due = self.next_due()
+                delay = None if due is None else due - self._clock()
+                if delay is None or delay > 0:
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pylint: disable=broad-except
+                self.errors += 1
+                LOGGER.exception("Schedule executor tick failed (continuing)")
+                await asyncio.sleep(1.0)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "schedules": len(self._entries),
+                "heapSize": len(self._heap),
+                "nextDue": self.next_due(),
+                "fired": self.fired,
+                "errors": self.errors,
+                "lastLatenessMs": round(self.last_lateness * 1000, 3) if self.last_lateness is not None else None,
+                "maxLatenessMs": round(self.max_lateness * 1000, 3),
+            }
+
+
+__all__ = ["ScheduleExecutor"]
@@ -5,15 +5,17 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import hashlib
 import inspect
 import logging
 import os
 from datetime import date, datetime, time, timezone
-from typing import Any, Dict, List, Optional, cast
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, cast
 
-from fastapi import Body, Depends, FastAPI, Header, HTTPException, Query, status
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, validator
 import json
 import subprocess
@@ -22,7 +24,15 @@ import re
 
 from backend.ai_assist import SetupAssistError, SetupAssistService
 from backend.automation import AutomationEngine, lux_balancing_rule, occupancy_rule
-from backend.config import EnvironmentConfig, LightingFixture, load_config
+from backend.automation_metrics import PROMETHEUS_CONTENT_TYPE
+from backend.automation_replay import EventLogWriter
+from backend.automation_templates import (
+    DEFAULT_ACTION_BASE_URL,
+    ActionRegistry,
+    load_automation_templates,
+    template_rule,
+)
+from backend.config import EnvironmentConfig, LightingFixture, TelemetryConfig, load_config
 from backend.device_discovery import (
     discover_ble_devices,
     discover_kasa_devices,
@@ -36,9 +46,12 @@ from backend.device_models import (
     GroupSchedule,
     PhotoperiodScheduleConfig,
     Schedule,
+    SensorEvent,
     UserContext,
 )
 from backend.lighting import LightingController
+from backend.photoperiod import PhotoperiodCurveCache, intensity_at
+from backend.schedule_executor import ScheduleExecutor
 from backend.state import (
     DeviceDataStore,
     DeviceRegistry,
@@ -50,6 +63,9 @@ from backend.state import (
     ScheduleStore,
     SensorEventBuffer,
 )
+from backend.telemetry_segments import TelemetrySegmentStore
+from backend.telemetry_export import ARROW_STREAM_MEDIA_TYPE, PYARROW_AVAILABLE, iter_arrow, iter_csv
+from backend.telemetry_stream import TelemetryBroadcaster, sse_events
 
 try:
     from backend.logging_config import configure_logging as _configure_logging
@@ -111,6 +127,14 @@ def get_group_schedules() -> GroupScheduleStore:
     return cast(GroupScheduleStore, _require_state("GROUP_SCHEDULES"))
 
 
+def get_schedule_executor() -> ScheduleExecutor:
+    return cast(ScheduleExecutor, _require_state("SCHEDULE_EXECUTOR"))
+
+
+def get_photoperiod_cache() -> PhotoperiodCurveCache:
+    return cast(PhotoperiodCurveCache, _require_state("PHOTOPERIOD_CACHE"))
+
+
 def get_plan_store() -> PlanStore:
     return cast(PlanStore, _require_state("PLAN_STORE"))
 
@@ -123,6 +147,10 @@ def get_environment_telemetry() -> EnvironmentTelemetryStore:
     return cast(EnvironmentTelemetryStore, _require_state("ENVIRONMENT_TELEMETRY"))
 
 
+def get_telemetry_stream() -> TelemetryBroadcaster:
+    return cast(TelemetryBroadcaster, _require_state("TELEMETRY_STREAM"))
+
+
 def get_device_data_store() -> DeviceDataStore:
     return cast(DeviceDataStore, _require_state("DEVICE_DATA"))
 
@@ -162,8 +190,12 @@ app.state.GROUP_SCHEDULES = None
 app.state.PLAN_STORE = None
 app.state.ENVIRONMENT_STATE = None
 app.state.ENVIRONMENT_TELEMETRY = None
+app.state.TELEMETRY_STREAM = None
 app.state.DEVICE_DATA = None
 app.state.AUTOMATION = None
+app.state.EVENT_LOG = None
+app.state.SCHEDULE_EXECUTOR = None
+app.state.PHOTOPERIOD_CACHE = None
 app.state.AI_ASSIST_SERVICE = None
 app.state.ZONE_MAP = None
 app.state.FIXTURE_INVENTORY = None
@@ -207,7 +239,11 @@ def _parse_timestamp(value: Any) -> datetime:
         ts = float(value)
         if ts > 1e12:
             ts /= 1000.0
-        return datetime.fromtimestamp(ts, tz=timezone.utc)
+        try:
+            return datetime.fromtimestamp(ts, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError) as exc:
+            # e.g. 1e17 (OSError), 1e300 or inf (OverflowError), nan (ValueError)
+            raise ValueError("Timestamp out of range") from exc
     if isinstance(value, str):
         text = value.strip()
         if not text:
@@ -345,6 +381,15 @@ class LightingFixtureResponse(BaseModel):
     max_brightness: int
     spectrum_min: int
     spectrum_max: int
+    group: Optional[str] = None
+    zone: Optional[str] = None
+    room: Optional[str] = None
+
+
+class LightingTargetRequest(BaseModel):
+    target: str = Field(..., description="Fixture address or name, or group:/zone:/room:<name>")
+    brightness: int = Field(..., ge=0, le=100)
+    spectrum: Optional[int] = Field(None, description="Optional spectrum/temperature value")
 
 
 class DeviceDataPatch(BaseModel):
@@ -640,12 +685,32 @@ def _resolve_fixture(device_identifier: str) -> tuple[str, LightingFixture]:
     if candidate in device_id_by_address:
         resolved = device_id_by_address[candidate]
         return resolved, device_id_map[resolved]
-    for device_id, fixture in device_id_map.items():
-        if fixture.name == candidate:
-            return device_id, fixture
+    fixture = get_controller().index.by_name(candidate)
+    if fixture is not None and fixture.address in device_id_by_address:
+        resolved = device_id_by_address[fixture.address]
+        return resolved, device_id_map[resolved]
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
 
 
+def _schedule_targets(target: str) -> List[str]:
+    """Resolve a schedule target (device id, address, fixture name or scope target) to addresses."""
+
+    addresses = get_controller().index.resolve(target)
+    if addresses:
+        return addresses
+    # Groups without indexed members fall back to a fixture of that name or device id.
+    group = _extract_group(target)
+    candidate = group or target.strip()
+    try:
+        _, fixture = _resolve_fixture(candidate)
+    except HTTPException:
+        if group is not None:
+            LOGGER.debug("Schedule group %s has no matching fixtures", group)
+            return []
+        return [candidate]
+    return [fixture.address]
+
+
 def _hex_to_channels(value: str) -> List[int]:
     stripped = value.strip()
     if stripped.startswith("0x"):
@@ -763,6 +828,42 @@ async def list_group_schedules(
     return {"status": "ok", "schedules": [_serialize_group_schedule(entry) for entry in schedules]}
 
 
+@app.get("/sched/preview")
+async def preview_group_schedules(
+    day: Optional[date] = Query(None, alias="date"),
+    group: Optional[str] = None,
+    step_minutes: int = Query(15, alias="stepMinutes", ge=1, le=1440),
+    user: UserContext = Depends(get_user_context),
+) -> Dict[str, Any]:
+    """Intensity curves (percent, local wall clock) for the accessible group schedules."""
+
+    if group and not user.can_access_group(group):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied for group")
+
+    schedules: List[GroupSchedule] = []
+    for entry in get_group_schedules().list(group=group):
+        target_group = entry.target_group()
+        if target_group and not user.can_access_group(target_group):
+            continue
+        schedules.append(entry)
+
+    now = datetime.now()
+    day = day or now.date()
+    curves = get_photoperiod_cache().curves(schedules)
+    # The executor runs on the host clock, so "now" is only meaningful for today's curve.
+    current = intensity_at(schedules, now.hour * 60 + now.minute) if day == now.date() else None
+    previews = []
+    for index, (schedule, curve) in enumerate(zip(schedules, curves)):
+        previews.append(
+            {
+                "deviceId": schedule.device_id,
+                "intensity": [round(float(level) * 100, 1) for level in curve[::step_minutes]],
+                "current": None if current is None else round(float(current[index]) * 100, 1),
+            }
+        )
+    return {"status": "ok", "date": day.isoformat(), "stepMinutes": step_minutes, "schedules": previews}
+
+
 @app.post("/sched", status_code=status.HTTP_201_CREATED)
 async def save_group_schedule(
     request: GroupScheduleRequest, user: UserContext = Depends(get_user_context)
@@ -774,9 +875,30 @@ async def save_group_schedule(
 
     schedule = request.to_group_schedule()
     saved = get_group_schedules().upsert(schedule)
+    executor = getattr(app.state, "SCHEDULE_EXECUTOR", None)
+    if executor is not None:
+        executor.upsert_group_schedule(saved)
     return {"status": "ok", "schedule": _serialize_group_schedule(saved)}
 
 
+@app.delete("/sched")
+async def delete_group_schedule(
+    device_id: str = Query(..., alias="deviceId"), user: UserContext = Depends(get_user_context)
+) -> Dict[str, Any]:
+    store = get_group_schedules()
+    schedule = store.get(device_id)
+    if schedule is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Schedule not found")
+    target_group = schedule.target_group()
+    if target_group and not user.can_access_group(target_group):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User cannot access target group")
+    store.delete(device_id)
+    executor = getattr(app.state, "SCHEDULE_EXECUTOR", None)
+    if executor is not None:
+        executor.remove_group_schedule(device_id)
+    return {"status": "ok", "deviceId": device_id}
+
+
 @app.get("/plans")
 async def list_plans() -> Dict[str, Any]:
     store = get_plan_store()
@@ -831,42 +953,71 @@ async def publish_plans(payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
     return response
 
 
+def _environment_etag(
+    identifier: str, range_seconds: Optional[int], points: Optional[int], stats_only: bool = False
+) -> str:
+    token = get_environment_telemetry().cache_token(range_seconds, points, stats_only)
+    digest = hashlib.sha1(
+        f"{identifier}|{token}|{get_environment_state().version}".encode("utf-8")
+    ).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
 @app.get("/env")
 async def get_environment(
+    response: Response,
     scope: Optional[str] = Query(None),
     time_range: Optional[str] = Query(None, alias="range"),
     zone_id: Optional[str] = Query(None, alias="zoneId"),
-) -> Dict[str, Any]:
+    points: Optional[int] = Query(None, ge=1, description="Maximum history points per metric"),
+    stats: Optional[str] = Query(
+        None, description="Set to 'only' to return per-metric summary statistics without history"
+    ),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+) -> Any:
     range_seconds = _parse_time_range(time_range)
     identifier = (scope or zone_id or "").strip()
-    response: Dict[str, Any] = {"status": "ok"}
+    stats_only = (stats or "").strip().lower() == "only"
 
+    etag = _environment_etag(identifier, range_seconds, points, stats_only)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    payload: Dict[str, Any] = {"status": "ok"}
     telemetry_store = get_environment_telemetry()
     state_store = get_environment_state()
 
     if identifier:
-        telemetry_zone = telemetry_store.get_zone(identifier, range_seconds)
+        telemetry_zone = telemetry_store.get_zone(identifier, range_seconds, points, stats_only)
         if telemetry_zone:
-            response["zone"] = telemetry_zone
+            payload["zone"] = telemetry_zone
         else:
             zone = state_store.get_zone(identifier)
             if zone is not None:
-                response["zone"] = zone
+                payload["zone"] = zone
             else:
                 # Instead of 404, return empty zone for missing scope
-                response["zone"] = {}
+                payload["zone"] = {}
     else:
-        response["zones"] = telemetry_store.list_zones(range_seconds)
+        payload["zones"] = telemetry_store.list_zones(range_seconds, points, stats_only)
 
-    env_snapshot = state_store.snapshot()
+    env_snapshot = state_store.shared_snapshot()
     if env_snapshot:
-        response["env"] = env_snapshot
+        payload["env"] = env_snapshot
 
     last_updated = telemetry_store.last_updated()
     if last_updated:
-        response["updatedAt"] = last_updated
+        payload["updatedAt"] = last_updated
 
-    return response
+    return payload
 
 
 @app.post("/env", status_code=status.HTTP_200_OK)
@@ -956,6 +1107,164 @@ async def upsert_environment(payload: Dict[str, Any] = Body(...)) -> Dict[str, A
         response.setdefault(key, value)
     return response
 
+_BULK_BATCH_SIZE = 500
+_BULK_MAX_ERRORS = 20
+
+
+def _parse_bulk_line(line: bytes) -> tuple[str, datetime, Dict[str, Any], Dict[str, Any]]:
+    try:
+        payload = json.loads(line)
+    except ValueError as exc:
+        raise ValueError("invalid JSON") from exc
+    if not isinstance(payload, dict):
+        raise ValueError("each line must be a JSON object")
+    scope = _extract_scope(payload)
+    if not scope:
+        raise ValueError("scope is required for telemetry payloads")
+    sensors = payload.get("sensors")
+    if not isinstance(sensors, dict) or not sensors:
+        raise ValueError("sensors must be a non-empty object")
+    moment = _parse_timestamp(payload.get("ts") or payload.get("timestamp"))
+    return scope, moment, sensors, _collect_metadata(payload)
+
+
+@app.post("/env/bulk", status_code=status.HTTP_200_OK)
+async def bulk_ingest_environment(request: Request) -> Dict[str, Any]:
+    """Ingest newline-delimited JSON telemetry straight from the request stream.
+
+    Each line uses the same shape as a single ``POST /env`` telemetry payload.
+    Lines are parsed as they arrive and applied to the store in batches;
+    the response is a compact acknowledgement rather than rendered zones.
+    """
+
+    telemetry_store = get_environment_telemetry()
+    accepted = 0
+    rejected = 0
+    errors: List[Dict[str, Any]] = []
+    batch: List[tuple[str, datetime, Dict[str, Any], Dict[str, Any]]] = []
+    line_number = 0
+    pending = b""
+
+    def handle(line: bytes) -> None:
+        nonlocal line_number, rejected
+        line_number += 1
+        if not line.strip():
+            return
+        try:
+            batch.append(_parse_bulk_line(line))
+        except ValueError as exc:
+            rejected += 1
+            if len(errors) < _BULK_MAX_ERRORS:
+                errors.append({"line": line_number, "error": str(exc)})
+
+    async def apply_batch() -> None:
+        nonlocal accepted, rejected
+        if not batch:
+            return
+        readings = list(batch)
+        batch.clear()
+        # Ingest takes the per-scope locks and updates rollups; keep it off the event loop.
+        batch_accepted, batch_rejected = await asyncio.to_thread(telemetry_store.add_readings, readings)
+        accepted += batch_accepted
+        rejected += batch_rejected
+
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            handle(line)
+        if len(batch) >= _BULK_BATCH_SIZE:
+            await apply_batch()
+    handle(pending)
+    await apply_batch()
+
+    if not accepted and not rejected:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No telemetry lines supplied")
+
+    response: Dict[str, Any] = {"status": "ok", "accepted": accepted, "rejected": rejected}
+    if errors:
+        response["errors"] = errors
+    last_updated = telemetry_store.last_updated()
+    if last_updated:
+        response["updatedAt"] = last_updated
+    return response
+
+
+@app.get("/env/stream")
+async def stream_environment(
+    request: Request,
+    scope: Optional[str] = Query(None, description="Comma-separated scopes or names to follow"),
+) -> StreamingResponse:
+    """Push live telemetry deltas to the client as Server-Sent Events.
+
+    Every ingest emits one ``telemetry`` event per scope carrying the newest
+    sample, current value and ``updatedAt`` of each metric it touched.  A
+    client that falls behind its queue receives ``overflow`` and is
+    disconnected; it should refetch ``/env`` and resubscribe.
+    """
+
+    scopes = [item.strip() for item in scope.split(",") if item.strip()] if scope else None
+    broadcaster = get_telemetry_stream()
+    subscription = broadcaster.subscribe(scopes)
+
+    async def events():
+        try:
+            async for chunk in sse_events(subscription, request.is_disconnected):
+                yield chunk
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/env/export")
+async def export_environment(
+    scope: Optional[str] = Query(None, description="Comma-separated scopes or names; all when omitted"),
+    start: Optional[str] = Query(None, description="ISO-8601 or epoch start of the window"),
+    end: Optional[str] = Query(None, description="ISO-8601 or epoch end of the window"),
+    time_range: Optional[str] = Query(None, alias="range", description="Window ending now, e.g. 24h"),
+    export_format: str = Query("csv", alias="format", pattern="^(csv|arrow)$"),
+) -> StreamingResponse:
+    """Stream raw telemetry samples as chunked CSV or Arrow IPC record batches.
+
+    Rows are generated straight from the store's column chunks by a sync
+    generator, which Starlette drives from its threadpool so large exports
+    neither buffer in memory nor block the event loop.
+    """
+
+    try:
+        start_ts = _parse_timestamp(start).timestamp() if start else None
+        end_ts = _parse_timestamp(end).timestamp() if end else None
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    range_seconds = _parse_time_range(time_range)
+    if start_ts is None and range_seconds:
+        start_ts = (end_ts or datetime.now(timezone.utc).timestamp()) - range_seconds
+    scopes = [item.strip() for item in scope.split(",") if item.strip()] if scope else None
+
+    chunks = get_environment_telemetry().iter_export(scopes, start_ts, end_ts)
+    if export_format == "arrow":
+        if not PYARROW_AVAILABLE:
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="Arrow export requires pyarrow to be installed",
+            )
+        return StreamingResponse(
+            iter_arrow(chunks),
+            media_type=ARROW_STREAM_MEDIA_TYPE,
+            headers={"Content-Disposition": 'attachment; filename="telemetry.arrows"'},
+        )
+    return StreamingResponse(
+        iter_csv(chunks),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="telemetry.csv"'},
+    )
+
+
 @app.get("/discovery/devices", response_class=JSONResponse)
 async def discovery_devices() -> dict:
     """Perform a live scan for all supported device types and return fresh results."""
@@ -1033,6 +1342,7 @@ def _schedule_from_request(request: ScheduleRequest) -> Schedule:
 import contextlib
 log = logging.getLogger(__name__)
 app.state.discovery_task = None
+app.state.telemetry_maintenance_task = None
 
 async def _discovery_supervisor(
     config,
@@ -1069,10 +1379,47 @@ async def _discovery_supervisor(
         raise
 
 
+async def _telemetry_maintenance(store: EnvironmentTelemetryStore, interval_sec: float = 300.0):
+    """
+    Periodically trims expired telemetry off the ingest path. Never raises.
+    """
+    log.info("Starting telemetry maintenance with interval=%s", interval_sec)
+    try:
+        while True:
+            await asyncio.sleep(interval_sec)
+            try:
+                result = await asyncio.to_thread(store.compact)
+                log.info(
+                    "Telemetry compaction reclaimed %s samples and %s buckets in %.1f ms",
+                    result["reclaimedSamples"],
+                    result["reclaimedBuckets"],
+                    result["durationMs"],
+                )
+            except Exception:
+                log.exception("Telemetry compaction failed (non-fatal)")
+    except asyncio.CancelledError:
+        log.info("Telemetry maintenance cancelled")
+        raise
+
+
 
 
 
 
+def _open_event_log() -> Optional[Callable[[SensorEvent], None]]:
+    """Record sensor events for offline replay when AUTOMATION_EVENT_LOG names a file."""
+
+    path = os.getenv("AUTOMATION_EVENT_LOG")
+    if not path:
+        return None
+    try:
+        app.state.EVENT_LOG = EventLogWriter(Path(path))
+    except OSError as exc:
+        LOGGER.error("Automation event log disabled: %s", exc)
+        return None
+    return app.state.EVENT_LOG.append
+
+
 @app.on_event("startup")
 async def _startup() -> None:
     if app.state.CONFIG is None:
@@ -1125,6 +1472,9 @@ async def _startup() -> None:
     if app.state.GROUP_SCHEDULES is None:
         app.state.GROUP_SCHEDULES = GroupScheduleStore()
 
+    if app.state.PHOTOPERIOD_CACHE is None:
+        app.state.PHOTOPERIOD_CACHE = PhotoperiodCurveCache()
+
     if app.state.PLAN_STORE is None:
         app.state.PLAN_STORE = PlanStore()
 
@@ -1132,14 +1482,47 @@ async def _startup() -> None:
         app.state.ENVIRONMENT_STATE = EnvironmentStateStore()
 
     if app.state.ENVIRONMENT_TELEMETRY is None:
-        app.state.ENVIRONMENT_TELEMETRY = EnvironmentTelemetryStore()
+        telemetry_config = config.telemetry or TelemetryConfig()
+        segments: Optional[TelemetrySegmentStore] = None
+        if telemetry_config.storage_dir:
+            try:
+                segments = TelemetrySegmentStore(
+                    telemetry_config.storage_dir, rotation=telemetry_config.segment_rotation
+                )
+                segments.start()
+            except (OSError, ValueError) as exc:
+                LOGGER.error("Telemetry persistence disabled: %s", exc)
+        telemetry_store = EnvironmentTelemetryStore(
+            retention_hours=telemetry_config.retention_hours,
+            segments=segments,
+            compressed_budget_bytes=(
+                telemetry_config.compressed_history_kb * 1024 if telemetry_config.compressed_history_kb else None
+            ),
+        )
+        telemetry_store.recover()
+        app.state.ENVIRONMENT_TELEMETRY = telemetry_store
+
+    if app.state.TELEMETRY_STREAM is None:
+        broadcaster = TelemetryBroadcaster(queue_size=int(os.getenv("TELEMETRY_STREAM_QUEUE", "256")))
+        broadcaster.attach(asyncio.get_running_loop())
+        get_environment_telemetry().subscribe(broadcaster.publish)
+        app.state.TELEMETRY_STREAM = broadcaster
 
     if app.state.DEVICE_DATA is None:
         app.state.DEVICE_DATA = DeviceDataStore()
 
     automation_created = False
     if app.state.AUTOMATION is None:
-        app.state.AUTOMATION = AutomationEngine(get_controller(), get_schedules())
+        app.state.AUTOMATION = AutomationEngine(
+            get_controller(),
+            get_schedules(),
+            workers=int(os.getenv("AUTOMATION_WORKERS", "4")),
+            max_in_flight=int(os.getenv("AUTOMATION_MAX_IN_FLIGHT", "4")),
+            coalesce_seconds=int(os.getenv("AUTOMATION_COALESCE_MS", "250")) / 1000,
+            queue_size=int(os.getenv("AUTOMATION_QUEUE_SIZE", "1024")),
+            queue_policy=os.getenv("AUTOMATION_QUEUE_POLICY", "coalesce"),
+            recorder=_open_event_log(),
+        )
         automation_created = True
 
     fixture_inventory = list(config.lighting_inventory or [])
@@ -1166,6 +1549,9 @@ async def _startup() -> None:
     app.state.DEVICE_ID_BY_ADDRESS = device_id_by_address
 
     zone_map = {fixture.name: fixture.address for fixture in fixture_inventory}
+    # Declared zones fan out to all of their fixtures; fixture names take precedence.
+    for zone in get_controller().index.scope_names("zone"):
+        zone_map.setdefault(zone, f"zone:{zone}")
     app.state.ZONE_MAP = zone_map
 
     if zone_map and automation_created:
@@ -1176,6 +1562,25 @@ async def _startup() -> None:
         automation.register_rule(lux_balancing_rule(zone_map, target_lux))
         automation.register_rule(occupancy_rule(zone_map, occupied_level, vacant_level))
 
+    templates_path = os.getenv("AUTOMATION_TEMPLATES")
+    if templates_path and automation_created:
+        selected = [name.strip() for name in os.getenv("AUTOMATION_TEMPLATE_SET", "").split(",") if name.strip()]
+        try:
+            ruleset = load_automation_templates(templates_path, selected or None)
+        except (OSError, ValueError) as exc:
+            LOGGER.error("Failed to load automation templates from %s: %s", templates_path, exc)
+        else:
+            actions = ActionRegistry(os.getenv("AUTOMATION_ACTION_URL", DEFAULT_ACTION_BASE_URL))
+            get_automation().register_rule(template_rule(ruleset, actions))
+
+    await get_automation().start()
+
+    if app.state.SCHEDULE_EXECUTOR is None:
+        executor = ScheduleExecutor(get_controller(), _schedule_targets)
+        executor.sync(get_schedules().list(), get_group_schedules().list())
+        app.state.SCHEDULE_EXECUTOR = executor
+    get_schedule_executor().start()
+
     ai_service: Optional[SetupAssistService] = None
     if config.ai_assist and config.ai_assist.enabled:
         try:
@@ -1195,26 +1600,60 @@ async def _startup() -> None:
             )
         )
 
+    if not app.state.telemetry_maintenance_task:
+        telemetry_config = config.telemetry or TelemetryConfig()
+        app.state.telemetry_maintenance_task = asyncio.create_task(
+            _telemetry_maintenance(
+                get_environment_telemetry(),
+                interval_sec=max(telemetry_config.compaction_interval_seconds, 1.0),
+            )
+        )
+
 
 
 
 @app.on_event("shutdown")
 async def _shutdown():
-    t = getattr(app.state, "discovery_task", None)
-    if t:
-        t.cancel()
-        with contextlib.suppress(Exception):
-            await t
+    for name in ("discovery_task", "telemetry_maintenance_task"):
+        t = getattr(app.state, name, None)
+        if t:
+            t.cancel()
+            with contextlib.suppress(Exception, asyncio.CancelledError):
+                await t
+            setattr(app.state, name, None)
+    automation = getattr(app.state, "AUTOMATION", None)
+    if automation is not None:
+        await automation.stop()
+    executor = getattr(app.state, "SCHEDULE_EXECUTOR", None)
+    if executor is not None:
+        await executor.stop()
+    event_log = getattr(app.state, "EVENT_LOG", None)
+    if event_log is not None:
+        event_log.close()
+    telemetry_store = getattr(app.state, "ENVIRONMENT_TELEMETRY", None)
+    if telemetry_store is not None:
+        telemetry_store.close()
 
 
 @app.get("/health")
 async def health() -> dict:
-    return {
+    payload = {
         "status": "ok",
         "devices": len(get_registry().list()),
         "timestamp": _iso_now(),
         "version": app.version,
     }
+    telemetry_store = getattr(app.state, "ENVIRONMENT_TELEMETRY", None)
+    compaction = telemetry_store.last_compaction() if telemetry_store is not None else None
+    if compaction:
+        payload["telemetryCompaction"] = compaction
+    automation = getattr(app.state, "AUTOMATION", None)
+    if automation is not None:
+        payload["automationQueue"] = automation.queue_stats()
+    executor = getattr(app.state, "SCHEDULE_EXECUTOR", None)
+    if executor is not None:
+        payload["scheduleExecutor"] = executor.stats()
+    return payload
 
 
 @app.get("/healthz")
@@ -1222,6 +1661,22 @@ async def healthz() -> dict:
     return await health()
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus text exposition of automation rule and queue metrics."""
+
+    automation = get_automation()
+    return Response(
+        content=automation.metrics.render_prometheus(automation.queue_stats()),
+        media_type=PROMETHEUS_CONTENT_TYPE,
+    )
+
+
+@app.get("/automation/stats")
+async def automation_stats() -> dict:
+    return get_automation().stats()
+
+
 @app.post("/ai/setup-assist", response_model=SetupAssistResponse)
 async def setup_assist(request: SetupAssistRequest) -> SetupAssistResponse:
     service = get_ai_assist_service()
@@ -1259,7 +1714,7 @@ async def discover_plugs() -> Dict[str, Any]:
         get_config(),
         get_registry(),
         get_buffer(),
-        event_handler=get_automation().publish,
+        event_handler=get_automation().offer,
     )
     plugs = _collect_plug_payloads()
     return {"ok": True, "refreshedAt": _iso_now(), "count": len(plugs), "plugs": plugs}
@@ -1305,7 +1760,7 @@ async def trigger_discovery() -> dict:
             get_config(),
             get_registry(),
             get_buffer(),
-            get_automation().publish,
+            get_automation().offer,
         )
     )
     return {"status": "scheduled"}
@@ -1763,11 +2218,45 @@ async def list_fixtures() -> List[LightingFixtureResponse]:
             max_brightness=fixture.max_brightness,
             spectrum_min=fixture.spectrum_min,
             spectrum_max=fixture.spectrum_max,
+            group=fixture.group,
+            zone=fixture.zone,
+            room=fixture.room,
         )
         for fixture in get_fixture_inventory()
     ]
 
 
+@app.get("/lighting/changes")
+async def lighting_changes(since: int = Query(0, ge=0)) -> dict:
+    """Fixture states changed after version ``since``; poll again with the returned version."""
+
+    version, changes = get_lighting_state().changes_since(since)
+    return {"version": version, "changes": changes}
+
+
+@app.post("/lighting/targets")
+async def set_lighting_target(request: LightingTargetRequest, user: UserContext = Depends(get_user_context)) -> dict:
+    """Apply one level to every fixture in a target as a single batch.
+
+    Room, zone, name and address targets can span several groups, so access
+    is checked against the group of every fixture the target resolves to.
+    """
+
+    group = _extract_group(request.target)
+    if group and not user.can_access_group(group):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User cannot access target group")
+    controller = get_controller()
+    addresses = controller.index.resolve(request.target)
+    if not addresses:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No fixtures match target")
+    for address in addresses:
+        fixture_group = controller.index.get(address).group
+        if fixture_group and not user.can_access_group(fixture_group):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User cannot access target group")
+    applied = controller.set_outputs({address: (request.brightness, request.spectrum) for address in addresses})
+    return {"status": "ok", "target": request.target, "count": len(applied), "fixtures": applied}
+
+
 @app.get("/schedules")
 async def list_schedules(user: UserContext = Depends(get_user_context), group: Optional[str] = None) -> List[dict]:
     if group and not user.can_access_group(group):
@@ -1797,9 +2286,27 @@ async def create_schedule(request: ScheduleRequest, user: UserContext = Depends(
     if not user.can_access_group(schedule.group):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User cannot access target group")
     get_automation().apply_schedule(schedule, user)
+    executor = getattr(app.state, "SCHEDULE_EXECUTOR", None)
+    if executor is not None:
+        executor.upsert_schedule(schedule)
     return {"status": "created", "schedule_id": schedule.schedule_id}
 
 
+@app.delete("/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: str, user: UserContext = Depends(get_user_context)) -> dict:
+    store = get_schedules()
+    schedule = store.get(schedule_id)
+    if schedule is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Schedule not found")
+    if not user.can_access_group(schedule.group):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User cannot access target group")
+    store.delete(schedule_id)
+    executor = getattr(app.state, "SCHEDULE_EXECUTOR", None)
+    if executor is not None:
+        executor.remove_schedule(schedule_id)
+    return {"status": "deleted", "schedule_id": schedule_id}
+
+
 @app.get("/switchbot/{device_id}/status")
 async def switchbot_status(device_id: str) -> dict:
     config = get_config()
@@ -1,14 +1,35 @@
 """In-memory state containers for devices, schedules, and lighting."""
 from __future__ import annotations
 
+import contextlib
+import logging
 import math
+import sys
 import threading
+import time
+from array import array
+from collections import OrderedDict, deque
 from copy import deepcopy
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 
 from .config import LightingFixture
 from .device_models import Device, GroupSchedule, Schedule, SensorEvent
+from .telemetry import (
+    ROLLUP_TIERS,
+    SAMPLE_DROPPED,
+    SampleRing,
+    budget_resolution,
+    build_rollup_tiers,
+    resolution_label,
+    select_rollup,
+)
+from .telemetry_codec import CompressedSeries
+from .telemetry_segments import TelemetrySegmentStore
+from .telemetry_stats import build_stats_windows, summarise_windows
+
+LOGGER = logging.getLogger(__name__)
 
 
 class DeviceRegistry:
@@ -32,27 +53,64 @@ class DeviceRegistry:
 
 
 class SensorEventBuffer:
-    """Fixed-size buffer of sensor events to power automations."""
+    """Fixed-size buffer of sensor events to power automations.
+
+    Events live in a bounded deque; a per-topic deque index mirrors it so the
+    latest event for a topic is O(1) and per-topic reads never scan others.
+    """
 
     def __init__(self, max_events: int = 1000) -> None:
-        self._events: List[SensorEvent] = []
+        self._events: Deque[SensorEvent] = deque(maxlen=max(max_events, 1))
+        self._by_topic: Dict[str, Deque[SensorEvent]] = {}
         self._max_events = max_events
         self._lock = threading.RLock()
 
     def add_event(self, event: SensorEvent) -> None:
         with self._lock:
+            if len(self._events) == self._events.maxlen:
+                evicted = self._events[0]
+                topic_events = self._by_topic.get(evicted.topic)
+                if topic_events:
+                    topic_events.popleft()
+                    if not topic_events:
+                        del self._by_topic[evicted.topic]
             self._events.append(event)
-            if len(self._events) > self._max_events:
-                self._events = self._events[-self._max_events :]
+            topic_events = self._by_topic.get(event.topic)
+            if topic_events is None:
+                topic_events = self._by_topic[event.topic] = deque()
+            topic_events.append(event)
 
     def latest(self, topic: Optional[str] = None) -> Optional[SensorEvent]:
         with self._lock:
             if topic is None:
                 return self._events[-1] if self._events else None
+            topic_events = self._by_topic.get(topic)
+            return topic_events[-1] if topic_events else None
+
+    def since(self, ts: datetime) -> List[SensorEvent]:
+        """Return events received strictly after ``ts``, oldest first."""
+
+        with self._lock:
+            newer: List[SensorEvent] = []
             for event in reversed(self._events):
-                if event.topic == topic:
-                    return event
-            return None
+                if event.received_at <= ts:
+                    break
+                newer.append(event)
+        newer.reverse()
+        return newer
+
+    def by_topic(self, topic: str, n: Optional[int] = None) -> List[SensorEvent]:
+        """Return the newest ``n`` events for ``topic`` (all when ``n`` is None), oldest first."""
+
+        with self._lock:
+            topic_events = self._by_topic.get(topic)
+            if not topic_events:
+                return []
+            if n is None or n >= len(topic_events):
+                return list(topic_events)
+            if n <= 0:
+                return []
+            return list(islice(topic_events, len(topic_events) - n, None))
 
 
 def _merge_dicts(base: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
@@ -72,30 +130,79 @@ def _utc_isoformat(ts: Optional[datetime] = None) -> str:
     return moment.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 
+def _epoch_isoformat(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
 class LightingState:
-    """Track the last known output for fixtures to provide fail-safe defaults."""
+    """Track the last known output for fixtures to provide fail-safe defaults.
+
+    Writes that leave brightness and spectrum unchanged are skipped.  Every
+    real change stamps the fixture with the next value of a store-wide
+    counter, so each fixture's ``version`` only increases and
+    ``changes_since`` can answer "what changed after version N".
+    """
 
     def __init__(self, fixtures: Iterable[LightingFixture]) -> None:
         self._state: Dict[str, Dict[str, int]] = {}
         self._lock = threading.RLock()
+        self._version = 0
+        # Compact change log: one entry per fixture, ordered by its latest version.
+        self._changes: "OrderedDict[str, int]" = OrderedDict()
+        self.skipped_writes = 0
         for fixture in fixtures:
             self._state[fixture.address] = {
                 "brightness": fixture.min_brightness,
                 "spectrum": fixture.spectrum_min,
                 "updated_at": int(datetime.utcnow().timestamp()),
+                "version": 0,
             }
 
     def apply_setting(self, address: str, brightness: int, spectrum: Optional[int] = None) -> Dict[str, int]:
+        return self.apply_settings({address: (brightness, spectrum)})[address]
+
+    def apply_settings(self, settings: Mapping[str, Tuple[int, Optional[int]]]) -> Dict[str, Dict[str, int]]:
+        """Apply ``{address: (brightness, spectrum)}`` under one lock with one timestamp."""
+
+        applied: Dict[str, Dict[str, int]] = {}
         with self._lock:
-            state = self._state.setdefault(
-                address,
-                {"brightness": brightness, "spectrum": spectrum or 0, "updated_at": 0},
-            )
-            state["brightness"] = brightness
-            if spectrum is not None:
-                state["spectrum"] = spectrum
-            state["updated_at"] = int(datetime.utcnow().timestamp())
-            return dict(state)
+            now = int(datetime.utcnow().timestamp())
+            for address, (brightness, spectrum) in settings.items():
+                state = self._state.get(address)
+                if state is None:
+                    state = self._state[address] = {"brightness": brightness, "spectrum": spectrum or 0}
+                elif state["brightness"] == brightness and (spectrum is None or state["spectrum"] == spectrum):
+                    self.skipped_writes += 1
+                    applied[address] = dict(state)
+                    continue
+                state["brightness"] = brightness
+                if spectrum is not None:
+                    state["spectrum"] = spectrum
+                state["updated_at"] = now
+                self._version += 1
+                state["version"] = self._version
+                self._changes[address] = self._version
+                self._changes.move_to_end(address)
+                applied[address] = dict(state)
+        return applied
+
+    @property
+    def version(self) -> int:
+        """Version of the most recent change; pass it back to ``changes_since``."""
+
+        with self._lock:
+            return self._version
+
+    def changes_since(self, version: int) -> Tuple[int, Dict[str, Dict[str, int]]]:
+        """Return the current version and the state of every fixture changed after ``version``."""
+
+        with self._lock:
+            changed: Dict[str, Dict[str, int]] = {}
+            for address in reversed(self._changes):
+                if self._changes[address] <= version:
+                    break
+                changed[address] = dict(self._state[address])
+            return self._version, changed
 
     def get_state(self, address: str) -> Optional[Dict[str, int]]:
         with self._lock:
@@ -113,6 +220,14 @@ class ScheduleStore:
         with self._lock:
             self._schedules[schedule.schedule_id] = schedule
 
+    def get(self, schedule_id: str) -> Optional[Schedule]:
+        with self._lock:
+            return self._schedules.get(schedule_id)
+
+    def delete(self, schedule_id: str) -> None:
+        with self._lock:
+            self._schedules.pop(schedule_id, None)
+
     def list(self, group: Optional[str] = None) -> List[Schedule]:
         with self._lock:
             if group is None:
@@ -197,53 +312,142 @@ class PlanStore:
 
 
 class EnvironmentStateStore:
-    """Maintain the latest environmental targets and telemetry configuration."""
+    """Maintain the latest environmental targets and telemetry configuration.
+
+    Zones are published copy-on-write under per-zone locks so updates to
+    different zones proceed concurrently; the store-level lock only guards
+    the root document, the zone map and the version counter, and snapshots
+    are deep-copied outside of it.  Locks are taken zone-first.
+    """
 
     def __init__(self) -> None:
-        self._state: Dict[str, Any] = {"rooms": {}, "zones": {}}
+        self._state: Dict[str, Any] = {"rooms": {}}
+        self._zones: Dict[str, Any] = {}
+        self._zone_locks: Dict[str, threading.RLock] = {}
         self._lock = threading.RLock()
+        self._version = 0
+        self._snapshot_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+
+    @property
+    def version(self) -> int:
+        """Monotonic counter bumped on every mutation."""
+
+        with self._lock:
+            return self._version
+
+    def _zone_lock(self, zone_id: str) -> threading.RLock:
+        with self._lock:
+            lock = self._zone_locks.get(zone_id)
+            if lock is None:
+                lock = self._zone_locks[zone_id] = threading.RLock()
+            return lock
 
     def upsert_rooms(self, rooms: Dict[str, Any]) -> Dict[str, Any]:
         with self._lock:
-            current_rooms = self._state.get("rooms", {})
-            merged = _merge_dicts(current_rooms, rooms)
-            self._state["rooms"] = merged
-            self._state["updatedAt"] = _utc_isoformat()
-            return deepcopy(merged)
+            merged = _merge_dicts(self._state.get("rooms", {}), rooms)
+            self._state = {**self._state, "rooms": merged, "updatedAt": _utc_isoformat()}
+            self._version += 1
+        return deepcopy(merged)
 
     def upsert_zone(self, zone_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        with self._lock:
-            zones = self._state.setdefault("zones", {})
-            existing = zones.get(zone_id, {"zoneId": zone_id})
+        with self._zone_lock(zone_id):
+            existing = self._zones.get(zone_id)
+            if not isinstance(existing, dict):
+                existing = {"zoneId": zone_id}
             incoming = dict(payload)
             incoming["zoneId"] = zone_id
             incoming["updatedAt"] = _utc_isoformat()
-            zones[zone_id] = _merge_dicts(existing, incoming)
-            self._state["updatedAt"] = _utc_isoformat()
-            return deepcopy(zones[zone_id])
+            merged = _merge_dicts(existing, incoming)
+            with self._lock:
+                self._zones[zone_id] = merged
+                self._state = {**self._state, "updatedAt": _utc_isoformat()}
+                self._version += 1
+        return deepcopy(merged)
 
     def merge(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        with self._lock:
-            self._state = _merge_dicts(self._state, payload)
-            self._state["updatedAt"] = _utc_isoformat()
-            return self.snapshot()
+        """Deep-merge ``payload`` into the state, as ``_merge_dicts`` does.
+
+        A dict zone is merged into the existing zone and any other value
+        replaces it.  A ``zones`` entry that is not a mapping of zone ids is
+        ignored, since the zone map itself cannot be replaced by a scalar.
+        """
+
+        updates = dict(payload)
+        zone_updates = updates.pop("zones", None)
+        zone_updates = zone_updates if isinstance(zone_updates, dict) else {}
+        with contextlib.ExitStack() as stack:
+            for zone_id in sorted(zone_updates):
+                stack.enter_context(self._zone_lock(zone_id))
+            with self._lock:
+                for zone_id, zone_payload in zone_updates.items():
+                    existing = self._zones.get(zone_id)
+                    if isinstance(zone_payload, dict) and isinstance(existing, dict):
+                        self._zones[zone_id] = _merge_dicts(existing, zone_payload)
+                    else:
+                        self._zones[zone_id] = deepcopy(zone_payload)
+                state = _merge_dicts(self._state, updates)
+                state["updatedAt"] = _utc_isoformat()
+                self._state = state
+                self._version += 1
+        return self.snapshot()
 
     def get_zone(self, zone_id: str) -> Optional[Dict[str, Any]]:
+        zone = self._zones.get(zone_id)
+        return deepcopy(zone) if zone else None
+
+    def _published(self) -> Tuple[int, Dict[str, Any]]:
+        # Published dicts are never mutated, so a shallow copy of the roots is
+        # a consistent view that can be deep-copied without holding the lock.
         with self._lock:
-            zone = self._state.get("zones", {}).get(zone_id)
-            return deepcopy(zone) if zone else None
+            return self._version, {**self._state, "zones": dict(self._zones)}
 
     def snapshot(self) -> Dict[str, Any]:
+        return deepcopy(self._published()[1])
+
+    def shared_snapshot(self) -> Dict[str, Any]:
+        """Return a snapshot copied once per version; callers must not mutate it."""
+
+        cached = self._snapshot_cache
         with self._lock:
-            return deepcopy(self._state)
+            if cached is not None and cached[0] == self._version:
+                return cached[1]
+        version, published = self._published()
+        snapshot = deepcopy(published)
+        self._snapshot_cache = (version, snapshot)
+        return snapshot
 
     def clear(self) -> None:
         with self._lock:
-            self._state = {"rooms": {}, "zones": {}}
+            self._state = {"rooms": {}}
+            self._zones = {}
+            self._version += 1
 
 
 class EnvironmentTelemetryStore:
-    """Track live environmental telemetry for scopes/rooms with history retention."""
+    """Track live environmental telemetry for scopes/rooms with history retention.
+
+    Raw samples are kept in a bounded ring per metric; 1m/5m/1h rollups are
+    maintained on ingest so range queries beyond the raw window (or beyond a
+    caller's point budget) are answered from pre-aggregated buckets.  With
+    ``compressed_budget_bytes`` set, raw history is instead kept in a
+    Gorilla-compressed :class:`CompressedSeries` bounded by that many bytes
+    per metric, so full-resolution history can span the retention window.
+    Running count/min/max/mean/stddev/p95 statistics are kept per metric for
+    rolling windows ending at the time of the query, so a sensor that has
+    gone quiet ages out of them.
+
+    Retention is not applied on ingest; ``compact`` trims expired samples
+    and buckets in bulk and is run periodically by the server.
+
+    Each scope carries its own lock guarding its series and render cache.
+    The store-level lock only protects the scope map, lookups and version
+    counters and is never held while a scope is ingested or rendered, so a
+    slow render of one room does not stall ingest for another.  Locks are
+    always taken scope-first, then store-level.
+    """
+
+    # Raw history replayed on startup for compressed series: the span of the finest rollup tier.
+    RECOVERY_HOT_SECONDS = ROLLUP_TIERS[0][1]
 
     _ALIASES = {
         "temperature": "tempC",
@@ -260,13 +464,40 @@ class EnvironmentTelemetryStore:
         "carbon_dioxide": "co2",
     }
 
-    def __init__(self, retention_hours: int = 168, max_samples: int = 288) -> None:
+    def __init__(
+        self,
+        retention_hours: int = 168,
+        max_samples: int = 288,
+        segments: Optional[TelemetrySegmentStore] = None,
+        compressed_budget_bytes: Optional[int] = None,
+    ) -> None:
         self._scopes: Dict[str, Dict[str, Any]] = {}
         self._lookup: Dict[str, str] = {}
         self._retention_seconds = max(retention_hours, 0) * 3600
         self._max_samples = max(max_samples, 1)
+        self._segments = segments
+        self._compressed_budget = compressed_budget_bytes if compressed_budget_bytes else None
+        # Stats windows only move a slot at a time, so renders may be reused within the finest slot.
+        self._stats_quantum = min(window.width for window in build_stats_windows(self._retention_seconds))
         self._lock = threading.RLock()
         self._last_updated: Optional[float] = None
+        self._version = 0
+        self._list_cache: Dict[
+            Tuple[Optional[int], Optional[int], bool], Tuple[int, Tuple[int, int], List[Dict[str, Any]]]
+        ] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._last_compaction: Optional[Dict[str, Any]] = None
+
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Register ``listener`` to receive a per-scope delta after each ingest."""
+
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners = [*self._listeners, listener]
+
+    def unsubscribe(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            self._listeners = [item for item in self._listeners if item != listener]
 
     def _normalise_key(self, key: str) -> Optional[str]:
         if not isinstance(key, str):
@@ -313,101 +544,629 @@ class EnvironmentTelemetryStore:
         moment = timestamp.astimezone(timezone.utc)
         epoch = moment.timestamp()
 
+        entry = self._ensure_scope(scope_key)
+        with entry["lock"]:
+            touched: Optional[Dict[str, Tuple[float, float]]] = {} if self._listeners else None
+            self._ingest_into(entry, epoch, sensors, metadata, touched)
+            self._bump(entry, epoch)
+            deltas = [self._delta(entry, touched)] if touched else []
+        self._notify(deltas)
+        return self._render_cached(entry)
+
+    def add_readings(
+        self,
+        readings: Iterable[Tuple[str, datetime, Dict[str, Any], Optional[Dict[str, Any]]]],
+    ) -> Tuple[int, int]:
+        """Ingest a batch of ``(scope, timestamp, sensors, metadata)`` readings.
+
+        Readings are grouped by scope and applied under a single lock
+        acquisition without rendering anything.  Returns ``(accepted,
+        rejected)`` where a reading is rejected when it is malformed or
+        carries no usable sensor values.
+        """
+
+        grouped: Dict[str, List[Tuple[float, Dict[str, Any], Optional[Dict[str, Any]]]]] = {}
+        rejected = 0
+        for scope, timestamp, sensors, metadata in readings:
+            if (
+                not isinstance(scope, str)
+                or not scope.strip()
+                or not isinstance(timestamp, datetime)
+                or not isinstance(sensors, dict)
+                or not sensors
+            ):
+                rejected += 1
+                continue
+            grouped.setdefault(scope.strip(), []).append(
+                (timestamp.astimezone(timezone.utc).timestamp(), sensors, metadata)
+            )
+
+        accepted = 0
+        deltas: List[Dict[str, Any]] = []
+        for scope_key, items in grouped.items():
+            entry = self._ensure_scope(scope_key)
+            with entry["lock"]:
+                touched: Optional[Dict[str, Tuple[float, float]]] = {} if self._listeners else None
+                newest: Optional[float] = None
+                for epoch, sensors, metadata in items:
+                    if self._ingest_into(entry, epoch, sensors, metadata, touched):
+                        accepted += 1
+                        if newest is None or epoch > newest:
+                            newest = epoch
+                    else:
+                        rejected += 1
+                self._bump(entry, newest)
+                if touched:
+                    deltas.append(self._delta(entry, touched))
+        self._notify(deltas)
+        return accepted, rejected
+
+    def _ingest_into(
+        self,
+        entry: Dict[str, Any],
+        epoch: float,
+        sensors: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]],
+        touched: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> int:
+        """Apply one reading to ``entry`` and return how many metrics it recorded.
+
+        The caller must hold ``entry["lock"]``.
+
+        When ``touched`` is given it collects the newest sample ingested per
+        metric so listeners can be sent a delta instead of the whole zone.
+        """
+
+        scope_key = entry["scope"]
+        if metadata:
+            meta = entry.setdefault("meta", {})
+            for key, value in metadata.items():
+                if value is None:
+                    continue
+                meta[key] = value
+                if key in {"name", "label"} and isinstance(value, str) and value.strip():
+                    entry["name"] = value.strip()
+                    with self._lock:
+                        self._lookup[value.strip().lower()] = scope_key
+
+        recorded = 0
+        for raw_key, raw_value in sensors.items():
+            normalised_key = self._normalise_key(raw_key)
+            if not normalised_key:
+                continue
+            coerced = self._coerce_value(raw_value)
+            if coerced is None:
+                continue
+            self._record_sample(entry, normalised_key, epoch, coerced)
+            if self._segments is not None:
+                self._segments.append(scope_key, normalised_key, epoch, coerced)
+            if touched is not None:
+                seen = touched.get(normalised_key)
+                if seen is None or epoch >= seen[0]:
+                    touched[normalised_key] = (epoch, coerced)
+            recorded += 1
+
+        if recorded and (entry["updatedTs"] is None or epoch >= entry["updatedTs"]):
+            entry["updatedTs"] = epoch
+            entry["updatedAt"] = _utc_isoformat(datetime.fromtimestamp(epoch, timezone.utc))
+        return recorded
+
+    def _ensure_scope(self, scope_key: str) -> Dict[str, Any]:
         with self._lock:
-            entry = self._scopes.setdefault(
-                scope_key,
-                {
+            entry = self._scopes.get(scope_key)
+            if entry is None:
+                entry = {
                     "scope": scope_key,
                     "name": scope_key,
                     "sensors": {},
                     "meta": {},
                     "updatedAt": None,
-                },
-            )
-            self._lookup[scope_key.lower()] = scope_key
-
-            if metadata:
-                meta = entry.setdefault("meta", {})
-                for key, value in metadata.items():
-                    if value is None:
-                        continue
-                    meta[key] = value
-                    if key in {"name", "label"} and isinstance(value, str) and value.strip():
-                        entry["name"] = value.strip()
-                        self._lookup[value.strip().lower()] = scope_key
+                    "updatedTs": None,
+                    "version": 0,
+                    "renderCache": {},
+                    "lock": threading.RLock(),
+                }
+                self._scopes[scope_key] = entry
+                self._lookup[scope_key.lower()] = scope_key
+            return entry
+
+    def _resolve_scope(self, scope: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is None and isinstance(scope, str):
+                key = self._lookup.get(scope.lower())
+                if key:
+                    entry = self._scopes.get(key)
+            return entry
+
+    def _new_series(self) -> Union[SampleRing, CompressedSeries]:
+        if self._compressed_budget:
+            return CompressedSeries(self._compressed_budget)
+        return SampleRing(self._max_samples)
+
+    def _ensure_metric(self, entry: Dict[str, Any], key: str) -> Dict[str, Any]:
+        sensors_map = entry["sensors"]
+        metric = sensors_map.get(key)
+        if metric is None:
+            metric = {
+                "series": self._new_series(),
+                "rollups": build_rollup_tiers(self._retention_seconds),
+                "stats": build_stats_windows(self._retention_seconds),
+                "current": None,
+                "updatedTs": None,
+                "memorySince": None,
+                "rollupSince": None,
+            }
+            sensors_map[key] = metric
+        return metric
 
-            sensors_map = entry.setdefault("sensors", {})
-            for raw_key, raw_value in sensors.items():
-                normalised_key = self._normalise_key(raw_key)
-                if not normalised_key:
-                    continue
-                coerced = self._coerce_value(raw_value)
-                if coerced is None:
-                    continue
-                metric = sensors_map.setdefault(normalised_key, {"samples": []})
-                samples = metric.setdefault("samples", [])
-                samples.insert(0, {"ts": epoch, "value": coerced})
+    def _record_sample(
+        self, entry: Dict[str, Any], key: str, epoch: float, value: float, rollups: bool = True
+    ) -> Dict[str, Any]:
+        metric = self._ensure_metric(entry, key)
+        series = metric["series"]
+        previous = series.upsert(epoch, value)
+        if previous is SAMPLE_DROPPED:
+            # Too old for the retained window: nothing was stored, so rollups and stats stay put.
+            return metric
+        for tier in metric["rollups"] if rollups else ():
+            if previous is None:
+                tier.add(epoch, value)
+            else:
+                tier.replace(epoch, previous, value)
+        for window in metric["stats"]:
+            if previous is None:
+                window.add(epoch, value)
+            else:
+                window.replace(epoch, previous, value)
+
+        # Back-filled samples extend history without rewinding the live value.
+        if metric["updatedTs"] is None or epoch >= metric["updatedTs"]:
+            metric["current"] = value
+            metric["updatedTs"] = epoch
+        return metric
+
+    def recover(self) -> int:
+        """Reload the hot window of every persisted series from disk.
+
+        Raw samples are replayed only for the hot window: the newest
+        ``max_samples`` records per metric or, with compression, the last
+        ``RECOVERY_HOT_SECONDS`` before its newest record.  Rollup tiers are
+        rebuilt from per-minute segment aggregates over their span instead of
+        from raw samples, and rolling stats cover only the replayed samples.
+        Older history stays on disk and is served from the segments by range
+        queries.  Returns the number of raw samples restored.
+        """
+
+        if self._segments is None:
+            return 0
+        restored = 0
+        since = None
+        if self._retention_seconds:
+            since = datetime.now(timezone.utc).timestamp() - self._retention_seconds
+            self._segments.prune(since)
+        # A compressed series is sized in bytes, not samples, so its hot window is bounded by age.
+        limit = sys.maxsize if self._compressed_budget else self._max_samples
+        for scope_key, key in self._segments.series():
+            latest = self._segments.tail(scope_key, key, 1, since)
+            if not latest:
+                continue
+            newest = latest[-1][0]
+            hot_since = since
+            if self._compressed_budget:
+                hot_since = max(newest - self.RECOVERY_HOT_SECONDS, since if since is not None else -math.inf)
+            records = self._segments.tail(scope_key, key, limit, hot_since)
+            oldest_on_disk = self._segments.oldest_ts(scope_key, key)
+            entry = self._ensure_scope(scope_key)
+            with entry["lock"]:
+                metric = self._ensure_metric(entry, key)
+                rollup_start = self._restore_rollups(scope_key, key, metric, newest, since)
+                if oldest_on_disk is not None and oldest_on_disk < rollup_start:
+                    metric["rollupSince"] = rollup_start
+                for ts, value in records:
+                    self._record_sample(entry, key, ts, value, rollups=False)
+                if oldest_on_disk is not None and oldest_on_disk < records[0][0]:
+                    metric["memorySince"] = records[0][0]
+                if entry["updatedTs"] is None or newest > entry["updatedTs"]:
+                    entry["updatedTs"] = newest
+                    entry["updatedAt"] = _utc_isoformat(datetime.fromtimestamp(newest, timezone.utc))
+                self._bump(entry, newest)
+            restored += len(records)
+        LOGGER.info("Recovered %s telemetry samples from %s", restored, self._segments.root)
+        return restored
+
+    def _restore_rollups(
+        self, scope_key: str, key: str, metric: Dict[str, Any], newest: float, since: Optional[float]
+    ) -> float:
+        """Refill ``metric``'s rollup tiers from on-disk aggregates; returns where they start."""
+
+        tiers = metric["rollups"]
+        start = newest - max(tier.capacity * tier.resolution for tier in tiers)
+        if since is not None:
+            start = max(start, since)
+        buckets = self._segments.aggregate(scope_key, key, start, newest, tiers[0].resolution)
+        # Every tier resolution is a multiple of the finest, so its buckets fold cleanly into coarser ones.
+        for bucket_start, mean, low, high, count in reversed(buckets):
+            for tier in tiers:
+                tier.add_bucket(bucket_start, mean * count, low, high, count)
+        return start
+
+    def compact(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Drop samples and rollup buckets older than the retention window.
+
+        Scopes are trimmed one at a time under their own lock, expired
+        segment files are pruned, and a summary of the pass is returned and
+        kept for ``last_compaction``.
+        """
+
+        started = time.perf_counter()
+        samples = buckets = segments_removed = 0
+        if self._segments is not None:
+            # Persists whatever the writer thread (if any) has not yet, ahead of pruning;
+            # flushing here rather than on reads keeps disk writes off the render path.
+            self._segments.flush()
+        if self._retention_seconds:
+            cutoff = (now if now is not None else datetime.now(timezone.utc).timestamp()) - self._retention_seconds
+            with self._lock:
+                entries = list(self._scopes.values())
+            for entry in entries:
+                with entry["lock"]:
+                    dropped_samples = dropped_buckets = 0
+                    for metric in entry["sensors"].values():
+                        dropped_samples += metric["series"].drop_older_than(cutoff)
+                        for tier in metric["rollups"]:
+                            dropped_buckets += tier.drop_older_than(cutoff)
+                    if dropped_samples or dropped_buckets:
+                        self._bump(entry)
+                samples += dropped_samples
+                buckets += dropped_buckets
+            if self._segments is not None:
+                segments_removed = self._segments.prune(cutoff)
+        duration = time.perf_counter() - started
+        summary = {
+            "reclaimedSamples": samples,
+            "reclaimedBuckets": buckets,
+            "segmentsRemoved": segments_removed,
+            "durationMs": round(duration * 1000, 3),
+            "completedAt": _utc_isoformat(),
+        }
+        with self._lock:
+            self._last_compaction = summary
+        return summary
 
-                if self._retention_seconds:
-                    cutoff = epoch - self._retention_seconds
-                    samples[:] = [sample for sample in samples if sample["ts"] >= cutoff]
-                if len(samples) > self._max_samples:
-                    del samples[self._max_samples :]
+    def last_compaction(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return dict(self._last_compaction) if self._last_compaction else None
 
-                metric["current"] = coerced
-                metric["updatedAt"] = _utc_isoformat(moment)
+    def _delta(self, entry: Dict[str, Any], touched: Dict[str, Tuple[float, float]]) -> Dict[str, Any]:
+        sensors: Dict[str, Any] = {}
+        for key, (epoch, value) in touched.items():
+            metric = entry["sensors"][key]
+            sensors[key] = {
+                "sample": {"ts": _epoch_isoformat(epoch), "value": value},
+                "current": metric["current"],
+                "updatedAt": _epoch_isoformat(metric["updatedTs"]),
+            }
+        return {
+            "scope": entry["scope"],
+            "name": entry["name"],
+            "version": entry["version"],
+            "updatedAt": entry["updatedAt"],
+            "sensors": sensors,
+        }
 
-            entry["updatedAt"] = _utc_isoformat(moment)
-            self._last_updated = epoch
-            return self._render_zone(entry)
+    def _notify(self, deltas: List[Dict[str, Any]]) -> None:
+        listeners = self._listeners
+        for delta in deltas:
+            for listener in listeners:
+                try:
+                    listener(delta)
+                except Exception:  # listeners must never break ingest
+                    LOGGER.exception("Telemetry listener failed")
+
+    def _bump(self, entry: Dict[str, Any], epoch: Optional[float] = None) -> None:
+        entry["version"] += 1
+        with self._lock:
+            self._version += 1
+            if epoch is not None and (self._last_updated is None or epoch >= self._last_updated):
+                self._last_updated = epoch
 
-    def _render_zone(self, entry: Dict[str, Any], range_seconds: Optional[int] = None) -> Dict[str, Any]:
-        sensors = {}
-        now_epoch = datetime.now(timezone.utc).timestamp()
+    @property
+    def version(self) -> int:
+        """Monotonic counter bumped whenever any scope changes."""
+
+        with self._lock:
+            return self._version
+
+    def _window(self, range_seconds: Optional[int]) -> Tuple[Tuple[int, int], Optional[float], float]:
+        """Quantise a trailing range into ``(window key, cutoff, stats anchor)``.
+
+        The window edge advances in steps of 1/1440th of the range (one pixel
+        on a day-wide chart) and the stats anchor one stats slot at a time,
+        so renders and ETags stay valid between steps instead of changing on
+        every request.
+        """
+
+        now = datetime.now(timezone.utc).timestamp()
+        stats_key = int(now // self._stats_quantum)
+        anchor = float(stats_key * self._stats_quantum)
+        if not range_seconds:
+            return (0, stats_key), None, anchor
+        quantum = max(1, range_seconds // 1440)
+        key = int(now // quantum)
+        return (key, stats_key), float(key * quantum - range_seconds), anchor
+
+    def cache_token(
+        self, range_seconds: Optional[int] = None, max_points: Optional[int] = None, stats_only: bool = False
+    ) -> str:
+        """Return a token that changes whenever a render for these options would."""
+
+        if stats_only:
+            range_seconds = max_points = None
+        (window, stats_key), _, _ = self._window(range_seconds)
+        with self._lock:
+            return f"{self._version}:{window}.{stats_key}:{range_seconds or 0}:{max_points or 0}:{int(stats_only)}"
+
+    def _render_cached(
+        self,
+        entry: Dict[str, Any],
+        range_seconds: Optional[int] = None,
+        max_points: Optional[int] = None,
+        stats_only: bool = False,
+    ) -> Dict[str, Any]:
+        """Render a zone, reusing the last payload while version and window match.
+
+        Cached payloads are shared between callers and must be treated as
+        read-only.  Only the cache check and the column copy run under the
+        scope lock; disk aggregation and formatting happen outside it.
+        """
+
+        window, cutoff, anchor = self._window(range_seconds)
+        cache: Dict[Tuple[Optional[int], Optional[int], bool], Tuple[int, Tuple[int, int], Dict[str, Any]]] = entry[
+            "renderCache"
+        ]
+        cache_key = (range_seconds, max_points, stats_only)
+        with entry["lock"]:
+            cached = cache.get(cache_key)
+            if cached is not None and cached[0] == entry["version"] and cached[1] == window:
+                return cached[2]
+            version = entry["version"]
+            captured = self._capture_zone(entry, range_seconds, max_points, cutoff, anchor, stats_only)
+        payload = self._format_zone(captured, range_seconds, max_points, cutoff)
+        with entry["lock"]:
+            if entry["version"] == version:
+                if len(cache) >= 8:
+                    cache.clear()
+                cache[cache_key] = (version, window, payload)
+        return payload
+
+    def flush(self) -> int:
+        """Persist buffered samples to the segment store, if configured."""
+
+        if self._segments is None:
+            return 0
+        return self._segments.flush()
+
+    def close(self) -> None:
+        """Stop the segment writer thread and persist anything still buffered."""
+
+        if self._segments is not None:
+            self._segments.close()
+
+    def _capture_zone(
+        self,
+        entry: Dict[str, Any],
+        range_seconds: Optional[int],
+        max_points: Optional[int],
+        cutoff: Optional[float],
+        anchor: float,
+        stats_only: bool = False,
+    ) -> Dict[str, Any]:
+        """Copy what a render needs out of ``entry``; the caller holds its lock.
+
+        Stats windows end at ``anchor`` (the query time), not at the metric's
+        newest sample.
+        """
+
+        metrics = {}
         for key, metric in entry.get("sensors", {}).items():
-            samples = list(metric.get("samples", []))
-            if range_seconds:
-                cutoff = now_epoch - max(range_seconds, 0)
-                samples = [sample for sample in samples if sample["ts"] >= cutoff]
-            history = [sample["value"] for sample in samples]
-            timestamps = [
-                datetime.fromtimestamp(sample["ts"], timezone.utc)
-                for sample in samples
-            ]
-            sensors[key] = {
+            captured: Dict[str, Any] = {
                 "current": metric.get("current"),
-                "history": history,
-                "timestamps": [
-                    ts.isoformat().replace("+00:00", "Z") for ts in timestamps
-                ],
                 "setpoint": metric.get("setpoint"),
-                "updatedAt": metric.get("updatedAt"),
+                "updatedTs": metric.get("updatedTs"),
+                "stats": summarise_windows(metric["stats"], anchor),
+                "buckets": None,
+                "resolution": 0,
             }
-
+            metrics[key] = captured
+            if stats_only:
+                continue
+            tier, covered = select_rollup(
+                metric["series"], metric["rollups"], range_seconds, cutoff, max_points, metric["memorySince"],
+                metric["rollupSince"],
+            )
+            if not covered and self._segments is not None and range_seconds and cutoff is not None:
+                # Memory only holds the recent window; older history is read from disk.
+                captured["resolution"] = budget_resolution(range_seconds, max_points, metric["rollups"])
+                captured["fromDisk"] = True
+            elif tier is not None:
+                captured["buckets"] = list(tier.iter_newest_first(cutoff))
+                captured["resolution"] = tier.resolution
+            else:
+                series = metric["series"]
+                captured["columns"] = series.columns(*series.bounds(cutoff))
         return {
-            "id": entry.get("scope"),
             "scope": entry.get("scope"),
+            "statsOnly": stats_only,
             "name": entry.get("name") or entry.get("scope"),
             "meta": dict(entry.get("meta", {})),
-            "sensors": sensors,
             "updatedAt": entry.get("updatedAt"),
+            "metrics": metrics,
         }
 
-    def list_zones(self, range_seconds: Optional[int] = None) -> List[Dict[str, Any]]:
+    def _format_zone(
+        self,
+        captured: Dict[str, Any],
+        range_seconds: Optional[int],
+        max_points: Optional[int],
+        cutoff: Optional[float],
+    ) -> Dict[str, Any]:
+        sensors = {}
+        for key, metric in captured["metrics"].items():
+            updated_ts = metric["updatedTs"]
+            updated_at = (
+                _utc_isoformat(datetime.fromtimestamp(updated_ts, timezone.utc)) if updated_ts is not None else None
+            )
+            if captured["statsOnly"]:
+                sensors[key] = {"current": metric["current"], "stats": metric["stats"], "updatedAt": updated_at}
+                continue
+            history: List[float] = []
+            timestamps: List[str] = []
+            rendered: Dict[str, Any] = {}
+            buckets = metric["buckets"]
+            resolution = metric["resolution"]
+            if metric.get("fromDisk"):
+                buckets = self._segments.aggregate(
+                    captured["scope"], key, cutoff, cutoff + range_seconds, resolution
+                )
+            if buckets is None:
+                ts_column, value_column = metric["columns"]
+                history = list(reversed(value_column))
+                timestamps = [_epoch_isoformat(ts) for ts in reversed(ts_column)]
+                rendered["resolution"] = "raw"
+            else:
+                minimums: List[float] = []
+                maximums: List[float] = []
+                counts: List[int] = []
+                for start, mean, low, high, count in buckets:
+                    history.append(mean)
+                    timestamps.append(_epoch_isoformat(start))
+                    minimums.append(low)
+                    maximums.append(high)
+                    counts.append(count)
+                rendered.update(
+                    {
+                        "resolution": resolution_label(resolution),
+                        "min": minimums,
+                        "max": maximums,
+                        "count": counts,
+                    }
+                )
+            sensors[key] = {
+                **rendered,
+                "current": metric["current"],
+                "history": history,
+                "timestamps": timestamps,
+                "setpoint": metric["setpoint"],
+                "stats": metric["stats"],
+                "updatedAt": updated_at,
+            }
+
+        return {
+            "id": captured["scope"],
+            "scope": captured["scope"],
+            "name": captured["name"],
+            "meta": captured["meta"],
+            "sensors": sensors,
+            "updatedAt": captured["updatedAt"],
+        }
+
+    def list_zones(
+        self, range_seconds: Optional[int] = None, max_points: Optional[int] = None, stats_only: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Render every scope; ``stats_only`` returns summaries without history."""
+
+        if stats_only:
+            range_seconds = max_points = None
+        window, _, _ = self._window(range_seconds)
+        cache_key = (range_seconds, max_points, stats_only)
         with self._lock:
-            zones = [self._render_zone(entry, range_seconds) for entry in self._scopes.values()]
-            return sorted(zones, key=lambda zone: (zone.get("name") or "").lower())
+            version = self._version
+            cached = self._list_cache.get(cache_key)
+            if cached is not None and cached[0] == version and cached[1] == window:
+                return list(cached[2])
+            entries = list(self._scopes.values())
+        zones = [self._render_cached(entry, range_seconds, max_points, stats_only) for entry in entries]
+        zones.sort(key=lambda zone: (zone.get("name") or "").lower())
+        with self._lock:
+            # Tagged with the version seen before rendering; a concurrent ingest
+            # simply makes the next caller re-render.
+            if len(self._list_cache) >= 8:
+                self._list_cache.clear()
+            self._list_cache[cache_key] = (version, window, zones)
+        return list(zones)
+
+    def get_zone(
+        self,
+        scope: str,
+        range_seconds: Optional[int] = None,
+        max_points: Optional[int] = None,
+        stats_only: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        entry = self._resolve_scope(scope)
+        if not entry:
+            return None
+        if stats_only:
+            range_seconds = max_points = None
+        return self._render_cached(entry, range_seconds, max_points, stats_only)
 
-    def get_zone(self, scope: str, range_seconds: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    def iter_export(
+        self,
+        scopes: Optional[Iterable[str]] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        chunk_size: int = 4096,
+    ) -> Iterator[Tuple[str, str, array, array]]:
+        """Yield ``(scope, metric, timestamps, values)`` raw column chunks in time order.
+
+        With persistence configured the segments are the complete record and
+        are streamed straight from disk; otherwise chunks are copied from the
+        in-memory series one at a time under the scope lock.  Either way
+        memory use is bounded by ``chunk_size`` rather than the export size.
+        """
+
+        chunk_size = max(int(chunk_size), 1)
         with self._lock:
-            entry = self._scopes.get(scope)
-            if entry is None and isinstance(scope, str):
-                key = self._lookup.get(scope.lower())
-                if key:
-                    entry = self._scopes.get(key)
-            if not entry:
-                return None
-            return self._render_zone(entry, range_seconds)
+            known = list(self._scopes)
+        if scopes is None:
+            selected = None
+        else:
+            selected = set()
+            for scope in scopes:
+                entry = self._resolve_scope(scope)
+                selected.add(entry["scope"] if entry else scope)
+
+        if self._segments is not None:
+            self._segments.flush()
+            for scope_key, key in self._segments.series():
+                if selected is not None and scope_key not in selected:
+                    continue
+                for timestamps, values in self._segments.iter_chunks(scope_key, key, start, end, chunk_size):
+                    yield scope_key, key, timestamps, values
+            return
+
+        for scope_key in sorted(known):
+            if selected is not None and scope_key not in selected:
+                continue
+            entry = self._resolve_scope(scope_key)
+            if entry is None:
+                continue
+            with entry["lock"]:
+                metrics = sorted(entry["sensors"])
+            for key in metrics:
+                lower = start
+                while True:
+                    with entry["lock"]:
+                        series = entry["sensors"][key]["series"]
+                        lo, hi = series.bounds(lower, end)
+                        timestamps, values = series.columns(lo, min(hi, lo + chunk_size))
+                    if not timestamps:
+                        break
+                    yield scope_key, key, timestamps, values
+                    if len(timestamps) < chunk_size:
+                        break
+                    # Resume strictly after the last exported sample.
+                    lower = math.nextafter(timestamps[-1], math.inf)
 
     def last_updated(self) -> Optional[str]:
         with self._lock:
@@ -420,37 +1179,52 @@ class EnvironmentTelemetryStore:
         with self._lock:
             self._scopes.clear()
             self._lookup.clear()
+            self._list_cache.clear()
             self._last_updated = None
+            self._version += 1
 
 
 class DeviceDataStore:
-    """Persist best-effort controller state for /api/devicedatas."""
+    """Persist best-effort controller state for /api/devicedatas.
+
+    Entries are replaced (never mutated) under per-device locks so updates
+    to different devices do not contend, and reads copy outside the lock.
+    """
 
     def __init__(self) -> None:
         self._entries: Dict[str, Dict[str, Any]] = {}
+        self._entry_locks: Dict[str, threading.RLock] = {}
         self._lock = threading.RLock()
 
-    def upsert(self, device_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def _entry_lock(self, device_id: str) -> threading.RLock:
         with self._lock:
+            lock = self._entry_locks.get(device_id)
+            if lock is None:
+                lock = self._entry_locks[device_id] = threading.RLock()
+            return lock
+
+    def upsert(self, device_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._entry_lock(device_id):
             entry = self._entries.get(device_id, {"deviceId": device_id})
             merged = _merge_dicts(entry, payload)
             merged["deviceId"] = device_id
             merged["updatedAt"] = _utc_isoformat()
-            self._entries[device_id] = merged
-            return deepcopy(merged)
+            with self._lock:
+                self._entries[device_id] = merged
+        return deepcopy(merged)
 
     def get(self, device_id: str) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            entry = self._entries.get(device_id)
-            return deepcopy(entry) if entry else None
+        entry = self._entries.get(device_id)
+        return deepcopy(entry) if entry else None
 
     def list(self) -> List[Dict[str, Any]]:
         with self._lock:
-            return [deepcopy(entry) for entry in self._entries.values()]
+            entries = list(self._entries.values())
+        return [deepcopy(entry) for entry in entries]
 
     def clear(self) -> None:
         with self._lock:
-            self._entries.clear()
+            self._entries = {}
 
 
 __all__ = [
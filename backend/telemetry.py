@@ -0,0 +1,426 @@
+"""Columnar time-series primitives backing the environmental telemetry store."""
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+# (bucket width, span kept) for each rollup tier, finest first.
+ROLLUP_TIERS: Tuple[Tuple[int, int], ...] = (
+    (60, 24 * 3600),
+    (300, 7 * 24 * 3600),
+    (3600, 30 * 24 * 3600),
+)
+
+
+class _SampleDropped:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "SAMPLE_DROPPED"
+
+
+# Returned by ``upsert`` when a late sample is older than the retained history
+# and was not stored, so callers do not count it as a new sample.
+SAMPLE_DROPPED = _SampleDropped()
+
+# ``upsert`` result: the replaced value, ``None`` for a new sample, or ``SAMPLE_DROPPED``.
+UpsertResult = Union[float, None, _SampleDropped]
+
+
+class _ColumnRing:
+    """Fixed-capacity ring of rows stored as parallel ``array`` columns.
+
+    Rows are kept sorted by the first column.  ``_tail`` is the physical slot
+    of the oldest row and ``_head`` the slot the next append writes to; rows
+    are addressed by logical position (0 = oldest) so lookups can binary
+    search them and late rows can be inserted in place.
+    """
+
+    __slots__ = ("_capacity", "_columns", "_head", "_tail", "_size")
+
+    def __init__(self, capacity: int, typecodes: str, preallocate: bool) -> None:
+        self._capacity = max(int(capacity), 1)
+        if preallocate:
+            self._columns = tuple(
+                array(code, bytes(array(code).itemsize * self._capacity)) for code in typecodes
+            )
+        else:
+            self._columns = tuple(array(code) for code in typecodes)
+        self._head = 0
+        self._tail = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def full(self) -> bool:
+        return self._size == self._capacity
+
+    def _slot(self, position: int) -> int:
+        slot = self._tail + position
+        return slot - self._capacity if slot >= self._capacity else slot
+
+    def _key(self, position: int) -> float:
+        return self._columns[0][self._slot(position)]
+
+    def _bisect_left(self, key: float) -> int:
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _bisect_right(self, key: float) -> int:
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < self._key(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _push(self, row: Tuple[float, ...]) -> None:
+        head = self._head
+        if head == len(self._columns[0]):
+            for column, value in zip(self._columns, row):
+                column.append(value)
+        else:
+            for column, value in zip(self._columns, row):
+                column[head] = value
+        head += 1
+        if head == self._capacity:
+            head = 0
+        self._head = head
+        if self._size == self._capacity:
+            self._tail = head
+        else:
+            self._size += 1
+
+    def _move(self, source: int, target: int) -> None:
+        source_slot, target_slot = self._slot(source), self._slot(target)
+        for column in self._columns:
+            column[target_slot] = column[source_slot]
+
+    def _write(self, position: int, row: Tuple[float, ...]) -> None:
+        slot = self._slot(position)
+        for column, value in zip(self._columns, row):
+            column[slot] = value
+
+    def _insert(self, position: int, row: Tuple[float, ...]) -> bool:
+        """Insert ``row`` before logical ``position``; False if it fell off the tail."""
+
+        if position >= self._size:
+            self._push(row)
+            return True
+        if self._size == self._capacity:
+            # Full: evict the oldest row to make room behind the insert point.
+            if position == 0:
+                return False
+            for index in range(position - 1):
+                self._move(index + 1, index)
+            self._write(position - 1, row)
+            return True
+        self._push(tuple(column[self._slot(self._size - 1)] for column in self._columns))
+        for index in range(self._size - 2, position, -1):
+            self._move(index - 1, index)
+        self._write(position, row)
+        return True
+
+    def _evict_before(self, key: float, inclusive: bool = False) -> int:
+        """Drop rows keyed below (or at, if ``inclusive``) ``key``; return the count."""
+
+        keys = self._columns[0]
+        dropped = 0
+        while self._size and (keys[self._tail] < key or (inclusive and keys[self._tail] == key)):
+            self._tail += 1
+            if self._tail == self._capacity:
+                self._tail = 0
+            self._size -= 1
+            dropped += 1
+        return dropped
+
+    def _column_slice(self, column: array, lo: int, hi: int) -> array:
+        if lo >= hi:
+            return column[0:0]
+        start, stop = self._slot(lo), self._slot(hi - 1) + 1
+        if start < stop:
+            return column[start:stop]
+        return column[start : self._capacity] + column[0:stop]
+
+    def clear(self) -> None:
+        if len(self._columns[0]) != self._capacity:
+            for column in self._columns:
+                del column[:]
+        self._head = 0
+        self._tail = 0
+        self._size = 0
+
+
+class SampleRing(_ColumnRing):
+    """Fixed-capacity, time-ordered ring buffer of ``(timestamp, value)`` samples.
+
+    Timestamps and values live in two parallel ``array('d')`` columns that are
+    allocated once up front, so in-order appends (and evicting the oldest
+    sample once the ring is full) never allocate.  Late samples are placed by
+    binary search and a sample with an identical timestamp replaces the
+    existing one, which keeps ingest idempotent for replayed readings.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, capacity: int) -> None:
+        super().__init__(capacity, "dd", preallocate=True)
+
+    def upsert(self, ts: float, value: float) -> UpsertResult:
+        """Store a sample, returning the value it replaced (if any) or ``SAMPLE_DROPPED``."""
+
+        timestamps, values = self._columns
+        if self._size:
+            newest_slot = self._head - 1 if self._head else self._capacity - 1
+            newest_ts = timestamps[newest_slot]
+            if ts == newest_ts:
+                previous = values[newest_slot]
+                values[newest_slot] = value
+                return previous
+            if ts < newest_ts:
+                position = self._bisect_left(ts)
+                if position < self._size and self._key(position) == ts:
+                    slot = self._slot(position)
+                    previous = values[slot]
+                    values[slot] = value
+                    return previous
+                return None if self._insert(position, (ts, value)) else SAMPLE_DROPPED
+        self._push((ts, value))
+        return None
+
+    def append(self, ts: float, value: float) -> None:
+        self.upsert(ts, value)
+
+    def drop_older_than(self, cutoff: float) -> int:
+        """Evict samples older than ``cutoff`` from the tail; return the count."""
+
+        return self._evict_before(cutoff)
+
+    def newest(self) -> Optional[Tuple[float, float]]:
+        if not self._size:
+            return None
+        slot = self._head - 1 if self._head else self._capacity - 1
+        return self._columns[0][slot], self._columns[1][slot]
+
+    def oldest_ts(self) -> Optional[float]:
+        return self._columns[0][self._tail] if self._size else None
+
+    def bounds(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[int, int]:
+        """Return the logical ``[lo, hi)`` positions of samples in ``[start, end]``."""
+
+        lo = self._bisect_left(start) if start is not None else 0
+        hi = self._bisect_right(end) if end is not None else self._size
+        return lo, max(lo, hi)
+
+    def columns(self, lo: int, hi: int) -> Tuple[array, array]:
+        """Copy the timestamp/value columns for logical positions ``[lo, hi)``."""
+
+        timestamps, values = self._columns
+        return self._column_slice(timestamps, lo, hi), self._column_slice(values, lo, hi)
+
+    def iter_newest_first(self, since: Optional[float] = None) -> Iterator[Tuple[float, float]]:
+        """Yield samples from newest to oldest, stopping before ``since``."""
+
+        timestamps, values = self._columns
+        lo = self._bisect_left(since) if since is not None else 0
+        for position in range(self._size - 1, lo - 1, -1):
+            slot = self._slot(position)
+            yield timestamps[slot], values[slot]
+
+
+class RollupTier(_ColumnRing):
+    """Ring of fixed-width min/max/sum/count buckets for one resolution.
+
+    Columns grow lazily up to ``capacity`` buckets and then wrap, so sparse
+    metrics do not pay for a full window of empty buckets.
+    """
+
+    __slots__ = ("resolution",)
+
+    def __init__(self, resolution: int, capacity: int) -> None:
+        super().__init__(capacity, "ddddL", preallocate=False)
+        self.resolution = int(resolution)
+
+    def oldest_start(self) -> Optional[float]:
+        return self._columns[0][self._tail] if self._size else None
+
+    def _locate(self, start: float) -> Tuple[int, bool]:
+        """Return the logical position for bucket ``start`` and whether it exists."""
+
+        if self._size:
+            newest_slot = self._head - 1 if self._head else self._capacity - 1
+            newest = self._columns[0][newest_slot]
+            if start == newest:
+                return self._size - 1, True
+            if start > newest:
+                return self._size, False
+        position = self._bisect_left(start)
+        return position, position < self._size and self._key(position) == start
+
+    def add(self, ts: float, value: float) -> None:
+        start = ts - (ts % self.resolution)
+        position, exists = self._locate(start)
+        if not exists:
+            self._insert(position, (start, value, value, value, 1))
+            return
+        _, minimums, maximums, sums, counts = self._columns
+        slot = self._slot(position)
+        if value < minimums[slot]:
+            minimums[slot] = value
+        if value > maximums[slot]:
+            maximums[slot] = value
+        sums[slot] += value
+        counts[slot] += 1
+
+    def add_bucket(self, start: float, total: float, minimum: float, maximum: float, count: int) -> None:
+        """Fold a pre-aggregated bucket (e.g. read back from disk) into this tier."""
+
+        start -= start % self.resolution
+        position, exists = self._locate(start)
+        if not exists:
+            self._insert(position, (start, minimum, maximum, total, count))
+            return
+        _, minimums, maximums, sums, counts = self._columns
+        slot = self._slot(position)
+        minimums[slot] = min(minimums[slot], minimum)
+        maximums[slot] = max(maximums[slot], maximum)
+        sums[slot] += total
+        counts[slot] += count
+
+    def replace(self, ts: float, previous: float, value: float) -> None:
+        """Swap a previously counted sample for its replacement.
+
+        Sum and mean stay exact; min/max can only widen since the bucket does
+        not remember which sample produced the current extremes.
+        """
+
+        start = ts - (ts % self.resolution)
+        position, exists = self._locate(start)
+        if not exists:
+            self.add(ts, value)
+            return
+        _, minimums, maximums, sums, _ = self._columns
+        slot = self._slot(position)
+        sums[slot] += value - previous
+        if value < minimums[slot]:
+            minimums[slot] = value
+        if value > maximums[slot]:
+            maximums[slot] = value
+
+    def drop_older_than(self, cutoff: float) -> int:
+        """Drop buckets that end at or before ``cutoff``."""
+
+        return self._evict_before(cutoff - self.resolution, inclusive=True)
+
+    def iter_newest_first(self, since: Optional[float] = None) -> Iterator[Tuple[float, float, float, float, int]]:
+        """Yield ``(start, mean, min, max, count)`` newest first.
+
+        Buckets that end before ``since`` are skipped; the bucket straddling
+        ``since`` is included.
+        """
+
+        starts, minimums, maximums, sums, counts = self._columns
+        lo = self._bisect_right(since - self.resolution) if since is not None else 0
+        for position in range(self._size - 1, lo - 1, -1):
+            slot = self._slot(position)
+            count = counts[slot]
+            yield starts[slot], sums[slot] / count, minimums[slot], maximums[slot], count
+
+
+def build_rollup_tiers(retention_seconds: int, tiers: Sequence[Tuple[int, int]] = ROLLUP_TIERS) -> List[RollupTier]:
+    """Create one :class:`RollupTier` per resolution, bounded by retention."""
+
+    built: List[RollupTier] = []
+    for resolution, span in tiers:
+        window = min(span, retention_seconds) if retention_seconds else span
+        built.append(RollupTier(resolution, math.ceil(window / resolution)))
+    return built
+
+
+def resolution_label(seconds: int) -> str:
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+
+def _covers(oldest: Optional[float], full: bool, memory_since: Optional[float], cutoff: Optional[float]) -> bool:
+    start = oldest if full else memory_since
+    return start is None or cutoff is None or start <= cutoff
+
+
+def select_rollup(
+    ring: SampleRing,
+    tiers: Sequence[RollupTier],
+    range_seconds: Optional[int],
+    cutoff: Optional[float],
+    max_points: Optional[int],
+    memory_since: Optional[float] = None,
+    rollup_since: Optional[float] = None,
+) -> Tuple[Optional[RollupTier], bool]:
+    """Pick the in-memory series that should answer a range query.
+
+    ``memory_since`` is the earliest timestamp from which the raw ring is
+    known to hold complete history, and ``rollup_since`` the same for the
+    rollup tiers (``None`` when nothing older exists anywhere).
+    Returns ``(None, covered)`` when the raw ring should answer, otherwise the
+    finest rollup tier that covers the window within ``max_points`` and
+    falling back to the coarsest tier.  ``covered`` is false when the selected
+    series does not reach back to ``cutoff``.
+    """
+
+    if not range_seconds or not tiers:
+        return None, True
+
+    if _covers(ring.oldest_ts(), ring.full, memory_since, cutoff):
+        if not max_points:
+            return None, True
+        lo, hi = ring.bounds(cutoff)
+        if hi - lo <= max_points:
+            return None, True
+
+    for tier in tiers:
+        if max_points and math.ceil(range_seconds / tier.resolution) > max_points:
+            continue
+        if _covers(tier.oldest_start(), tier.full, rollup_since, cutoff):
+            return tier, True
+    coarsest = tiers[-1]
+    return coarsest, _covers(coarsest.oldest_start(), coarsest.full, rollup_since, cutoff)
+
+
+def budget_resolution(range_seconds: int, max_points: Optional[int], tiers: Sequence[RollupTier]) -> int:
+    """Return the finest tier resolution whose bucket count fits ``max_points``."""
+
+    for tier in tiers:
+        if not max_points or math.ceil(range_seconds / tier.resolution) <= max_points:
+            return tier.resolution
+    return tiers[-1].resolution
+
+
+__all__ = [
+    "ROLLUP_TIERS",
+    "RollupTier",
+    "SAMPLE_DROPPED",
+    "SampleRing",
+    "UpsertResult",
+    "budget_resolution",
+    "build_rollup_tiers",
+    "resolution_label",
+    "select_rollup",
+]
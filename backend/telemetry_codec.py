@@ -0,0 +1,437 @@
+"""Gorilla-style compressed storage for long raw telemetry histories.
+
+Timestamps are kept at millisecond precision and encoded as delta-of-deltas;
+values are XOR-ed with their predecessor and only the meaningful bits are
+written.  Slowly changing sensor series typically shrink from 16 bytes to a
+couple of bytes per sample.
+
+:class:`CompressedSeries` exposes the same read/write surface as
+:class:`~backend.telemetry.SampleRing` but keeps all but the newest
+``block_size`` samples in sealed, compressed blocks that are decoded lazily
+(timestamps and values separately) when a range query touches them.
+"""
+from __future__ import annotations
+
+import bisect
+from array import array
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from .telemetry import SAMPLE_DROPPED, UpsertResult
+
+_MASK64 = (1 << 64) - 1
+# (prefix, prefix bit length, payload bits) buckets for zig-zagged delta-of-deltas.
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+class _BitWriter:
+    __slots__ = ("_acc", "_bits")
+
+    def __init__(self) -> None:
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value: int, bits: int) -> None:
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+
+    def getvalue(self) -> bytes:
+        pad = -self._bits % 8
+        return (self._acc << pad).to_bytes((self._bits + pad) // 8, "big")
+
+
+class _BitReader:
+    __slots__ = ("_value", "_total", "_position")
+
+    def __init__(self, data: bytes) -> None:
+        self._value = int.from_bytes(data, "big")
+        self._total = len(data) * 8
+        self._position = 0
+
+    def read(self, bits: int) -> int:
+        self._position += bits
+        return (self._value >> (self._total - self._position)) & ((1 << bits) - 1)
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value // 2 if not value & 1 else -(value + 1) // 2
+
+
+def encode_timestamps(timestamps: Sequence[float]) -> bytes:
+    """Encode epoch-second timestamps as millisecond delta-of-deltas."""
+
+    writer = _BitWriter()
+    previous = 0
+    previous_delta = 0
+    for index, ts in enumerate(timestamps):
+        millis = round(ts * 1000)
+        if index == 0:
+            writer.write(millis & _MASK64, 64)
+        else:
+            delta = millis - previous
+            encoded = _zigzag(delta - previous_delta)
+            if encoded == 0:
+                writer.write(0, 1)
+            else:
+                for prefix, prefix_bits, payload_bits in _DOD_BUCKETS:
+                    if encoded < 1 << payload_bits:
+                        writer.write(prefix, prefix_bits)
+                        writer.write(encoded, payload_bits)
+                        break
+                else:
+                    writer.write(0b1111, 4)
+                    writer.write(encoded, 64)
+            previous_delta = delta
+        previous = millis
+    return writer.getvalue()
+
+
+def decode_timestamps(data: bytes, count: int) -> array:
+    reader = _BitReader(data)
+    decoded = array("d")
+    millis = 0
+    delta = 0
+    for index in range(count):
+        if index == 0:
+            millis = reader.read(64)
+        else:
+            if reader.read(1):
+                for _, prefix_bits, payload_bits in _DOD_BUCKETS:
+                    if not reader.read(1):
+                        break
+                else:
+                    payload_bits = 64
+                delta += _unzigzag(reader.read(payload_bits))
+            millis += delta
+        decoded.append(millis / 1000)
+    return decoded
+
+
+def encode_values(values: Sequence[float]) -> bytes:
+    """XOR-encode float64 values against their predecessor (Gorilla)."""
+
+    bits = array("Q")
+    bits.frombytes(array("d", values).tobytes())
+    writer = _BitWriter()
+    previous = 0
+    leading = trailing = -1
+    for index, current in enumerate(bits):
+        if index == 0:
+            writer.write(current, 64)
+            previous = current
+            continue
+        xor = current ^ previous
+        previous = current
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+        writer.write(1, 1)
+        lead = min(64 - xor.bit_length(), 31)
+        trail = (xor & -xor).bit_length() - 1
+        if leading >= 0 and lead >= leading and trail >= trailing:
+            writer.write(0, 1)
+            writer.write(xor >> trailing, 64 - leading - trailing)
+            continue
+        leading, trailing = lead, trail
+        meaningful = 64 - lead - trail
+        writer.write(1, 1)
+        writer.write(lead, 5)
+        writer.write(meaningful & 63, 6)
+        writer.write(xor >> trail, meaningful)
+    return writer.getvalue()
+
+
+def decode_values(data: bytes, count: int) -> array:
+    reader = _BitReader(data)
+    bits = array("Q")
+    current = 0
+    leading = trailing = 0
+    for index in range(count):
+        if index == 0:
+            current = reader.read(64)
+        elif reader.read(1):
+            if reader.read(1):
+                leading = reader.read(5)
+                meaningful = reader.read(6) or 64
+                trailing = 64 - leading - meaningful
+            current ^= reader.read(64 - leading - trailing) << trailing
+        bits.append(current)
+    decoded = array("d")
+    decoded.frombytes(bits.tobytes())
+    return decoded
+
+
+class _Block:
+    """A sealed run of samples; ``data`` holds the timestamp then value streams."""
+
+    __slots__ = ("first", "last", "count", "split", "data")
+
+    def __init__(self, timestamps: Sequence[float], values: Sequence[float]) -> None:
+        encoded_ts = encode_timestamps(timestamps)
+        self.first = timestamps[0]
+        self.last = timestamps[-1]
+        self.count = len(timestamps)
+        self.split = len(encoded_ts)
+        self.data = encoded_ts + encode_values(values)
+
+
+class CompressedSeries:
+    """Time-ordered samples kept as compressed sealed blocks plus one active block.
+
+    The newest ``block_size`` samples are held uncompressed; once the active
+    block fills it is sealed.  When sealed blocks exceed ``budget_bytes`` the
+    oldest are evicted, after which :attr:`full` reports that memory no
+    longer reaches back to everything ingested.  Timestamps are rounded to
+    milliseconds on the way in, matching what the codec can represent.
+    """
+
+    def __init__(self, budget_bytes: int = 512 * 1024, block_size: int = 256, decoded_cache: int = 4) -> None:
+        self._budget = max(int(budget_bytes), 1)
+        self._block_size = max(int(block_size), 2)
+        self._blocks: List[_Block] = []
+        self._starts: List[float] = []
+        self._offsets: Optional[List[int]] = None
+        self._active_ts = array("d")
+        self._active_values = array("d")
+        self._size = 0
+        self._bytes = 0
+        self._evicted = False
+        self._cache: "OrderedDict[int, Tuple[_Block, array, Optional[array]]]" = OrderedDict()
+        self._cache_limit = max(decoded_cache, 1)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def full(self) -> bool:
+        return self._evicted
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by sample data (compressed plus active)."""
+
+        return self._bytes + (len(self._active_ts) + len(self._active_values)) * 8
+
+    # -- decoding -------------------------------------------------------
+
+    def _decoded(self, block: _Block, with_values: bool) -> Tuple[array, Optional[array]]:
+        key = id(block)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] is block and (cached[2] is not None or not with_values):
+            self._cache.move_to_end(key)
+            return cached[1], cached[2]
+        timestamps = cached[1] if cached is not None and cached[0] is block else None
+        if timestamps is None:
+            timestamps = decode_timestamps(block.data[: block.split], block.count)
+        values = decode_values(block.data[block.split :], block.count) if with_values else None
+        self._cache[key] = (block, timestamps, values)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_limit:
+            self._cache.popitem(last=False)
+        return timestamps, values
+
+    def _replace_block(self, index: int, timestamps: Sequence[float], values: Sequence[float]) -> None:
+        old = self._blocks[index]
+        self._cache.pop(id(old), None)
+        self._bytes -= len(old.data)
+        if not timestamps:
+            del self._blocks[index]
+            del self._starts[index]
+        else:
+            block = _Block(timestamps, values)
+            self._blocks[index] = block
+            self._starts[index] = block.first
+            self._bytes += len(block.data)
+        self._offsets = None
+
+    # -- writes ---------------------------------------------------------
+
+    def upsert(self, ts: float, value: float) -> UpsertResult:
+        """Store a sample, returning the value it replaced (if any) or ``SAMPLE_DROPPED``."""
+
+        ts = round(ts * 1000) / 1000
+        active_ts = self._active_ts
+        if active_ts:
+            if ts > active_ts[-1]:
+                self._append(ts, value)
+                return None
+            if ts >= active_ts[0]:
+                position = bisect.bisect_left(active_ts, ts)
+                if active_ts[position] == ts:
+                    previous = self._active_values[position]
+                    self._active_values[position] = value
+                    return previous
+                active_ts.insert(position, ts)
+                self._active_values.insert(position, value)
+                self._size += 1
+                return None
+        elif not self._blocks or ts > self._blocks[-1].last:
+            self._append(ts, value)
+            return None
+        if not self._blocks:
+            # Older than the active run but nothing sealed yet: it belongs at its front.
+            self._active_ts.insert(0, ts)
+            self._active_values.insert(0, value)
+            self._size += 1
+            return None
+        return self._upsert_sealed(ts, value)
+
+    def append(self, ts: float, value: float) -> None:
+        self.upsert(ts, value)
+
+    def _append(self, ts: float, value: float) -> None:
+        self._active_ts.append(ts)
+        self._active_values.append(value)
+        self._size += 1
+        if len(self._active_ts) >= self._block_size:
+            self._seal()
+
+    def _seal(self) -> None:
+        block = _Block(self._active_ts, self._active_values)
+        self._blocks.append(block)
+        self._starts.append(block.first)
+        self._bytes += len(block.data)
+        self._offsets = None
+        self._active_ts = array("d")
+        self._active_values = array("d")
+        while self._bytes > self._budget and len(self._blocks) > 1:
+            oldest = self._blocks.pop(0)
+            self._starts.pop(0)
+            self._cache.pop(id(oldest), None)
+            self._bytes -= len(oldest.data)
+            self._size -= oldest.count
+            self._evicted = True
+
+    def _upsert_sealed(self, ts: float, value: float) -> UpsertResult:
+        index = bisect.bisect_right(self._starts, ts) - 1
+        if index < 0:
+            if self._evicted:
+                return SAMPLE_DROPPED  # Older than the retained history, like a full ring.
+            index = 0
+        timestamps, values = self._decoded(self._blocks[index], with_values=True)
+        timestamps, values = array("d", timestamps), array("d", values)
+        position = bisect.bisect_left(timestamps, ts)
+        if position < len(timestamps) and timestamps[position] == ts:
+            previous = values[position]
+            values[position] = value
+            self._replace_block(index, timestamps, values)
+            return previous
+        timestamps.insert(position, ts)
+        values.insert(position, value)
+        self._size += 1
+        self._replace_block(index, timestamps, values)
+        return None
+
+    def drop_older_than(self, cutoff: float) -> int:
+        """Evict samples older than ``cutoff``; return the count."""
+
+        dropped = 0
+        while self._blocks and self._blocks[0].last < cutoff:
+            block = self._blocks.pop(0)
+            self._starts.pop(0)
+            self._cache.pop(id(block), None)
+            self._bytes -= len(block.data)
+            self._offsets = None
+            dropped += block.count
+        if self._blocks and self._blocks[0].first < cutoff:
+            timestamps, values = self._decoded(self._blocks[0], with_values=True)
+            position = bisect.bisect_left(timestamps, cutoff)
+            self._replace_block(0, timestamps[position:], values[position:])
+            dropped += position
+        elif not self._blocks and self._active_ts and self._active_ts[0] < cutoff:
+            position = bisect.bisect_left(self._active_ts, cutoff)
+            del self._active_ts[:position]
+            del self._active_values[:position]
+            dropped += position
+        self._size -= dropped
+        return dropped
+
+    # -- reads ----------------------------------------------------------
+
+    def newest(self) -> Optional[Tuple[float, float]]:
+        if self._active_ts:
+            return self._active_ts[-1], self._active_values[-1]
+        if not self._blocks:
+            return None
+        timestamps, values = self._decoded(self._blocks[-1], with_values=True)
+        return timestamps[-1], values[-1]
+
+    def oldest_ts(self) -> Optional[float]:
+        if self._blocks:
+            return self._blocks[0].first
+        return self._active_ts[0] if self._active_ts else None
+
+    def _block_offsets(self) -> List[int]:
+        if self._offsets is None:
+            offsets, total = [], 0
+            for block in self._blocks:
+                offsets.append(total)
+                total += block.count
+            offsets.append(total)
+            self._offsets = offsets
+        return self._offsets
+
+    def _position(self, key: float, right: bool) -> int:
+        search = bisect.bisect_right if right else bisect.bisect_left
+        offsets = self._block_offsets()
+        sealed = offsets[-1]
+        if self._active_ts and (key >= self._active_ts[0] if right else key > self._active_ts[0]):
+            return sealed + search(self._active_ts, key)
+        index = bisect.bisect_right(self._starts, key) - 1
+        if index < 0:
+            return 0
+        block = self._blocks[index]
+        if (key > block.last) or (right and key == block.last):
+            return offsets[index + 1]
+        timestamps, _ = self._decoded(block, with_values=False)
+        return offsets[index] + search(timestamps, key)
+
+    def bounds(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[int, int]:
+        """Return the logical ``[lo, hi)`` positions of samples in ``[start, end]``."""
+
+        lo = self._position(start, right=False) if start is not None else 0
+        hi = self._position(end, right=True) if end is not None else self._size
+        return lo, max(lo, hi)
+
+    def columns(self, lo: int, hi: int) -> Tuple[array, array]:
+        """Decode the timestamp/value columns for logical positions ``[lo, hi)``."""
+
+        timestamps, values = array("d"), array("d")
+        if lo >= hi:
+            return timestamps, values
+        offsets = self._block_offsets()
+        first = max(bisect.bisect_right(offsets, lo) - 1, 0)
+        for index in range(first, len(self._blocks)):
+            start = offsets[index]
+            if start >= hi:
+                break
+            block_ts, block_values = self._decoded(self._blocks[index], with_values=True)
+            a, b = max(lo - start, 0), min(hi - start, len(block_ts))
+            timestamps.extend(block_ts[a:b])
+            values.extend(block_values[a:b])
+        sealed = offsets[-1]
+        if hi > sealed:
+            a = max(lo - sealed, 0)
+            timestamps.extend(self._active_ts[a : hi - sealed])
+            values.extend(self._active_values[a : hi - sealed])
+        return timestamps, values
+
+    def iter_newest_first(self, since: Optional[float] = None) -> Iterator[Tuple[float, float]]:
+        """Yield samples from newest to oldest, stopping before ``since``."""
+
+        timestamps, values = self.columns(*self.bounds(since))
+        for index in range(len(timestamps) - 1, -1, -1):
+            yield timestamps[index], values[index]
+
+
+__all__ = [
+    "CompressedSeries",
+    "decode_timestamps",
+    "decode_values",
+    "encode_timestamps",
+    "encode_values",
+]
@@ -0,0 +1,121 @@
+"""Stream telemetry column chunks as CSV text or Arrow IPC record batches."""
+from __future__ import annotations
+
+import logging
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+# Optional dependency: Arrow export is only offered when pyarrow is installed.
+PYARROW_AVAILABLE = False
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = pc = None
+    LOGGER.info("pyarrow not available. Arrow IPC telemetry export disabled.")
+
+ExportChunk = Tuple[str, str, array, array]
+
+CSV_HEADER = "scope,metric,timestamp,value\n"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _csv_field(text: str) -> str:
+    if any(char in text for char in ',"\n\r'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def iter_csv(chunks: Iterable[ExportChunk]) -> Iterator[bytes]:
+    """Render column chunks as CSV, yielding one encoded block per chunk."""
+
+    yield CSV_HEADER.encode("utf-8")
+    fromtimestamp = datetime.fromtimestamp
+    for scope, metric, timestamps, values in chunks:
+        prefix = f"{_csv_field(scope)},{_csv_field(metric)},"
+        lines: List[str] = [
+            f"{prefix}{fromtimestamp(ts, timezone.utc).isoformat(timespec='milliseconds')[:-6]}Z,{value!r}\n"
+            for ts, value in zip(timestamps, values)
+        ]
+        yield "".join(lines).encode("utf-8")
+
+
+class _ChunkSink:
+    """Minimal writable file object collecting Arrow IPC output between batches."""
+
+    closed = False
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        return None
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def arrow_schema():
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is required for Arrow IPC export")
+    return pa.schema(
+        [
+            ("scope", pa.string()),
+            ("metric", pa.string()),
+            ("timestamp", pa.timestamp("ms", tz="UTC")),
+            ("value", pa.float64()),
+        ]
+    )
+
+
+def _float_column(column: array):
+    return pa.Array.from_buffers(pa.float64(), len(column), [None, pa.py_buffer(column)])
+
+
+def iter_arrow(chunks: Iterable[ExportChunk]) -> Iterator[bytes]:
+    """Render column chunks as an Arrow IPC stream, one record batch per chunk.
+
+    Timestamp and value columns are wrapped zero-copy from the store's
+    ``array('d')`` chunks; only the millisecond conversion allocates.
+    """
+
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield sink.drain()
+    for scope, metric, timestamps, values in chunks:
+        count = len(timestamps)
+        millis = pc.round(pc.multiply(_float_column(timestamps), 1000.0)).cast(pa.int64())
+        batch = pa.record_batch(
+            [
+                pa.array([scope] * count, type=pa.string()),
+                pa.array([metric] * count, type=pa.string()),
+                millis.cast(schema.field("timestamp").type),
+                _float_column(values),
+            ],
+            schema=schema,
+        )
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+__all__ = [
+    "ARROW_STREAM_MEDIA_TYPE",
+    "PYARROW_AVAILABLE",
+    "iter_arrow",
+    "iter_csv",
+]
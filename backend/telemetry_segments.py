@@ -0,0 +1,436 @@
+"""Append-only on-disk segments for environmental telemetry.
+
+Each ``(scope, metric)`` series is stored under
+``<root>/<scope>/<metric>/<period>.seg`` where ``period`` is the UTC hour
+(``YYYYMMDDHH``) or day (``YYYYMMDD``) the samples fall in.  A segment is a
+flat run of fixed 16-byte records (little-endian ``float64`` timestamp and
+value) kept sorted by timestamp, so readers can ``mmap`` a file, view it as
+doubles and binary-search it without materialising Python objects.
+
+Writes are buffered in memory and flushed in batches, either by the
+background writer thread (``start``) once a batch fills or the flush interval
+passes, or by an explicit ``flush``; ``append`` itself never touches the disk.
+A batch that would break the sort order of an existing segment (late or
+back-filled data) is merged by rewriting that one segment.  Several ingest
+threads may share a store: the buffer has its own lock, and disk writes are
+serialised by a second one that appends never wait on.
+"""
+from __future__ import annotations
+
+import bisect
+import calendar
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+LOGGER = logging.getLogger(__name__)
+
+RECORD = struct.Struct("<dd")
+SEGMENT_SUFFIX = ".seg"
+_PERIOD_FORMATS = {"hour": ("%Y%m%d%H", 3600), "day": ("%Y%m%d", 86400)}
+
+
+def _encode_name(name: str) -> str:
+    encoded = quote(name, safe="")
+    # Keep "." and ".." from resolving outside the telemetry root.
+    return encoded.replace(".", "%2E") if set(encoded) == {"."} else encoded
+
+
+def _dedupe_sorted(records: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Sort records by timestamp, keeping the last-written value per timestamp."""
+
+    latest: Dict[float, float] = {}
+    for ts, value in records:
+        latest[ts] = value
+    return sorted(latest.items())
+
+
+class _TimestampView:
+    """Expose the timestamp column of a record buffer as a sequence for bisect."""
+
+    __slots__ = ("_doubles",)
+
+    def __init__(self, doubles: memoryview) -> None:
+        self._doubles = doubles
+
+    def __len__(self) -> int:
+        return len(self._doubles) // 2
+
+    def __getitem__(self, index: int) -> float:
+        return self._doubles[index * 2]
+
+
+@contextmanager
+def _mapped_doubles(path: Path) -> Iterator[Optional[memoryview]]:
+    """Map a segment read-only and yield it as a ``float64`` memoryview."""
+
+    size = path.stat().st_size
+    size -= size % RECORD.size
+    if size <= 0:
+        yield None
+        return
+    with path.open("rb") as handle:
+        with mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            raw = memoryview(mapped)
+            view = raw.cast("d")
+            try:
+                yield view
+            finally:
+                view.release()
+                raw.release()
+
+
+class TelemetrySegmentStore:
+    """Persist telemetry samples to rotated, fixed-record segment files."""
+
+    def __init__(
+        self,
+        root: Path,
+        rotation: str = "hour",
+        batch_size: int = 512,
+        flush_interval: float = 5.0,
+    ) -> None:
+        if rotation not in _PERIOD_FORMATS:
+            raise ValueError(f"rotation must be one of {sorted(_PERIOD_FORMATS)}")
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._format, self._period_seconds = _PERIOD_FORMATS[rotation]
+        self._batch_size = max(int(batch_size), 1)
+        self._flush_interval = max(float(flush_interval), 0.0)
+        self._pending: Dict[Tuple[str, str], array] = {}
+        # The batch being written by ``flush``; kept visible to readers until it is on disk.
+        self._inflight: Dict[Tuple[str, str], array] = {}
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def _series_dir(self, scope: str, metric: str) -> Path:
+        return self._root / _encode_name(scope) / _encode_name(metric)
+
+    def _period_name(self, ts: float) -> str:
+        return time.strftime(self._format, time.gmtime(ts))
+
+    def _period_start(self, name: str) -> Optional[float]:
+        """Start of the period a segment file covers, or ``None`` for a stray file name."""
+
+        try:
+            return float(calendar.timegm(time.strptime(name, self._format)))
+        except ValueError:
+            return None
+
+    def append(self, scope: str, metric: str, ts: float, value: float) -> None:
+        """Buffer a sample without touching the disk.
+
+        A full batch wakes the writer thread; without one, buffered samples
+        wait for the next ``flush``.
+        """
+
+        with self._lock:
+            column = self._pending.get((scope, metric))
+            if column is None:
+                column = array("d")
+                self._pending[(scope, metric)] = column
+            column.append(ts)
+            column.append(value)
+            self._pending_count += 1
+            full = self._pending_count >= self._batch_size
+        if full or not self._flush_interval:
+            self._wake.set()
+
+    def start(self) -> None:
+        """Start the writer thread that flushes full batches and aged buffers."""
+
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._stopping.clear()
+            self._writer = threading.Thread(target=self._run_writer, name="telemetry-segment-writer", daemon=True)
+            self._writer.start()
+
+    def close(self) -> None:
+        """Stop the writer thread, if any, and persist whatever is still buffered."""
+
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._stopping.set()
+            self._wake.set()
+            writer.join()
+        self.flush()
+
+    def _run_writer(self) -> None:
+        while not self._stopping.is_set():
+            with self._lock:
+                count = self._pending_count
+                age = time.monotonic() - self._last_flush
+            if count and (count >= self._batch_size or age >= self._flush_interval):
+                try:
+                    self.flush()
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception("Telemetry segment flush failed")
+                continue
+            # Sleep until the buffer ages out or a full batch wakes us.
+            self._wake.wait(max(self._flush_interval - age, 0.05) if count else (self._flush_interval or None))
+            self._wake.clear()
+
+    def flush(self) -> int:
+        """Write all buffered samples to disk and return how many were written."""
+
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                written, self._pending_count = self._pending_count, 0
+                self._last_flush = time.monotonic()
+                self._inflight = pending
+            try:
+                self._write_batch(pending)
+            finally:
+                with self._lock:
+                    self._inflight = {}
+            return written
+
+    def _write_batch(self, pending: Dict[Tuple[str, str], array]) -> None:
+        for (scope, metric), column in pending.items():
+            by_period: Dict[str, List[Tuple[float, float]]] = {}
+            for index in range(0, len(column), 2):
+                ts = column[index]
+                by_period.setdefault(self._period_name(ts), []).append((ts, column[index + 1]))
+            directory = self._series_dir(scope, metric)
+            directory.mkdir(parents=True, exist_ok=True)
+            for period, records in by_period.items():
+                records = _dedupe_sorted(records)
+                try:
+                    self._write_segment(directory / f"{period}{SEGMENT_SUFFIX}", records)
+                except OSError as exc:
+                    LOGGER.error(
+                        "Failed to persist telemetry segment %s/%s/%s: %s", scope, metric, period, exc
+                    )
+
+    def _write_segment(self, path: Path, records: List[Tuple[float, float]]) -> None:
+        last_ts: Optional[float] = None
+        if path.exists():
+            size = path.stat().st_size
+            if size % RECORD.size:
+                # Drop a torn trailing record left behind by an interrupted write.
+                os.truncate(path, size - size % RECORD.size)
+                size -= size % RECORD.size
+            if size:
+                with path.open("rb") as handle:
+                    handle.seek(size - RECORD.size)
+                    last_ts = RECORD.unpack(handle.read(RECORD.size))[0]
+        if last_ts is None or records[0][0] > last_ts:
+            payload = array("d", [field for record in records for field in record])
+            with path.open("ab") as handle:
+                handle.write(payload.tobytes())
+            return
+        # Out-of-order batch: merge with the existing records and rewrite.
+        merged = _dedupe_sorted(list(self._read_records(path)) + records)
+        payload = array("d", [field for record in merged for field in record])
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("wb") as handle:
+            handle.write(payload.tobytes())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_records(path: Path) -> Iterator[Tuple[float, float]]:
+        with _mapped_doubles(path) as doubles:
+            if doubles is None:
+                return
+            for index in range(0, len(doubles), 2):
+                yield doubles[index], doubles[index + 1]
+
+    def series(self) -> Iterator[Tuple[str, str]]:
+        """Yield every ``(scope, metric)`` pair that has segments on disk."""
+
+        if not self._root.exists():
+            return
+        for scope_dir in sorted(self._root.iterdir()):
+            if not scope_dir.is_dir():
+                continue
+            for metric_dir in sorted(scope_dir.iterdir()):
+                if metric_dir.is_dir():
+                    yield unquote(scope_dir.name), unquote(metric_dir.name)
+
+    def _segments(self, scope: str, metric: str, start: Optional[float], end: Optional[float]) -> List[Path]:
+        directory = self._series_dir(scope, metric)
+        if not directory.exists():
+            return []
+        selected: List[Path] = []
+        for path in sorted(directory.glob(f"*{SEGMENT_SUFFIX}")):
+            period_start = self._period_start(path.stem)
+            if period_start is None:
+                LOGGER.debug("Ignoring stray telemetry segment %s", path)
+                continue
+            if start is not None and period_start + self._period_seconds <= start:
+                continue
+            if end is not None and period_start > end:
+                continue
+            selected.append(path)
+        return selected
+
+    def oldest_ts(self, scope: str, metric: str) -> Optional[float]:
+        for path in self._segments(scope, metric, None, None):
+            with _mapped_doubles(path) as doubles:
+                if doubles is not None:
+                    return doubles[0]
+        return None
+
+    def _pending_records(
+        self, scope: str, metric: str, start: Optional[float], end: Optional[float]
+    ) -> List[Tuple[float, float]]:
+        records: List[Tuple[float, float]] = []
+        with self._lock:
+            # In-flight records first so that newer buffered writes win the dedupe.
+            for column in (self._inflight.get((scope, metric)), self._pending.get((scope, metric))):
+                if column:
+                    records.extend((column[index], column[index + 1]) for index in range(0, len(column), 2))
+        if not records:
+            return []
+        return [
+            record
+            for record in _dedupe_sorted(records)
+            if (start is None or record[0] >= start) and (end is None or record[0] <= end)
+        ]
+
+    def iter_range(
+        self, scope: str, metric: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Iterator[Tuple[float, float]]:
+        """Yield samples with ``start <= ts <= end`` in time order.
+
+        Samples still buffered for the next flush are merged in (and win over
+        a persisted sample with the same timestamp), so readers never need to
+        force a flush.
+        """
+
+        pending = self._pending_records(scope, metric, start, end)
+        position = 0
+        for ts, value in self._iter_persisted(scope, metric, start, end):
+            while position < len(pending) and pending[position][0] < ts:
+                yield pending[position]
+                position += 1
+            if position < len(pending) and pending[position][0] == ts:
+                continue
+            yield ts, value
+        yield from pending[position:]
+
+    def _iter_persisted(
+        self, scope: str, metric: str, start: Optional[float], end: Optional[float]
+    ) -> Iterator[Tuple[float, float]]:
+        for path in self._segments(scope, metric, start, end):
+            with _mapped_doubles(path) as doubles:
+                if doubles is None:
+                    continue
+                view = _TimestampView(doubles)
+                lo = bisect.bisect_left(view, start) if start is not None else 0
+                hi = bisect.bisect_right(view, end) if end is not None else len(view)
+                for index in range(lo * 2, hi * 2, 2):
+                    yield doubles[index], doubles[index + 1]
+
+    def iter_chunks(
+        self,
+        scope: str,
+        metric: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        chunk_size: int = 4096,
+    ) -> Iterator[Tuple[array, array]]:
+        """Yield ``(timestamps, values)`` column chunks of persisted samples in time order."""
+
+        chunk_size = max(int(chunk_size), 1)
+        for path in self._segments(scope, metric, start, end):
+            with _mapped_doubles(path) as doubles:
+                if doubles is None:
+                    continue
+                view = _TimestampView(doubles)
+                lo = bisect.bisect_left(view, start) if start is not None else 0
+                hi = bisect.bisect_right(view, end) if end is not None else len(view)
+                for offset in range(lo, hi, chunk_size):
+                    records = array("d")
+                    with doubles[offset * 2 : min(offset + chunk_size, hi) * 2] as window:
+                        with window.cast("B") as raw:
+                            records.frombytes(raw)
+                    yield records[0::2], records[1::2]
+
+    def tail(self, scope: str, metric: str, limit: int, since: Optional[float] = None) -> List[Tuple[float, float]]:
+        """Return up to ``limit`` of the newest samples (oldest first)."""
+
+        collected: List[Tuple[float, float]] = []
+        for path in reversed(self._segments(scope, metric, since, None)):
+            with _mapped_doubles(path) as doubles:
+                if doubles is None:
+                    continue
+                view = _TimestampView(doubles)
+                lo = bisect.bisect_left(view, since) if since is not None else 0
+                count = len(view)
+                lo = max(lo, count - (limit - len(collected)))
+                chunk = [(doubles[index * 2], doubles[index * 2 + 1]) for index in range(lo, count)]
+            collected[:0] = chunk
+            if len(collected) >= limit:
+                break
+        return collected
+
+    def aggregate(
+        self, scope: str, metric: str, start: float, end: float, resolution: int
+    ) -> List[Tuple[float, float, float, float, int]]:
+        """Bucket samples (including buffered ones) as ``(start, mean, min, max, count)`` newest first."""
+
+        buckets: List[Tuple[float, float, float, float, int]] = []
+        bucket_start: Optional[float] = None
+        total = low = high = 0.0
+        count = 0
+        for ts, value in self.iter_range(scope, metric, start, end):
+            current = ts - (ts % resolution)
+            if current != bucket_start:
+                if count:
+                    buckets.append((bucket_start, total / count, low, high, count))
+                bucket_start, total, low, high, count = current, 0.0, math.inf, -math.inf, 0
+            total += value
+            low = value if value < low else low
+            high = value if value > high else high
+            count += 1
+        if count:
+            buckets.append((bucket_start, total / count, low, high, count))
+        buckets.reverse()
+        return buckets
+
+    def prune(self, cutoff: float) -> int:
+        """Delete segments whose whole period ends before ``cutoff``."""
+
+        # Collect under the write lock so no flush is mid-rewrite, then delete
+        # without holding it; late samples landing in an expired period are past
+        # the cutoff anyway.
+        with self._write_lock:
+            expired = [
+                path
+                for scope, metric in list(self.series())
+                for path in self._segments(scope, metric, None, cutoff)
+                if self._period_start(path.stem) + self._period_seconds <= cutoff
+            ]
+        removed = 0
+        for path in expired:
+            try:
+                path.unlink()
+                removed += 1
+            except OSError as exc:
+                LOGGER.warning("Failed to prune telemetry segment %s: %s", path, exc)
+        return removed
+
+
+__all__ = ["RECORD", "TelemetrySegmentStore"]
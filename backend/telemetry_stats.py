@@ -0,0 +1,274 @@
+"""Streaming summary statistics for telemetry metrics.
+
+``RunningStats`` keeps count, mean and variance (Welford), min/max and a
+``QuantileSketch`` for percentiles.  ``WindowedStats`` keeps a small ring of
+``RunningStats`` slots so a rolling window is answered by merging at most
+``slots`` summaries instead of scanning the raw history.
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .telemetry import resolution_label
+
+# Rolling windows maintained for every metric, in seconds.
+STATS_WINDOWS: Tuple[int, ...] = (3600, 24 * 3600)
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch with bounded relative error (DDSketch-style).
+
+    Values are counted in buckets whose boundaries grow geometrically by
+    ``gamma``, so any quantile is reported within ``relative_accuracy`` of
+    the true value while memory depends on the value range, not the count.
+    """
+
+    __slots__ = (
+        "_gamma",
+        "_log_gamma",
+        "_positive",
+        "_negative",
+        "_zero",
+        "_count",
+        "_max_buckets",
+        "_positive_floor",
+        "_negative_ceiling",
+    )
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 512) -> None:
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}
+        self._zero = 0
+        self._count = 0
+        self._max_buckets = max(max_buckets, 2)
+        # Collapse boundaries: positive indices below the floor (and negative
+        # indices above the ceiling) have been folded into the boundary bucket.
+        self._positive_floor: Optional[int] = None
+        self._negative_ceiling: Optional[int] = None
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def _index(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _bucket(self, value: float) -> Tuple[Dict[int, int], int]:
+        index = self._index(abs(value))
+        if value > 0:
+            if self._positive_floor is not None and index < self._positive_floor:
+                index = self._positive_floor
+            return self._positive, index
+        if self._negative_ceiling is not None and index > self._negative_ceiling:
+            index = self._negative_ceiling
+        return self._negative, index
+
+    def _estimate(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float, weight: int = 1) -> None:
+        self._count += weight
+        if value == 0:
+            self._zero += weight
+            return
+        store, index = self._bucket(value)
+        count = store.get(index, 0) + weight
+        if count > 0:
+            store[index] = count
+            if len(self._positive) + len(self._negative) > self._max_buckets:
+                self._collapse()
+        else:
+            store.pop(index, None)
+
+    def remove(self, value: float) -> None:
+        self.add(value, -1)
+
+    def _collapse(self) -> None:
+        # Fold the two lowest-ranked buckets together; only low quantiles lose precision.
+        if len(self._negative) >= 2:
+            store, keys = self._negative, sorted(self._negative, reverse=True)[:2]
+            self._negative_ceiling = keys[1]
+        else:
+            store, keys = self._positive, sorted(self._positive)[:2]
+            self._positive_floor = keys[1]
+        store[keys[1]] += store.pop(keys[0])
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for index, count in other._positive.items():
+            if self._positive_floor is not None and index < self._positive_floor:
+                index = self._positive_floor
+            self._positive[index] = self._positive.get(index, 0) + count
+        for index, count in other._negative.items():
+            if self._negative_ceiling is not None and index > self._negative_ceiling:
+                index = self._negative_ceiling
+            self._negative[index] = self._negative.get(index, 0) + count
+        self._zero += other._zero
+        self._count += other._count
+        while len(self._positive) + len(self._negative) > self._max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self._count <= 0:
+            return None
+        rank = min(max(q, 0.0), 1.0) * (self._count - 1)
+        seen = 0
+        for index in sorted(self._negative, reverse=True):
+            seen += self._negative[index]
+            if seen > rank:
+                return -self._estimate(index)
+        seen += self._zero
+        if seen > rank:
+            return 0.0
+        for index in sorted(self._positive):
+            seen += self._positive[index]
+            if seen > rank:
+                return self._estimate(index)
+        return self._estimate(max(self._positive)) if self._positive else 0.0
+
+
+class RunningStats:
+    """Count, mean, variance, min/max and quantile sketch updated per sample."""
+
+    __slots__ = ("count", "mean", "_m2", "minimum", "maximum", "sketch")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.minimum = value if value < self.minimum else self.minimum
+        self.maximum = value if value > self.maximum else self.maximum
+        self.sketch.add(value)
+
+    def remove(self, value: float) -> None:
+        """Retract a sample (used when a duplicate timestamp is overwritten).
+
+        Min/max cannot be narrowed without the raw samples and stay as-is.
+        """
+
+        if self.count <= 1:
+            self.count, self.mean, self._m2 = 0, 0.0, 0.0
+        else:
+            delta = value - self.mean
+            self.count -= 1
+            self.mean -= delta / self.count
+            self._m2 = max(self._m2 - delta * (value - self.mean), 0.0)
+        self.sketch.remove(value)
+
+    def merge(self, other: "RunningStats") -> None:
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        if not self.count:
+            return None
+        return {
+            "count": self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+            "mean": self.mean,
+            "stddev": self.stddev,
+            "p95": self.sketch.quantile(0.95),
+        }
+
+
+class WindowedStats:
+    """Rolling-window statistics kept as a ring of per-slot ``RunningStats``.
+
+    A sample lands in the slot covering its timestamp; a window query merges
+    the slots ending at ``anchor``, so the window is exact to one slot width.
+    Callers anchor at the query time so a series that stops reporting ages out.
+    """
+
+    def __init__(self, window_seconds: int, slots: int = 12) -> None:
+        self.window = window_seconds
+        self._width = max(math.ceil(window_seconds / max(slots, 1)), 1)
+        self._slots: List[Optional[Tuple[int, RunningStats]]] = [None] * max(slots, 1)
+
+    @property
+    def width(self) -> int:
+        """Seconds covered by one slot."""
+
+        return self._width
+
+    def _slot(self, ts: float, create: bool) -> Optional[RunningStats]:
+        number = int(ts // self._width)
+        index = number % len(self._slots)
+        current = self._slots[index]
+        if current is not None and current[0] == number:
+            return current[1]
+        if not create or (current is not None and current[0] > number):
+            return None
+        stats = RunningStats()
+        self._slots[index] = (number, stats)
+        return stats
+
+    def add(self, ts: float, value: float) -> None:
+        stats = self._slot(ts, create=True)
+        if stats is not None:
+            stats.add(value)
+
+    def replace(self, ts: float, previous: float, value: float) -> None:
+        stats = self._slot(ts, create=False)
+        if stats is not None:
+            stats.remove(previous)
+            stats.add(value)
+
+    def merged(self, anchor: float) -> RunningStats:
+        newest = int(anchor // self._width)
+        oldest = newest - len(self._slots) + 1
+        merged = RunningStats()
+        for slot in self._slots:
+            if slot is not None and oldest <= slot[0] <= newest:
+                merged.merge(slot[1])
+        return merged
+
+
+def build_stats_windows(retention_seconds: int, windows: Iterable[int] = STATS_WINDOWS) -> List[WindowedStats]:
+    """Create the rolling windows for one metric, plus one spanning retention."""
+
+    spans = sorted(set(windows))
+    if retention_seconds and retention_seconds > spans[-1]:
+        spans.append(retention_seconds)
+    return [WindowedStats(span) for span in spans]
+
+
+def summarise_windows(windows: Iterable[WindowedStats], anchor: Optional[float]) -> Dict[str, Any]:
+    """Return ``{label: summary}`` for each window ending at ``anchor``."""
+
+    if anchor is None:
+        return {}
+    return {resolution_label(window.window): window.merged(anchor).summary() for window in windows}
+
+
+__all__ = [
+    "QuantileSketch",
+    "RunningStats",
+    "STATS_WINDOWS",
+    "WindowedStats",
+    "build_stats_windows",
+    "summarise_windows",
+]
@@ -0,0 +1,124 @@
+"""Fan-out of live telemetry deltas to Server-Sent Events subscribers."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TelemetrySubscription:
+    """A single client's bounded queue of telemetry deltas.
+
+    When a client stops draining its queue and the queue fills up, the
+    subscription is marked as dropped instead of buffering without bound;
+    the stream then tells the client to reconnect and refetch ``/env``.
+    """
+
+    def __init__(self, scopes: Optional[Iterable[str]], queue_size: int) -> None:
+        self.scopes: Optional[Set[str]] = {scope.lower() for scope in scopes} if scopes else None
+        self.dropped = False
+        self._queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=max(queue_size, 1))
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        if self.scopes is None:
+            return True
+        scope = str(event.get("scope") or "").lower()
+        name = str(event.get("name") or "").lower()
+        return scope in self.scopes or name in self.scopes
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if self.dropped or not self.wants(event):
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)
+
+    async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait for the next delta; ``None`` on timeout or once dropped."""
+
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TelemetryBroadcaster:
+    """Thread-safe publisher that forwards store deltas onto the event loop."""
+
+    def __init__(self, queue_size: int = 256) -> None:
+        self._queue_size = queue_size
+        self._subscribers: Set[TelemetrySubscription] = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(self, scopes: Optional[Iterable[str]] = None) -> TelemetrySubscription:
+        subscription = TelemetrySubscription(scopes, self._queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TelemetrySubscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Deliver ``event`` to every subscriber; safe to call from any thread."""
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers or self._loop is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(subscribers, event)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._deliver, subscribers, event)
+
+    def _deliver(self, subscribers: Iterable[TelemetrySubscription], event: Dict[str, Any]) -> None:
+        for subscription in subscribers:
+            subscription.offer(event)
+            if subscription.dropped:
+                LOGGER.info("Dropping slow telemetry stream subscriber")
+                self.unsubscribe(subscription)
+
+
+async def sse_events(
+    subscription: TelemetrySubscription,
+    is_disconnected,
+    keepalive_seconds: float = 15.0,
+) -> AsyncIterator[str]:
+    """Render a subscription as an SSE byte stream until the client leaves."""
+
+    yield "retry: 3000\n\n"
+    while True:
+        event = await subscription.next(keepalive_seconds)
+        if await is_disconnected():
+            return
+        if subscription.dropped:
+            yield "event: overflow\ndata: {}\n\n"
+            return
+        if event is None:
+            yield ": keepalive\n\n"
+            continue
+        yield f"event: telemetry\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+__all__ = ["TelemetryBroadcaster", "TelemetrySubscription", "sse_events"]
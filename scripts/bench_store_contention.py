@@ -0,0 +1,117 @@
+"""
+Contention benchmark for EnvironmentTelemetryStore under mixed read/write load.
+
+Writer threads each ingest into their own room at a paced rate (like sensors
+reporting) while reader threads keep re-rendering every zone through
+list_zones().  The striped store is compared
+with the same store wrapped in a single global lock (the pre-striping
+behaviour), reporting ingest throughput and add_reading latency percentiles.
+
+Usage: python scripts/bench_store_contention.py [--rooms 8] [--readers 2] [--seconds 3] [--interval 0.005]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.state import EnvironmentTelemetryStore  # noqa: E402
+
+
+class GlobalLockStore:
+    """Serialise every call behind one lock, as the store did before striping."""
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.RLock()
+
+    def add_reading(self, *args, **kwargs):
+        with self._lock:
+            return self._store.add_reading(*args, **kwargs)
+
+    def list_zones(self, *args, **kwargs):
+        with self._lock:
+            return self._store.list_zones(*args, **kwargs)
+
+
+def seed(store, rooms, samples):
+    start = datetime.now(timezone.utc) - timedelta(seconds=samples * 10)
+    for room in range(rooms):
+        for index in range(samples):
+            store.add_reading(
+                f"Room {room}",
+                start + timedelta(seconds=index * 10),
+                {"temperature": 20 + index % 5, "rh": 50 + index % 7, "co2": 600 + index % 50},
+            )
+
+
+def run(store, rooms, readers, seconds, interval):
+    stop = threading.Event()
+    latencies = [[] for _ in range(rooms)]
+    renders = [0] * readers
+
+    def writer(room):
+        samples = latencies[room]
+        value = 0
+        while not stop.is_set():
+            value += 1
+            began = time.perf_counter()
+            store.add_reading(f"Room {room}", datetime.now(timezone.utc), {"temperature": 20 + value % 5})
+            samples.append(time.perf_counter() - began)
+            if interval:
+                time.sleep(interval)
+
+    def reader(slot):
+        while not stop.is_set():
+            # Vary the point budget so every call misses the render caches.
+            store.list_zones(range_seconds=6 * 3600, max_points=1000 + renders[slot] % 32)
+            renders[slot] += 1
+
+    threads = [threading.Thread(target=writer, args=(room,)) for room in range(rooms)]
+    threads += [threading.Thread(target=reader, args=(slot,)) for slot in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    merged = sorted(sample for samples in latencies for sample in samples)
+    p99 = merged[int(len(merged) * 0.99) - 1] if merged else 0.0
+    return {
+        "writes_per_sec": len(merged) / seconds,
+        "renders_per_sec": sum(renders) / seconds,
+        "p50_ms": statistics.median(merged) * 1000 if merged else 0.0,
+        "p99_ms": p99 * 1000,
+        "max_ms": merged[-1] * 1000 if merged else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--samples", type=int, default=288, help="samples seeded per room")
+    parser.add_argument("--interval", type=float, default=0.005, help="writer pause between readings (0 = flat out)")
+    args = parser.parse_args()
+
+    for label, factory in (
+        ("global lock", lambda: GlobalLockStore(EnvironmentTelemetryStore())),
+        ("striped", EnvironmentTelemetryStore),
+    ):
+        store = factory()
+        seed(store._store if isinstance(store, GlobalLockStore) else store, args.rooms, args.samples)
+        result = run(store, args.rooms, args.readers, args.seconds, args.interval)
+        print(
+            f"{label:>12}: {result['writes_per_sec']:9.0f} writes/s  {result['renders_per_sec']:7.1f} renders/s  "
+            f"p50 {result['p50_ms']:6.3f} ms  p99 {result['p99_ms']:7.3f} ms  max {result['max_ms']:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
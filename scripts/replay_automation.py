@@ -0,0 +1,86 @@
+"""
+Replay a recorded automation event log through the Python rules on a virtual clock.
+
+Record a log by starting the backend with AUTOMATION_EVENT_LOG=path/to/events.jsonl.gz,
+then compare rule configurations offline, e.g. with and without coalescing:
+
+Usage: python scripts/replay_automation.py events.jsonl.gz [--coalesce-ms 250] [--templates config/automation-templates.json]
+       [--timeline timeline.json]
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.automation import lux_balancing_rule, occupancy_rule  # noqa: E402
+from backend.automation_replay import read_event_log, replay_events  # noqa: E402
+from backend.automation_templates import (  # noqa: E402
+    DEVICE_ACTION_TYPES,
+    ActionRegistry,
+    load_automation_templates,
+    template_rule,
+)
+from backend.config import load_lighting_inventory  # noqa: E402
+
+
+def _dry_run_actions(fired):
+    """Record device actions instead of forwarding them to live integrations."""
+
+    registry = ActionRegistry()
+
+    async def record(action, reading):
+        fired[action.get("type")] = fired.get(action.get("type"), 0) + 1
+        return {"dryRun": True}
+
+    for action_type in DEVICE_ACTION_TYPES:
+        registry.register(action_type, record)
+    return registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", type=Path, help="event log written via AUTOMATION_EVENT_LOG")
+    parser.add_argument("--inventory", type=Path, default=None, help="lighting inventory YAML")
+    parser.add_argument("--target-lux", type=int, default=int(os.getenv("TARGET_LUX", "500")))
+    parser.add_argument("--occupied", type=int, default=int(os.getenv("OCCUPIED_BRIGHTNESS", "80")))
+    parser.add_argument("--vacant", type=int, default=int(os.getenv("VACANT_BRIGHTNESS", "30")))
+    parser.add_argument("--coalesce-ms", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--templates", type=Path, default=None, help="automation templates JSON to compile")
+    parser.add_argument("--timeline", type=Path, default=None, help="write the fixture command timeline as JSON")
+    args = parser.parse_args()
+
+    fixtures = load_lighting_inventory(args.inventory)
+    zone_map = {fixture.name: fixture.address for fixture in fixtures}
+
+    template_actions = {}
+
+    def configure(engine):
+        if zone_map:
+            engine.register_rule(lux_balancing_rule(zone_map, args.target_lux))
+            engine.register_rule(occupancy_rule(zone_map, args.occupied, args.vacant))
+        if args.templates:
+            ruleset = load_automation_templates(args.templates)
+            engine.register_rule(template_rule(ruleset, _dry_run_actions(template_actions)))
+
+    result = replay_events(
+        read_event_log(args.log),
+        fixtures,
+        configure,
+        workers=args.workers,
+        coalesce_seconds=args.coalesce_ms / 1000,
+    )
+    summary = result.summary()
+    if args.templates:
+        summary["templateActions"] = template_actions
+    print(json.dumps(summary, indent=2))
+    if args.timeline:
+        args.timeline.write_text(json.dumps(result.timeline, indent=1), encoding="utf-8")
+        print(f"wrote {result.commands} fixture commands to {args.timeline}")
+
+
+if __name__ == "__main__":
+    main()
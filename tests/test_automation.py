@@ -0,0 +1,253 @@
+import asyncio
+from datetime import datetime, timezone
+
+from backend.automation import AutomationEngine, RuleSubscription, lux_balancing_rule, occupancy_rule
+from backend.automation_routing import TopicTrie
+from backend.config import LightingFixture
+from backend.device_models import SensorEvent
+from backend.lighting import LightingController
+from backend.state import LightingState, ScheduleStore
+
+FIXTURES = [
+    LightingFixture(
+        name=f"Fixture {index}",
+        model="TopLight",
+        address=f"fx-{index}",
+        min_brightness=0,
+        max_brightness=100,
+        control_interface="0-10V",
+        spectrum_min=2700,
+        spectrum_max=6500,
+    )
+    for index in range(3)
+]
+
+
+def _engine() -> AutomationEngine:
+    controller = LightingController(FIXTURES, LightingState(FIXTURES))
+    return AutomationEngine(controller, ScheduleStore())
+
+
+def _event(topic: str, **payload) -> SensorEvent:
+    return SensorEvent(topic=topic, payload=payload, received_at=datetime.now(timezone.utc))
+
+
+def test_topic_trie_wildcards():
+    trie = TopicTrie()
+    trie.insert("sensors/+/lux", 1)
+    trie.insert("sensors/#", 2)
+    trie.insert("sensors/room-a/lux", 3)
+    trie.insert("#", 4)
+
+    assert trie.match("sensors/room-a/lux") == {1, 2, 3, 4}
+    assert trie.match("sensors/room-b/lux") == {1, 2, 4}
+    assert trie.match("sensors") == {2, 4}
+    assert trie.match("other/topic") == {4}
+
+
+def test_engine_routes_only_matching_rules():
+    engine = _engine()
+    calls = []
+
+    def recorder(label):
+        async def rule(event, controller):
+            calls.append(label)
+
+        return rule
+
+    engine.register_rule(recorder("lux-a"), RuleSubscription.of(("sensors/+/lux",), ("illuminance",), ("A",)))
+    engine.register_rule(recorder("any-occupancy"), RuleSubscription.of(measurements=("occupancy",)))
+    engine.register_rule(recorder("catch-all"))
+    for zone in range(30):
+        engine.register_rule(lux_balancing_rule({f"Z{zone}": "fx-0"}, 500))
+
+    asyncio.run(engine._dispatch(_event("sensors/a/lux", measurement="illuminance", zone="A", value=10)))
+    asyncio.run(engine._dispatch(_event("sensors/b/motion", measurement="occupancy", zone="B", value=1)))
+    assert calls == ["lux-a", "catch-all", "any-occupancy", "catch-all"]
+
+    routed = engine.matching_rules(_event("sensors/z/lux", measurement="illuminance", zone="Z7", value=10))
+    assert len(routed) == 2  # catch-all plus the one zone rule
+
+
+def test_builtin_rules_declare_subscriptions():
+    engine = _engine()
+    engine.register_rule(lux_balancing_rule({"A": "fx-0"}, 500))
+    engine.register_rule(occupancy_rule({"B": "fx-1"}, 80, 10))
+
+    asyncio.run(engine._dispatch(_event("sensors/b", measurement="occupancy", zone="B", value=True)))
+    asyncio.run(engine._dispatch(_event("sensors/a", measurement="occupancy", zone="A", value=True)))
+
+    assert engine._controller.last_known_state("fx-1")["brightness"] == 80
+    assert engine._controller.last_known_state("fx-0")["brightness"] == 0
+
+
+def test_sharded_workers_keep_per_zone_order_and_run_zones_in_parallel():
+    async def scenario():
+        engine = AutomationEngine(
+            LightingController(FIXTURES, LightingState(FIXTURES)), ScheduleStore(), workers=2, max_in_flight=4
+        )
+        seen = []
+        slow_started = asyncio.Event()
+        release_slow = asyncio.Event()
+
+        async def rule(event, controller):
+            zone, seq = event.payload["zone"], event.payload["seq"]
+            if zone == "slow" and seq == 0:
+                slow_started.set()
+                await release_slow.wait()
+            seen.append((zone, seq))
+
+        engine.register_rule(rule)
+        await engine.start()
+        for seq in range(3):
+            await engine.publish(_event("sensors/slow", zone="slow", seq=seq))
+        await slow_started.wait()
+        for seq in range(3):
+            await engine.publish(_event("sensors/fast", zone="fast", seq=seq))
+        for _ in range(20):
+            await asyncio.sleep(0)
+        # The fast zone finished while the slow zone is still blocked on its first event.
+        assert seen == [("fast", 0), ("fast", 1), ("fast", 2)]
+
+        release_slow.set()
+        await asyncio.wait_for(engine.join(), timeout=1)
+        await engine.stop()
+        return seen
+
+    seen = asyncio.run(scenario())
+    assert [seq for zone, seq in seen if zone == "slow"] == [0, 1, 2]
+
+
+def test_coalescer_delivers_latest_reading_per_zone_measurement():
+    async def scenario():
+        engine = AutomationEngine(
+            LightingController(FIXTURES, LightingState(FIXTURES)), ScheduleStore(), coalesce_seconds=0.05
+        )
+        seen = []
+
+        async def rule(event, controller):
+            seen.append((event.payload.get("zone"), event.payload.get("value")))
+
+        engine.register_rule(rule)
+        await engine.start()
+        for value in range(5):
+            await engine.publish(_event("sensors/a/lux", measurement="illuminance", zone="A", value=value))
+        await engine.publish(_event("sensors/b/lux", measurement="illuminance", zone="B", value=7))
+        await engine.publish(_event("sensors/raw", value="passthrough"))
+        await asyncio.sleep(0.01)
+        # The first reading of each burst goes out at once; followers wait for the trailing edge.
+        assert set(seen) == {("A", 0), ("B", 7), (None, "passthrough")}
+
+        await asyncio.sleep(0.1)
+        await engine.join()
+        await engine.stop()
+        return seen, engine.coalesced_events
+
+    seen, coalesced = asyncio.run(scenario())
+    assert len(seen) == 4 and seen[-1] == ("A", 4)
+    assert coalesced == 3
+
+
+def test_bounded_queue_policies():
+    from backend.automation_queue import BoundedEventQueue
+
+    async def scenario():
+        drop_oldest = BoundedEventQueue(maxsize=2, policy="drop_oldest")
+        for seq in range(4):
+            await drop_oldest.put(_event("t", seq=seq))
+        assert [(await drop_oldest.get()).payload["seq"] for _ in range(2)] == [2, 3]
+
+        drop_newest = BoundedEventQueue(maxsize=2, policy="drop_newest")
+        for seq in range(4):
+            await drop_newest.put(_event("t", seq=seq))
+        assert [(await drop_newest.get()).payload["seq"] for _ in range(2)] == [0, 1]
+
+        coalesce = BoundedEventQueue(maxsize=2, policy="coalesce")
+        await coalesce.put(_event("t", zone="A", measurement="lux", value=1))
+        await coalesce.put(_event("t", zone="B", measurement="lux", value=2))
+        await coalesce.put(_event("t", zone="A", measurement="lux", value=3))
+        assert [(await coalesce.get()).payload["value"] for _ in range(2)] == [3, 2]
+
+        blocking = BoundedEventQueue(maxsize=1, policy="block")
+        await blocking.put(_event("t", seq=0))
+        waiter = asyncio.create_task(blocking.put(_event("t", seq=1)))
+        await asyncio.sleep(0)
+        assert not waiter.done() and blocking.qsize() == 1
+        assert (await blocking.get()).payload["seq"] == 0
+        await asyncio.wait_for(waiter, timeout=1)
+        return drop_oldest.stats(), drop_newest.stats(), coalesce.stats(), blocking.stats()
+
+    oldest, newest, coalesced, blocking = asyncio.run(scenario())
+    assert (oldest["dropped"], oldest["highWater"]) == (2, 2)
+    assert newest["dropped"] == 2
+    assert (coalesced["coalesced"], coalesced["dropped"]) == (1, 0)
+    assert (blocking["dropped"], blocking["depth"]) == (0, 1)
+
+
+def test_engine_reports_queue_stats():
+    async def scenario():
+        engine = AutomationEngine(
+            LightingController(FIXTURES, LightingState(FIXTURES)),
+            ScheduleStore(),
+            workers=1,
+            queue_size=3,
+            queue_policy="drop_oldest",
+        )
+        for seq in range(5):
+            await engine.publish(_event("sensors/x", seq=seq))
+        return engine.queue_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["depth"] == 3 and stats["highWater"] == 3 and stats["dropped"] == 2
+    assert stats["policy"] == "drop_oldest"
+
+
+def test_rule_metrics_record_latency_errors_and_queue_wait():
+    async def scenario():
+        engine = _engine()
+
+        async def failing(event, controller):
+            raise RuntimeError("boom")
+
+        engine.register_rule(lux_balancing_rule({"A": "fx-0"}, 500))
+        engine.register_rule(lux_balancing_rule({"B": "fx-1"}, 500))
+        engine.register_rule(failing, name="flaky")
+        await engine.start()
+        await engine.publish(_event("sensors/a", measurement="illuminance", zone="A", value=100))
+        await engine.join()
+        await engine.stop()
+        return engine
+
+    engine = asyncio.run(scenario())
+    stats = engine.stats()
+    assert set(stats["rules"]) == {"lux_balancing_rule", "lux_balancing_rule#2", "flaky"}
+    assert stats["rules"]["lux_balancing_rule"]["invocations"] == 1
+    assert stats["rules"]["lux_balancing_rule#2"]["invocations"] == 0
+    assert stats["rules"]["flaky"]["errors"] == 1
+    assert stats["queueWait"]["count"] == 1
+    assert stats["queue"]["depth"] == 0
+
+    text = engine.metrics.render_prometheus(engine.queue_stats())
+    assert 'automation_rule_duration_seconds_count{rule="flaky"} 1' in text
+    assert 'automation_rule_errors_total{rule="flaky"} 1' in text
+    assert 'automation_queue_wait_seconds_bucket{le="+Inf"} 1' in text
+    assert "automation_queue_depth 0" in text
+
+
+def test_metrics_and_stats_endpoints():
+    from fastapi.testclient import TestClient
+
+    from backend.server import app
+
+    previous = app.state.AUTOMATION
+    app.state.AUTOMATION = _engine()
+    app.state.AUTOMATION.register_rule(occupancy_rule({"B": "fx-1"}, 80, 10))
+    try:
+        client = TestClient(app)
+        assert client.get("/automation/stats").json()["rules"]["occupancy_rule"]["invocations"] == 0
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE automation_rule_duration_seconds histogram" in response.text
+    finally:
+        app.state.AUTOMATION = previous
@@ -0,0 +1,135 @@
+import asyncio
+import gzip
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.automation import lux_balancing_rule, occupancy_rule
+from backend.automation_replay import EventLogWriter, VirtualClockEventLoop, read_event_log, replay_events
+from backend.automation_templates import ActionRegistry, compile_templates, template_rule
+from backend.config import LightingFixture
+from backend.device_models import SensorEvent
+
+FIXTURES = [
+    LightingFixture("Zone A", "TopLight", "fx-a", 0, 100, "0-10V", 2700, 6500),
+    LightingFixture("Zone B", "TopLight", "fx-b", 0, 100, "0-10V", 2700, 6500),
+]
+BASE = datetime(2024, 6, 1, 6, 0)
+
+
+def _events():
+    # An hour of lux readings every 10 s in zone A and an occupancy flip in zone B.
+    for second in range(0, 3600, 10):
+        yield SensorEvent(
+            topic="sensors/zone-a/lux",
+            payload={"measurement": "illuminance", "zone": "Zone A", "value": 400},
+            received_at=BASE + timedelta(seconds=second),
+        )
+    yield SensorEvent(
+        topic="sensors/zone-b/motion",
+        payload={"measurement": "occupancy", "zone": "Zone B", "value": True},
+        received_at=BASE + timedelta(seconds=3599),
+    )
+
+
+def _configure(engine):
+    zone_map = {fixture.name: fixture.address for fixture in FIXTURES}
+    engine.register_rule(lux_balancing_rule(zone_map, 500))
+    engine.register_rule(occupancy_rule(zone_map, 80, 10))
+
+
+def test_event_log_round_trip(tmp_path):
+    path = tmp_path / "events.jsonl.gz"
+    writer = EventLogWriter(path)
+    events = list(_events())[:5]
+    for event in events:
+        writer.append(event)
+    writer.close()
+    writer = EventLogWriter(path)  # reopening appends a second gzip member
+    writer.append(events[0])
+    writer.close()
+
+    replayed = list(read_event_log(path))
+    assert [event.payload for event in replayed] == [event.payload for event in events] + [events[0].payload]
+    assert replayed[1].received_at == BASE.replace(tzinfo=timezone.utc) + timedelta(seconds=10)
+    assert path.stat().st_size < len(gzip.decompress(path.read_bytes()))
+
+
+def test_virtual_clock_skips_sleeps():
+    loop = VirtualClockEventLoop()
+    began = time.perf_counter()
+    try:
+        loop.run_until_complete(asyncio.sleep(3600))
+        assert loop.time() >= 3600
+    finally:
+        loop.close()
+    assert time.perf_counter() - began < 1
+
+
+def test_replay_produces_timeline_faster_than_real_time():
+    result = replay_events(_events(), FIXTURES, _configure)
+
+    assert result.events == 361
+    assert result.virtual_seconds >= 3599
+    assert result.speedup > 100
+    assert result.commands_by_fixture() == {"fx-a": 360, "fx-b": 1}
+    # fx-a reaches full brightness after ten steps; later commands are no-ops.
+    assert result.changes == 11
+    last = result.timeline[-1]
+    assert (last["address"], last["brightness"]) == ("fx-b", 80)
+    assert 3599 <= last["t"] < 3600
+    assert last["at"].startswith("2024-06-01T06:59:59")
+    assert result.automation["rules"]["lux_balancing_rule"]["invocations"] == 360
+
+
+def test_replay_measures_effect_of_coalescing():
+    # Ten readings per second for a minute; a 1 s window keeps one per second.
+    burst = [
+        SensorEvent(
+            topic="sensors/zone-a/lux",
+            payload={"measurement": "illuminance", "zone": "Zone A", "value": 400 + index % 3},
+            received_at=BASE + timedelta(milliseconds=100 * index),
+        )
+        for index in range(600)
+    ]
+    plain = replay_events(burst, FIXTURES, _configure)
+    coalesced = replay_events(burst, FIXTURES, _configure, coalesce_seconds=1.0)
+    assert plain.commands == 600
+    assert 55 <= coalesced.commands <= 61
+
+
+def test_replayed_template_debounce_follows_the_virtual_clock():
+    document = {
+        "farm_automation_templates": {
+            "co2": {
+                "rules": [
+                    {
+                        "id": "co2-vent",
+                        "trigger": {"type": "co2", "value": {"operator": "gt", "threshold": 1500}},
+                        "actions": [{"type": "vent"}],
+                        "options": {"debounceMs": 60000},
+                    }
+                ]
+            }
+        }
+    }
+    fired = []
+
+    async def vent(action, reading):
+        fired.append(reading.value)
+
+    def configure(engine):
+        registry = ActionRegistry()
+        registry.register("vent", vent)
+        engine.register_rule(template_rule(compile_templates(document), registry))
+
+    # Six readings ten virtual minutes apart: each is outside the previous one's 60 s debounce.
+    events = [
+        SensorEvent(
+            topic="sensors/gh/co2",
+            payload={"measurement": "co2", "zone": "gh", "value": 1600 + index},
+            received_at=BASE + timedelta(minutes=10 * index),
+        )
+        for index in range(6)
+    ]
+    replay_events(events, FIXTURES, configure)
+    assert fired == [1600, 1601, 1602, 1603, 1604, 1605]
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from backend.automation_templates import (
+    ActionRegistry,
+    TemplateReading,
+    compile_templates,
+    compile_value_predicate,
+    load_automation_templates,
+    minute_mask,
+    template_rule,
+)
+from backend.device_models import SensorEvent
+
+TEMPLATES = Path(__file__).resolve().parents[1] / "config" / "automation-templates.json"
+
+
+def _reading(kind, value, hour, **extra):
+    return TemplateReading(type=kind, value=value, timestamp=datetime(2024, 6, 3, hour, 30), **extra)
+
+
+def test_value_predicates_and_minute_masks():
+    assert compile_value_predicate({"operator": "gt", "threshold": 28})(28.5)
+    assert not compile_value_predicate({"operator": "gt", "threshold": 28})("hot")
+    outside = compile_value_predicate({"operator": "outside", "range": {"min": 100, "max": 500}})
+    assert outside(50) and outside(600) and not outside(300)
+
+    overnight = minute_mask(20, 6)
+    assert overnight[20 * 60] and overnight[5 * 60 + 59] and not overnight[6 * 60] and not overnight[12 * 60]
+    assert sum(minute_mask(6, 20)) == 14 * 60
+    # As in the Node engine: 0-24 is always active, an end past 24 stops at midnight, start == end never fires.
+    assert sum(minute_mask(0, 24)) == 24 * 60
+    assert sum(minute_mask(18, 30)) == 6 * 60
+    assert sum(minute_mask(5, 5)) == 0
+
+
+def test_repository_templates_compile_and_respect_time_and_debounce():
+    ruleset = load_automation_templates(TEMPLATES)
+    assert {"temperature", "humidity", "co2", "motion", "power_consumption"} <= set(ruleset.trigger_types)
+
+    # 29 °C at noon: greenhouse exhaust (6-20h, >28) and livestock cooling (10-18h, >25).
+    fired = ruleset.evaluate(_reading("temperature", 29, 12), now=0.0)
+    assert {rule.rule_id for rule in fired} == {"greenhouse-high-temp-exhaust", "livestock-high-temp-cooling"}
+    # Still inside both debounce windows.
+    assert ruleset.evaluate(_reading("temperature", 30, 12), now=60.0) == []
+    # Greenhouse debounce (300 s) has elapsed; livestock (600 s) has not.
+    fired = ruleset.evaluate(_reading("temperature", 30, 12), now=301.0)
+    assert [rule.rule_id for rule in fired] == ["greenhouse-high-temp-exhaust"]
+
+    # Night-only motion rule and source-filtered contact rule.
+    assert ruleset.evaluate(_reading("motion", 1, 12), now=0.0) == []
+    assert [rule.rule_id for rule in ruleset.evaluate(_reading("motion", 1, 23), now=0.0)] == ["motion-security-lights"]
+    assert ruleset.evaluate(_reading("contact", 1, 12, source="ifttt"), now=0.0) == []
+    assert len(ruleset.evaluate(_reading("contact", 1, 12, source="switchbot"), now=0.0)) == 1
+
+
+def test_naive_timestamps_are_utc_for_time_windows():
+    previous_tz = os.environ.get("TZ")
+    os.environ["TZ"] = "America/New_York"
+    time.tzset()
+    try:
+        ruleset = load_automation_templates(TEMPLATES, templates=["greenhouse_climate_control"])
+        # 23:30 UTC is 19:30 in New York (EDT): inside the 06-20h exhaust window.
+        late_utc = TemplateReading(type="temperature", value=29, timestamp=datetime(2024, 6, 3, 23, 30))
+        assert [rule.rule_id for rule in ruleset.evaluate(late_utc, now=0.0)] == ["greenhouse-high-temp-exhaust"]
+        # 02:30 UTC is 22:30 the previous evening in New York: outside it.
+        aware = TemplateReading(type="temperature", value=29, timestamp=datetime(2024, 6, 4, 2, 30, tzinfo=timezone.utc))
+        assert ruleset.evaluate(aware, now=1000.0) == []
+    finally:
+        if previous_tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = previous_tz
+        time.tzset()
+
+
+def test_template_rule_dispatches_registered_actions():
+    ruleset = load_automation_templates(TEMPLATES, templates=["greenhouse_climate_control"])
+    registry = ActionRegistry()
+    calls = []
+
+    async def kasa(action, reading):
+        calls.append((action["deviceId"], action["command"], reading.value))
+
+    registry.register("kasa_control", kasa)
+    rule = template_rule(ruleset, registry)
+    event = SensorEvent(
+        topic="sensors/gh/co2",
+        payload={"measurement": "co2", "value": 1800, "zone": "gh-1"},
+        received_at=datetime(2024, 6, 3, 3, 0),
+    )
+    asyncio.run(rule(event, None))
+    assert calls == [("ventilation-intake", "turnOn", 1800), ("ventilation-exhaust", "turnOn", 1800)]
+
+
+def test_all_day_time_range_always_fires():
+    ruleset = compile_templates(
+        {
+            "farm_automation_templates": {
+                "all_day": {
+                    "rules": [
+                        {
+                            "id": "always",
+                            "trigger": {"type": "co2"},
+                            "conditions": {"timeRange": {"start": 0, "end": 24}},
+                            "options": {"debounceMs": 1},
+                        }
+                    ]
+                }
+            }
+        }
+    )
+    for index, hour in enumerate((0, 6, 12, 23)):
+        assert len(ruleset.evaluate(_reading("co2", 900, hour), now=float(index))) == 1
+
+
+def test_default_registry_forwards_device_actions_like_the_node_engine():
+    posted = []
+
+    def post(url, payload):
+        posted.append((url, dict(payload)))
+        return {"ok": True}
+
+    ruleset = load_automation_templates(TEMPLATES)
+    registry = ActionRegistry("http://node:8091/", post=post)
+    assert registry.unhandled(ruleset) == []
+    reading = TemplateReading(type="motion", value=1, device_id="cam-1")
+
+    scenario = asyncio.run(registry.execute({"type": "scenario", "scenarioId": "security-lighting"}, reading))
+    assert [step["success"] for step in scenario["steps"]] == [True, True, True]
+    assert ("http://node:8091/api/kasa/devices/security-light-1/control", {"action": "turnOn"}) in posted
+    assert (
+        "http://node:8091/integrations/ifttt/trigger/security_motion_alert",
+        {"value1": "Motion detected", "value2": "cam-1", "value3": "motion"},
+    ) in posted
+    # Unknown scenarios fail the action, as they do in engine.js.
+    (result,) = asyncio.run(registry.run(ruleset.get("motion-security-lights"), reading))
+    assert result == {"action": "scenario", "success": False, "error": "Scenario not found: security-lighting-full"}
+
+    asyncio.run(registry.execute({"type": "switchbot_control", "deviceId": "bot 1", "command": "press"}, reading))
+    assert posted[-1] == ("http://node:8091/api/switchbot/devices/bot%201/commands", {"command": "press", "parameter": "default"})
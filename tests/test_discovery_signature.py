@@ -9,3 +9,77 @@ def test_full_discovery_accepts_logger():
     assert 'logger' in params, 'full_discovery_cycle must accept a logger kwarg'
     # Should be optional
     assert params['logger'].default is None
+
+
+def test_mqtt_messages_are_handed_off_without_blocking():
+    import asyncio
+    import json
+    import time
+    from types import SimpleNamespace
+
+    from backend.config import MQTTConfig
+    from backend.state import DeviceRegistry, SensorEventBuffer
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    received = []
+
+    def handler(event):
+        received.append(event.topic)
+
+    try:
+        client = device_discovery._MQTTDiscoveryClient(
+            MQTTConfig(host="localhost"), SensorEventBuffer(), DeviceRegistry(), handler
+        )
+        message = SimpleNamespace(topic="sensors/a/co2", payload=json.dumps({"value": 1}).encode())
+        began = time.perf_counter()
+        # The loop is not running, as when it is busy: the network thread must not wait on it.
+        client._on_message(None, None, message)
+        assert time.perf_counter() - began < 0.5
+        loop.run_until_complete(asyncio.sleep(0))
+        assert received == ["sensors/a/co2"]
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_mqtt_flood_under_block_policy_stays_bounded():
+    import asyncio
+    import json
+    import threading
+    import tracemalloc
+    from types import SimpleNamespace
+
+    from backend.automation import AutomationEngine
+    from backend.config import MQTTConfig
+    from backend.state import DeviceRegistry, ScheduleStore, SensorEventBuffer
+
+    async def scenario():
+        # Workers are never started: the engine is stalled and the single shard fills up.
+        engine = AutomationEngine(None, ScheduleStore(), workers=1, queue_size=16, queue_policy="block")
+        client = device_discovery._MQTTDiscoveryClient(
+            MQTTConfig(host="localhost"), SensorEventBuffer(), DeviceRegistry(), engine.offer
+        )
+        messages = [
+            SimpleNamespace(topic="sensors/gh/co2", payload=json.dumps({"value": index}).encode())
+            for index in range(20_000)
+        ]
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            flood = threading.Thread(target=lambda: [client._on_message(None, None, m) for m in messages])
+            flood.start()
+            while flood.is_alive():
+                await asyncio.sleep(0.01)
+            flood.join()
+            await asyncio.sleep(0.05)
+            growth = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+        return engine.queue_stats(), len(asyncio.all_tasks()), growth
+
+    stats, tasks, growth = asyncio.run(scenario())
+    assert stats["depth"] == 16
+    assert stats["dropped"] == 20_000 - 16
+    assert tasks == 1  # only the scenario itself: no parked publishers
+    assert growth < 2_000_000
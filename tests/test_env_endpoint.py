@@ -0,0 +1,143 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend.server import app
+from backend.state import EnvironmentStateStore, EnvironmentTelemetryStore
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def environment_stores():
+    previous = (app.state.ENVIRONMENT_TELEMETRY, app.state.ENVIRONMENT_STATE)
+    app.state.ENVIRONMENT_TELEMETRY = EnvironmentTelemetryStore()
+    app.state.ENVIRONMENT_STATE = EnvironmentStateStore()
+    yield app.state.ENVIRONMENT_TELEMETRY
+    app.state.ENVIRONMENT_TELEMETRY, app.state.ENVIRONMENT_STATE = previous
+
+
+def test_get_env_returns_304_until_telemetry_changes(environment_stores):
+    environment_stores.add_reading("Room A", datetime.now(timezone.utc), {"temp": 21.5})
+
+    first = client.get("/env")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.json()["zones"][0]["sensors"]["tempC"]["current"] == 21.5
+
+    cached = client.get("/env", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+
+    environment_stores.add_reading("Room A", datetime.now(timezone.utc), {"temp": 22.0})
+    refreshed = client.get("/env", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
+
+
+def test_etag_varies_with_query_and_environment_state():
+    baseline = client.get("/env").headers["ETag"]
+    assert client.get("/env?range=1h").headers["ETag"] != baseline
+
+    client.post("/env", json={"rooms": {"room-a": {"targets": {"tempC": 22}}}})
+    assert client.get("/env").headers["ETag"] != baseline
+
+
+def test_state_merge_replaces_zones_set_to_non_dict_values():
+    store = EnvironmentStateStore()
+    store.merge({"zones": {"z1": {"targets": {"rh": 60}}, "z2": {"targets": {"rh": 55}}}})
+    store.merge({"zones": {"z1": {"targets": {"tempC": 22}}, "z2": None}})
+
+    assert store.get_zone("z1")["targets"] == {"rh": 60, "tempC": 22}
+    assert store.get_zone("z2") is None
+    assert store.snapshot()["zones"]["z2"] is None
+    # A zones value that is not a mapping of zone ids leaves the zone map alone.
+    store.merge({"zones": ["z1"]})
+    assert store.get_zone("z1")["targets"] == {"rh": 60, "tempC": 22}
+    assert store.upsert_zone("z2", {"targets": {"rh": 50}})["targets"] == {"rh": 50}
+
+
+def test_bulk_ndjson_ingest_acknowledges_counts(environment_stores):
+    lines = [
+        '{"scope": "Room A", "ts": 1700000000, "sensors": {"temp": 20}}',
+        '{"scope": "Room B", "ts": 1700000005, "sensors": {"rh": 60}}',
+        "not json",
+        '{"scope": "Room A", "ts": 1700000010, "sensors": {"temp": 21}}',
+        '{"scope": "Room A", "sensors": {"temp": "n/a"}}',
+        "",
+    ]
+    response = client.post("/env/bulk", content="\n".join(lines).encode("utf-8"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["accepted"] == 3
+    assert body["rejected"] == 2
+    assert body["errors"] == [{"line": 3, "error": "invalid JSON"}]
+    assert "zones" not in body
+    zone = environment_stores.get_zone("Room A")
+    assert zone["sensors"]["tempC"]["history"] == [21.0, 20.0]
+
+
+def test_bulk_ingest_rejects_out_of_range_timestamps(environment_stores):
+    lines = [
+        '{"scope": "Room A", "ts": 1700000000, "sensors": {"temp": 20}}',
+        '{"scope": "Room A", "ts": 1e17, "sensors": {"temp": 21}}',
+        '{"scope": "Room A", "ts": 1e300, "sensors": {"temp": 22}}',
+        '{"scope": "Room A", "ts": Infinity, "sensors": {"temp": 23}}',
+        '{"scope": "Room A", "ts": 1700000010, "sensors": {"temp": 24}}',
+    ]
+    response = client.post("/env/bulk", content="\n".join(lines).encode("utf-8"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["accepted"], body["rejected"]) == (2, 3)
+    assert [error["line"] for error in body["errors"]] == [2, 3, 4]
+    assert environment_stores.get_zone("Room A")["sensors"]["tempC"]["history"] == [24.0, 20.0]
+
+
+def test_stats_query_returns_summary_block(environment_stores):
+    environment_stores.add_reading("Room A", datetime.now(timezone.utc), {"rh": 55})
+
+    full = client.get("/env")
+    summary = client.get("/env?stats=only")
+    assert summary.headers["ETag"] != full.headers["ETag"]
+    rh = summary.json()["zones"][0]["sensors"]["rh"]
+    assert "history" not in rh
+    assert rh["stats"]["1h"]["mean"] == 55.0
+
+
+def test_export_streams_csv_rows_for_selected_scopes(environment_stores):
+    environment_stores.add_readings(
+        [
+            ("Room A", datetime.fromtimestamp(1700000000, timezone.utc), {"temp": 20, "rh": 50}, None),
+            ("Room A", datetime.fromtimestamp(1700000060, timezone.utc), {"temp": 21}, None),
+            ("Room B", datetime.fromtimestamp(1700000000, timezone.utc), {"temp": 18}, None),
+        ]
+    )
+
+    response = client.get("/env/export", params={"scope": "Room A", "start": "1700000030"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == [
+        "scope,metric,timestamp,value",
+        "Room A,tempC,2023-11-14T22:14:20.000Z,21.0",
+    ]
+
+
+def test_export_streams_arrow_ipc(environment_stores):
+    pa = pytest.importorskip("pyarrow")
+    environment_stores.add_reading("Room A", datetime.fromtimestamp(1700000000.5, timezone.utc), {"co2": 640})
+
+    response = client.get("/env/export", params={"format": "arrow"})
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("scope").to_pylist() == ["Room A"]
+    assert table.column("value").to_pylist() == [640.0]
+    assert table.column("timestamp").cast(pa.int64()).to_pylist() == [1700000000500]
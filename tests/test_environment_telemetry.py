@@ -0,0 +1,325 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.state import EnvironmentTelemetryStore
+from backend.telemetry import RollupTier, SampleRing
+from backend.telemetry_segments import TelemetrySegmentStore
+
+
+def _at(seconds_ago: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+
+
+def test_sample_ring_overwrites_oldest_when_full():
+    ring = SampleRing(3)
+    for index in range(5):
+        ring.append(float(index), index * 10.0)
+
+    assert len(ring) == 3
+    assert list(ring.iter_newest_first()) == [(4.0, 40.0), (3.0, 30.0), (2.0, 20.0)]
+    assert ring.oldest_ts() == 2.0
+    assert ring.newest() == (4.0, 40.0)
+
+
+def test_sample_ring_drops_expired_samples_from_tail():
+    ring = SampleRing(8)
+    for index in range(6):
+        ring.append(float(index), 1.0)
+
+    assert ring.drop_older_than(4.0) == 4
+    assert [ts for ts, _ in ring.iter_newest_first()] == [5.0, 4.0]
+
+
+def test_add_reading_renders_newest_first_and_caps_samples():
+    store = EnvironmentTelemetryStore(max_samples=3)
+    for index in range(5):
+        store.add_reading("Room A", _at(50 - index), {"temperature": 20 + index})
+
+    zone = store.get_zone("room a")
+    assert zone is not None
+    temp = zone["sensors"]["tempC"]
+    assert temp["current"] == 24.0
+    assert temp["history"] == [24.0, 23.0, 22.0]
+    assert len(temp["timestamps"]) == 3
+    assert temp["updatedAt"].endswith("Z")
+
+
+def test_range_filter_excludes_old_samples():
+    store = EnvironmentTelemetryStore()
+    store.add_reading("Room A", _at(7200), {"rh": 50})
+    store.add_reading("Room A", _at(60), {"rh": 55})
+
+    zone = store.get_zone("Room A", range_seconds=3600)
+    assert zone["sensors"]["rh"]["history"] == [55.0]
+
+
+def test_rollup_tier_aggregates_buckets():
+    tier = RollupTier(60, 10)
+    for ts, value in ((0.0, 1.0), (30.0, 3.0), (61.0, 10.0), (45.0, 5.0)):
+        tier.add(ts, value)
+
+    buckets = list(tier.iter_newest_first())
+    assert buckets[0] == (60.0, 10.0, 10.0, 10.0, 1)
+    assert buckets[1] == (0.0, 3.0, 1.0, 5.0, 3)
+
+
+def test_long_range_query_uses_rollups_once_raw_window_is_exceeded():
+    store = EnvironmentTelemetryStore(max_samples=10)
+    for minute in range(120):
+        store.add_reading("Room A", _at((120 - minute) * 60), {"co2": 400 + minute})
+
+    raw = store.get_zone("Room A", range_seconds=300)["sensors"]["co2"]
+    assert raw["resolution"] == "raw"
+
+    day = store.get_zone("Room A", range_seconds=24 * 3600)["sensors"]["co2"]
+    assert day["resolution"] == "1m"
+    assert len(day["history"]) == 120
+    assert day["history"][0] == 519.0
+
+    budgeted = store.get_zone("Room A", range_seconds=24 * 3600, max_points=48)["sensors"]["co2"]
+    assert budgeted["resolution"] == "1h"
+    assert sum(budgeted["count"]) == 120
+
+
+def test_segments_round_trip_and_merge_late_batches(tmp_path):
+    segments = TelemetrySegmentStore(tmp_path, batch_size=1000)
+    base = 1_700_000_000.0
+    for offset in (0, 10, 20):
+        segments.append("Room A", "rh", base + offset, offset)
+    segments.flush()
+    segments.append("Room A", "rh", base + 5, 5.0)
+    segments.flush()
+
+    assert list(segments.iter_range("Room A", "rh")) == [
+        (base, 0.0),
+        (base + 5, 5.0),
+        (base + 10, 10.0),
+        (base + 20, 20.0),
+    ]
+    assert list(segments.iter_range("Room A", "rh", base + 6, base + 15)) == [(base + 10, 10.0)]
+    assert segments.tail("Room A", "rh", 2) == [(base + 10, 10.0), (base + 20, 20.0)]
+
+
+def test_store_recovers_hot_window_and_serves_history_from_disk(tmp_path):
+    store = EnvironmentTelemetryStore(max_samples=5, segments=TelemetrySegmentStore(tmp_path))
+    for minute in range(30):
+        store.add_reading("Room A", _at((30 - minute) * 60), {"co2": 400 + minute})
+    store.flush()
+
+    restarted = EnvironmentTelemetryStore(max_samples=5, segments=TelemetrySegmentStore(tmp_path))
+    assert restarted.recover() == 5
+    zone = restarted.get_zone("Room A")
+    assert zone["sensors"]["co2"]["history"] == [429.0, 428.0, 427.0, 426.0, 425.0]
+
+    history = restarted.get_zone("Room A", range_seconds=3600)["sensors"]["co2"]
+    assert history["resolution"] == "1m"
+    assert len(history["history"]) == 30
+    assert history["history"][-1] == 400.0
+
+
+def test_compressed_recovery_replays_a_day_and_rebuilds_rollups_from_aggregates(tmp_path, monkeypatch):
+    store = EnvironmentTelemetryStore(
+        compressed_budget_bytes=64 * 1024, segments=TelemetrySegmentStore(tmp_path)
+    )
+    for step in range(3 * 144):
+        store.add_reading("Room A", _at((3 * 144 - step) * 600), {"co2": 400 + step})
+    store.flush()
+
+    segments = TelemetrySegmentStore(tmp_path)
+    restarted = EnvironmentTelemetryStore(compressed_budget_bytes=64 * 1024, segments=segments)
+    # The budget is bytes: only the last day of raw samples is replayed, not 64k of them.
+    assert restarted.recover() == 144
+
+    def no_disk_reads(*args, **kwargs):
+        raise AssertionError("range should be served from the rebuilt rollups")
+
+    monkeypatch.setattr(segments, "iter_range", no_disk_reads)
+    history = restarted.get_zone("Room A", range_seconds=2 * 86400)["sensors"]["co2"]
+    assert sum(history["count"]) == 288
+    assert history["history"][0] == 831.0
+    assert history["history"][-1] == 544.0
+
+
+def test_disk_history_reads_merge_unflushed_samples_without_writing(tmp_path):
+    segments = TelemetrySegmentStore(tmp_path, batch_size=1000, flush_interval=3600)
+    store = EnvironmentTelemetryStore(max_samples=5, segments=segments)
+    for minute in range(30):
+        store.add_reading("Room A", _at((30 - minute) * 60), {"co2": 400 + minute})
+
+    history = store.get_zone("Room A", range_seconds=3600)["sensors"]["co2"]
+    assert sum(history["count"]) == 30
+    assert not list(tmp_path.rglob("*.seg"))
+
+    store.compact()
+    assert list(tmp_path.rglob("*.seg"))
+
+
+def test_segment_appends_only_buffer_and_the_writer_thread_flushes(tmp_path):
+    segments = TelemetrySegmentStore(tmp_path, batch_size=4, flush_interval=3600)
+    base = 1_700_000_000.0
+    for offset in range(10):
+        segments.append("Room A", "rh", base + offset, float(offset))
+    assert not list(tmp_path.rglob("*.seg"))
+    assert len(list(segments.iter_range("Room A", "rh"))) == 10
+
+    segments.start()
+    try:
+        for _ in range(200):
+            if list(tmp_path.rglob("*.seg")):
+                break
+            time.sleep(0.01)
+        assert list(tmp_path.rglob("*.seg"))
+    finally:
+        segments.append("Room A", "rh", base + 10, 10.0)
+        segments.close()
+    assert len(list(segments._iter_persisted("Room A", "rh", None, None))) == 11
+
+
+def test_segment_store_skips_stray_files(tmp_path):
+    segments = TelemetrySegmentStore(tmp_path)
+    base = 1_700_000_000.0
+    segments.append("Room A", "rh", base, 1.0)
+    segments.flush()
+    series_dir = next(tmp_path.rglob("*.seg")).parent
+    (series_dir / "notes.seg").write_bytes(b"")
+
+    assert list(segments.iter_range("Room A", "rh")) == [(base, 1.0)]
+    assert segments.prune(base + 7200) == 1
+    assert (series_dir / "notes.seg").exists()
+
+
+def test_sample_ring_orders_late_samples_and_replaces_duplicates():
+    ring = SampleRing(4)
+    for ts in (10.0, 30.0, 40.0):
+        ring.upsert(ts, ts)
+
+    assert ring.upsert(20.0, 20.0) is None
+    assert ring.upsert(30.0, 31.0) == 30.0
+    assert [ts for ts, _ in ring.iter_newest_first()] == [40.0, 30.0, 20.0, 10.0]
+
+    # Full ring: a late sample evicts the oldest, one older than the window is dropped.
+    ring.upsert(15.0, 15.0)
+    ring.upsert(5.0, 5.0)
+    assert list(ring.iter_newest_first()) == [(40.0, 40.0), (30.0, 31.0), (20.0, 20.0), (15.0, 15.0)]
+    lo, hi = ring.bounds(16.0, 35.0)
+    timestamps, values = ring.columns(lo, hi)
+    assert list(timestamps) == [20.0, 30.0] and list(values) == [20.0, 31.0]
+
+
+def test_backfilled_reading_keeps_current_value_and_is_idempotent():
+    store = EnvironmentTelemetryStore()
+    late = _at(600)
+    store.add_reading("Room A", _at(60), {"rh": 55})
+    store.add_reading("Room A", late, {"rh": 40})
+    store.add_reading("Room A", late, {"rh": 41})
+
+    rh = store.get_zone("Room A")["sensors"]["rh"]
+    assert rh["current"] == 55.0
+    assert rh["history"] == [55.0, 41.0]
+
+    rolled = store.get_zone("Room A", range_seconds=3600, max_points=1)["sensors"]["rh"]
+    assert sum(rolled["count"]) == 2
+
+
+def test_render_cache_reuses_payload_until_version_changes():
+    store = EnvironmentTelemetryStore()
+    store.add_reading("Room A", _at(30), {"co2": 800})
+
+    token = store.cache_token(3600)
+    first = store.get_zone("Room A", range_seconds=3600)
+    assert store.get_zone("Room A", range_seconds=3600) is first
+    assert store.cache_token(3600) == token
+
+    store.add_reading("Room A", _at(10), {"co2": 810})
+    assert store.cache_token(3600) != token
+    assert store.get_zone("Room A", range_seconds=3600)["sensors"]["co2"]["current"] == 810.0
+
+
+def test_concurrent_ingest_and_render_across_scopes():
+    store = EnvironmentTelemetryStore(max_samples=500)
+    errors = []
+
+    def writer(room):
+        try:
+            for index in range(200):
+                store.add_reading(f"Room {room}", _at(400 - index), {"rh": index})
+        except Exception as exc:
+            errors.append(exc)
+
+    def reader():
+        try:
+            for _ in range(50):
+                store.list_zones(range_seconds=3600)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=writer, args=(room,)) for room in range(4)]
+    threads.append(threading.Thread(target=reader))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    zones = store.list_zones()
+    assert [zone["scope"] for zone in zones] == [f"Room {room}" for room in range(4)]
+    assert all(len(zone["sensors"]["rh"]["history"]) == 200 for zone in zones)
+
+
+def test_stats_only_render_reports_rolling_summaries_without_history():
+    store = EnvironmentTelemetryStore()
+    for minute in range(90):
+        store.add_reading("Room A", _at((90 - minute) * 60), {"co2": 400 + minute})
+
+    co2 = store.get_zone("Room A", stats_only=True)["sensors"]["co2"]
+    assert "history" not in co2
+    hour = co2["stats"]["1h"]
+    assert hour["max"] == 489.0
+    assert 55 <= hour["count"] <= 65
+    assert co2["stats"]["24h"]["count"] == 90
+    assert co2["stats"]["24h"]["min"] == 400.0
+    assert store.get_zone("Room A")["sensors"]["co2"]["stats"]["24h"]["count"] == 90
+
+
+def test_stats_windows_end_at_query_time_for_a_stale_series():
+    store = EnvironmentTelemetryStore()
+    # The sensor went quiet three hours ago after reporting for an hour.
+    for minute in range(60):
+        store.add_reading("Room A", _at(4 * 3600 - minute * 60), {"co2": 400 + minute})
+
+    stats = store.get_zone("Room A", stats_only=True)["sensors"]["co2"]["stats"]
+    assert stats["1h"] is None
+    assert stats["24h"]["count"] == 60
+
+
+def test_compaction_trims_expired_data_off_the_ingest_path():
+    store = EnvironmentTelemetryStore(retention_hours=1, max_samples=100)
+    store.add_reading("Room A", _at(3 * 3600), {"rh": 40})
+    store.add_reading("Room A", _at(60), {"rh": 55})
+    assert len(store.get_zone("Room A")["sensors"]["rh"]["history"]) == 2
+
+    result = store.compact()
+    assert result["reclaimedSamples"] == 1
+    assert result["reclaimedBuckets"] >= 1
+    assert store.last_compaction() == result
+    assert store.get_zone("Room A")["sensors"]["rh"]["history"] == [55.0]
+
+
+def test_export_chunks_columns_from_memory_and_segments(tmp_path):
+    base = 1_700_000_000.0
+    readings = [("Room A", datetime.fromtimestamp(base + i, timezone.utc), {"rh": i}, None) for i in range(10)]
+
+    in_memory = EnvironmentTelemetryStore(retention_hours=0)
+    in_memory.add_readings(readings)
+    chunks = list(in_memory.iter_export(["room a"], start=base + 2, chunk_size=3))
+    assert [len(timestamps) for _, _, timestamps, _ in chunks] == [3, 3, 2]
+    assert [value for *_, values in chunks for value in values] == [float(i) for i in range(2, 10)]
+
+    persisted = EnvironmentTelemetryStore(retention_hours=0, segments=TelemetrySegmentStore(tmp_path))
+    persisted.add_readings(readings)
+    chunks = list(persisted.iter_export(None, end=base + 4, chunk_size=4))
+    assert [(scope, metric, list(values)) for scope, metric, _, values in chunks] == [
+        ("Room A", "rh", [0.0, 1.0, 2.0, 3.0]),
+        ("Room A", "rh", [4.0]),
+    ]
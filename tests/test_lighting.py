@@ -0,0 +1,174 @@
+import pytest
+
+from backend.config import LightingFixture
+from backend.lighting import LightingController
+from backend.state import LightingState
+
+FIXTURES = [
+    LightingFixture("Bay 1", "TopLight", "bay-1", 10, 90, "0-10V", 2700, 6500),
+    LightingFixture("Bay 2", "TopLight", "bay-2", 0, 100, "0-10V", 3000, 5000),
+]
+
+
+class CountingState(LightingState):
+    def __init__(self, fixtures):
+        super().__init__(fixtures)
+        self.batches = 0
+
+    def apply_settings(self, settings):
+        self.batches += 1
+        return super().apply_settings(settings)
+
+
+def test_set_outputs_clamps_and_applies_in_one_batch():
+    state = CountingState(FIXTURES)
+    controller = LightingController(FIXTURES, state)
+
+    applied = controller.set_outputs({"bay-1": 100, "bay-2": (5, 9000)})
+
+    assert state.batches == 1
+    assert applied["bay-1"]["brightness"] == 90
+    assert applied["bay-2"]["updated_at"] == applied["bay-1"]["updated_at"]
+    assert (applied["bay-2"]["brightness"], applied["bay-2"]["spectrum"]) == (5, 5000)
+    assert state.get_state("bay-2")["spectrum"] == 5000
+
+
+def test_no_op_writes_are_skipped_and_changes_are_versioned():
+    state = LightingState(FIXTURES)
+    controller = LightingController(FIXTURES, state)
+
+    controller.set_outputs({"bay-1": 50, "bay-2": 60})
+    mark = state.version
+    assert state.get_state("bay-1")["version"] < state.get_state("bay-2")["version"] == mark
+
+    controller.set_outputs({"bay-1": 50, "bay-2": (60, None)})
+    assert state.version == mark and state.skipped_writes == 2
+    assert state.changes_since(mark) == (mark, {})
+
+    controller.set_output("bay-1", 70)
+    controller.set_output("bay-1", 75)
+    version, changes = state.changes_since(mark)
+    assert list(changes) == ["bay-1"] and changes["bay-1"]["brightness"] == 75
+    assert version == changes["bay-1"]["version"] == mark + 2
+    assert sorted(state.changes_since(0)[1]) == ["bay-1", "bay-2"]
+
+
+def test_set_outputs_rejects_unknown_fixtures_without_applying():
+    state = LightingState(FIXTURES)
+    controller = LightingController(FIXTURES, state)
+
+    with pytest.raises(ValueError):
+        controller.set_outputs({"bay-1": 50, "bay-9": 50})
+    assert state.get_state("bay-1")["brightness"] == 10
+
+
+def test_set_outputs_accepts_list_pairs_and_rejects_malformed_entries():
+    state = LightingState(FIXTURES)
+    controller = LightingController(FIXTURES, state)
+
+    applied = controller.set_outputs({"bay-2": [40, 4500]})
+    assert (applied["bay-2"]["brightness"], applied["bay-2"]["spectrum"]) == (40, 4500)
+
+    for malformed in ([40], (40, 4500, 1), "40", [None, 4500], (40, "warm")):
+        with pytest.raises(ValueError):
+            controller.set_outputs({"bay-1": 50, "bay-2": malformed})
+    assert state.get_state("bay-1")["brightness"] == 10
+
+
+def test_safe_defaults_are_one_batch():
+    state = CountingState(FIXTURES)
+    LightingController(FIXTURES, state).apply_safe_defaults()
+
+    assert state.batches == 1
+    assert state.get_state("bay-1")["brightness"] == 50
+    assert (state.get_state("bay-2")["brightness"], state.get_state("bay-2")["spectrum"]) == (50, 3000)
+
+
+ROOM = [
+    LightingFixture(f"Rack {index}", "Bar", f"rack-{index}", 0, 100, "0-10V", 2700, 6500,
+                    group="LG-A" if index < 3 else "LG-B", zone="Z1", room="North")
+    for index in range(5)
+]
+
+
+def test_index_resolves_addresses_names_and_scopes():
+    controller = LightingController(ROOM, LightingState(ROOM))
+    index = controller.index
+
+    assert index.resolve("rack-2") == ["rack-2"]
+    assert index.resolve("Rack 4") == ["rack-4"]
+    assert index.resolve("group:LG-A") == ["rack-0", "rack-1", "rack-2"]
+    assert index.resolve("room:North") == [f"rack-{index}" for index in range(5)]
+    assert index.resolve("zone:Nowhere") == [] and index.resolve("missing") == []
+    assert index.scope_names("group") == ["LG-A", "LG-B"]
+
+
+def test_target_output_fans_out_as_one_batch():
+    state = CountingState(ROOM)
+    applied = LightingController(ROOM, state).set_target_output("group:LG-B", 70, 4000)
+
+    assert sorted(applied) == ["rack-3", "rack-4"]
+    assert state.batches == 1
+    assert state.get_state("rack-0")["brightness"] == 0
+    with pytest.raises(ValueError):
+        LightingController(ROOM, state).set_target_output("room:South", 10)
+
+
+def test_lighting_targets_endpoint():
+    from fastapi.testclient import TestClient
+
+    from backend.server import app
+
+    previous = app.state.CONTROLLER
+    app.state.CONTROLLER = LightingController(ROOM, LightingState(ROOM))
+    try:
+        client = TestClient(app)
+        both = {"X-User-Groups": "LG-A,LG-B"}
+        response = client.post("/lighting/targets", json={"target": "room:North", "brightness": 40}, headers=both)
+        assert response.status_code == 200
+        assert response.json()["count"] == 5
+        # The room spans LG-A and LG-B: access to only one of them is not enough.
+        for headers in ({}, {"X-User-Groups": "LG-A"}):
+            partial = client.post("/lighting/targets", json={"target": "room:North", "brightness": 0}, headers=headers)
+            assert partial.status_code == 403
+        assert client.post("/lighting/targets", json={"target": "rack-4", "brightness": 0}).status_code == 403
+        assert app.state.CONTROLLER.last_known_state("rack-0")["brightness"] == 40
+        denied = client.post("/lighting/targets", json={"target": "group:LG-A", "brightness": 40})
+        assert denied.status_code == 403
+        allowed = client.post(
+            "/lighting/targets", json={"target": "group:LG-A", "brightness": 40}, headers={"X-User-Groups": "LG-A"}
+        )
+        assert allowed.json()["count"] == 3
+        assert client.post("/lighting/targets", json={"target": "zone:Z9", "brightness": 1}).status_code == 404
+    finally:
+        app.state.CONTROLLER = previous
+
+
+def test_inventory_loader_reads_scopes(tmp_path):
+    from backend.config import load_lighting_inventory
+
+    path = tmp_path / "inventory.yaml"
+    path.write_text(
+        "- name: Rack\n  model: Bar\n  address: rack\n  control_interface: dali\n  group: LG-A\n  room: North\n",
+        encoding="utf-8",
+    )
+    (fixture,) = load_lighting_inventory(path)
+    assert (fixture.group, fixture.zone, fixture.room) == ("LG-A", None, "North")
+
+
+def test_lighting_changes_endpoint():
+    from fastapi.testclient import TestClient
+
+    from backend.server import app
+
+    state = LightingState(ROOM)
+    previous = app.state.CONTROLLER, app.state.LIGHTING_STATE
+    app.state.CONTROLLER, app.state.LIGHTING_STATE = LightingController(ROOM, state), state
+    try:
+        client = TestClient(app)
+        client.post("/lighting/targets", json={"target": "group:LG-B", "brightness": 30}, headers={"X-User-Groups": "LG-B"})
+        body = client.get("/lighting/changes").json()
+        assert sorted(body["changes"]) == ["rack-3", "rack-4"]
+        assert client.get("/lighting/changes", params={"since": body["version"]}).json()["changes"] == {}
+    finally:
+        app.state.CONTROLLER, app.state.LIGHTING_STATE = previous
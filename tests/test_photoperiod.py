@@ -0,0 +1,115 @@
+from datetime import date, time
+
+import pytest
+
+from backend.device_models import GroupSchedule, PhotoperiodScheduleConfig
+from backend.photoperiod import PhotoperiodCurveCache, PhotoperiodParams, intensity_at
+
+DAY = date(2024, 6, 1)
+
+
+def _schedule(device_id="group:A", start=time(6, 0), hours=12, up=60, down=30, **kwargs):
+    config = PhotoperiodScheduleConfig(start=start, duration_hours=hours, ramp_up_minutes=up, ramp_down_minutes=down)
+    return GroupSchedule(device_id, None, DAY, config, **kwargs)
+
+
+def test_curve_ramps_plateau_and_wraps_midnight():
+    cache = PhotoperiodCurveCache()
+    day, night = cache.curves([_schedule(), _schedule("group:B", start=time(20, 0), hours=8, up=0, down=0)])
+
+    assert len(day) == 1440
+    assert day[6 * 60 - 1] == 0.0
+    assert day[6 * 60 + 30] == 0.5
+    assert day[12 * 60] == 1.0
+    assert day[18 * 60 - 15] == 0.5
+    assert day[18 * 60] == 0.0
+    # 20:00-04:00: the early hours belong to the previous day's cycle.
+    assert night[3 * 60] == 1.0 and night[4 * 60] == 0.0 and night[20 * 60] == 1.0
+
+
+def test_offsets_and_override_shape_the_curve():
+    shifted = _schedule(offsets={"startMin": 60, "durationMin": -120, "intensity": -20, "ppfd": 50})
+    params = PhotoperiodParams.from_schedule(shifted)
+    assert (params.start, params.duration) == (7 * 60, 10 * 60)
+    assert params.at_minute(12 * 60) == 0.8
+    assert params.at_minute(17 * 60) == 0.0
+
+    levels = intensity_at(
+        [
+            _schedule(),
+            _schedule(override={"mode": "off"}),
+            _schedule(override={"mode": "manual", "value": 35}),
+            _schedule(override={"mode": "auto"}),
+        ],
+        12 * 60,
+    )
+    assert [round(level, 6) for level in levels] == [1.0, 0.0, 0.35, 1.0]
+
+    per_schedule = intensity_at([_schedule(), _schedule()], [6 * 60 + 30, 12 * 60])
+    assert list(per_schedule) == [0.5, 1.0]
+    with pytest.raises(ValueError):
+        intensity_at([_schedule()], [0, 1])
+
+
+def test_cache_is_keyed_by_schedule_version():
+    cache = PhotoperiodCurveCache(maxsize=2)
+    schedule = _schedule()
+    cache.curves([schedule, schedule])
+    assert cache.stats() == {"entries": 1, "hits": 0, "misses": 1}
+    cache.curve(schedule)
+    assert cache.stats()["hits"] == 1
+
+    schedule.offsets["intensity"] = -50  # edited in place: a new version
+    assert cache.curve(schedule)[12 * 60] == 0.5
+    assert cache.stats() == {"entries": 2, "hits": 1, "misses": 2}
+
+
+def test_batched_curves_match_per_schedule_evaluation():
+    # Runs against whichever backend is installed (NumPy or the pure-Python
+    # loops), checked minute by minute against PhotoperiodParams on its own.
+    schedules = [
+        _schedule(),
+        _schedule("group:B", start=time(20, 0), hours=8, up=90, down=90, offsets={"intensity": 25}),
+        _schedule("group:C", hours=30, up=0, down=0),
+        _schedule("group:D", override={"mode": "manual", "value": 35}),
+    ]
+    params = [PhotoperiodParams.from_schedule(schedule) for schedule in schedules]
+    curves = PhotoperiodCurveCache().curves(schedules)
+    minutes = [0, 6 * 60 + 30, 20 * 60 + 45, 23 * 60 + 59.5]
+
+    assert len(curves) == len(schedules)
+    for curve, reference in zip(curves, params):
+        assert list(curve) == pytest.approx([reference.at_minute(minute) for minute in range(1440)])
+    for minute in minutes:
+        assert list(intensity_at(schedules, minute)) == pytest.approx([p.at_minute(minute) for p in params])
+    assert list(intensity_at(schedules, minutes)) == pytest.approx(
+        [p.at_minute(minute) for p, minute in zip(params, minutes)]
+    )
+
+
+def test_preview_endpoint_samples_accessible_schedules():
+    from fastapi.testclient import TestClient
+
+    from backend.server import app
+    from backend.state import GroupScheduleStore
+
+    store = GroupScheduleStore()
+    store.upsert(_schedule("group:A"))
+    store.upsert(_schedule("group:B", override={"mode": "off"}))
+    previous = app.state.GROUP_SCHEDULES, app.state.PHOTOPERIOD_CACHE
+    app.state.GROUP_SCHEDULES, app.state.PHOTOPERIOD_CACHE = store, PhotoperiodCurveCache()
+    try:
+        client = TestClient(app)
+        response = client.get(
+            "/sched/preview", params={"date": DAY.isoformat(), "stepMinutes": 360}, headers={"X-User-Groups": "A"}
+        )
+        assert response.status_code == 200
+        body = response.json()
+        assert body["date"] == "2024-06-01" and body["stepMinutes"] == 360
+        (preview,) = body["schedules"]
+        assert preview["deviceId"] == "group:A"
+        assert preview["intensity"] == [0.0, 0.0, 100.0, 0.0]
+        assert preview["current"] is None
+        assert client.get("/sched/preview", params={"group": "B"}, headers={"X-User-Groups": "A"}).status_code == 403
+    finally:
+        app.state.GROUP_SCHEDULES, app.state.PHOTOPERIOD_CACHE = previous
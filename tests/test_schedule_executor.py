@@ -0,0 +1,217 @@
+import asyncio
+from datetime import date, datetime, time, timezone
+
+from backend.config import LightingFixture
+from backend.device_models import GroupSchedule, PhotoperiodScheduleConfig, Schedule
+from backend.lighting import LightingController
+from backend.schedule_executor import ScheduleExecutor
+from backend.state import LightingState
+
+FIXTURES = [
+    LightingFixture("Bay 1", "TopLight", "bay-1", 0, 100, "0-10V", 2700, 6500),
+    LightingFixture("Bay 2", "TopLight", "bay-2", 0, 100, "0-10V", 2700, 6500),
+]
+DAY = datetime(2024, 6, 1, tzinfo=timezone.utc).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _executor(clock):
+    state = LightingState(FIXTURES)
+    executor = ScheduleExecutor(LightingController(FIXTURES, state), clock=clock, tz=timezone.utc)
+    return executor, state
+
+
+def _at(hour: float) -> float:
+    return DAY + hour * 3600
+
+
+def test_fixed_window_fires_on_and_off_including_overnight():
+    clock = FakeClock(_at(5))
+    executor, state = _executor(clock)
+    executor.upsert_schedule(Schedule("s1", "Day", "bay-1", time(6, 0), time(18, 0), 90, 4000))
+    executor.upsert_schedule(Schedule("s2", "Night", "bay-2", time(22, 0), time(2, 0), 40))
+
+    assert executor.next_due() == _at(6)
+    assert executor.run_due(_at(5.5)) == 0
+
+    assert executor.run_due(_at(6)) == 1
+    assert state.get_state("bay-1")["brightness"] == 90
+    assert state.get_state("bay-1")["spectrum"] == 4000
+    assert executor.next_due() == _at(18)
+
+    assert executor.run_due(_at(22)) == 2  # 18:00 off for bay-1, 22:00 on for bay-2
+    assert state.get_state("bay-1")["brightness"] == 0
+    assert state.get_state("bay-2")["brightness"] == 40
+    assert executor.next_due() == _at(26)
+
+
+def test_photoperiod_ramps_in_steps_and_replacement_is_lazy():
+    clock = FakeClock(_at(7))
+    executor, state = _executor(clock)
+    config = PhotoperiodScheduleConfig(start=time(8, 0), duration_hours=12, ramp_up_minutes=10, ramp_down_minutes=0)
+    executor.upsert_group_schedule(GroupSchedule("bay-1", None, date(2024, 6, 1), config))
+
+    levels = []
+    while executor.next_due() < _at(8.5):
+        when = executor.next_due()
+        executor.run_due(when)
+        levels.append(state.get_state("bay-1")["brightness"])
+    assert levels == [10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+    assert executor.next_due() == _at(20)
+
+    # Replacing the schedule supersedes the queued 20:00 transition without a heap scan.
+    clock.now = _at(8.5)
+    shorter = PhotoperiodScheduleConfig(start=time(8, 0), duration_hours=6, ramp_up_minutes=0, ramp_down_minutes=0)
+    executor.upsert_group_schedule(GroupSchedule("bay-1", None, date(2024, 6, 1), shorter))
+    assert executor.next_due() == _at(14)
+    executor.remove_group_schedule("bay-1")
+    assert executor.next_due() is None
+    assert executor.stats()["schedules"] == 0
+
+
+def test_due_photoperiods_are_evaluated_in_one_batch(monkeypatch):
+    from backend import schedule_executor
+
+    calls = []
+    batched = schedule_executor.intensity_at
+
+    def spy(schedules, minutes):
+        calls.append(len(schedules))
+        return batched(schedules, minutes)
+
+    monkeypatch.setattr(schedule_executor, "intensity_at", spy)
+    clock = FakeClock(_at(7))
+    executor, state = _executor(clock)
+    config = PhotoperiodScheduleConfig(start=time(8, 0), duration_hours=12, ramp_up_minutes=0, ramp_down_minutes=0)
+    executor.upsert_group_schedule(GroupSchedule("bay-1", None, date(2024, 6, 1), config, offsets={"intensity": -50}))
+    executor.upsert_group_schedule(GroupSchedule("bay-2", None, date(2024, 6, 1), config))
+
+    assert executor.run_due(_at(8)) == 2
+    assert calls == [2]
+    assert state.get_state("bay-1")["brightness"] == 50
+    assert state.get_state("bay-2")["brightness"] == 100
+    assert executor.run_due(_at(20)) == 2
+    assert calls == [2, 2]
+    assert state.get_state("bay-1")["brightness"] == 0
+
+
+def test_photoperiod_lights_off_survives_a_dst_fall_back():
+    from zoneinfo import ZoneInfo
+
+    new_york = ZoneInfo("America/New_York")
+    evening = datetime(2024, 11, 2, 19, 0, tzinfo=new_york).timestamp()
+    state = LightingState(FIXTURES)
+    executor = ScheduleExecutor(LightingController(FIXTURES, state), clock=FakeClock(evening), tz=new_york)
+    config = PhotoperiodScheduleConfig(start=time(20, 0), duration_hours=10, ramp_up_minutes=0, ramp_down_minutes=0)
+    executor.upsert_group_schedule(GroupSchedule("bay-1", None, date(2024, 11, 2), config))
+
+    executor.run_due(executor.next_due())
+    assert state.get_state("bay-1")["brightness"] == 100
+    # Ten elapsed hours end at 05:00 local once the clocks have gone back an hour.
+    lights_off = executor.next_due()
+    assert datetime.fromtimestamp(lights_off, new_york).hour == 5
+    executor.run_due(lights_off)
+    assert state.get_state("bay-1")["brightness"] == 0
+
+
+def test_late_transitions_apply_the_current_setting():
+    clock = FakeClock(_at(5))
+    executor, state = _executor(clock)
+    executor.upsert_schedule(Schedule("s1", "Day", "bay-1", time(6, 0), time(18, 0), 90))
+    # Host was suspended through the whole window: apply "off", not the stale "on".
+    assert executor.run_due(_at(19)) == 1
+    assert state.get_state("bay-1")["brightness"] == 0
+    assert executor.next_due() == _at(30)
+
+
+def test_run_loop_fires_transitions_on_time():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        executor, state = _executor(lambda: DAY + 6 * 3600 - 0.05 + (loop.time() - start))
+        executor.start()
+        executor.upsert_schedule(Schedule("s1", "Day", "bay-1", time(6, 0), time(18, 0), 70))
+        await asyncio.sleep(0.2)
+        await executor.stop()
+        return executor, state
+
+    executor, state = asyncio.run(scenario())
+    assert state.get_state("bay-1")["brightness"] == 70
+    assert executor.stats()["fired"] == 1
+    assert executor.stats()["maxLatenessMs"] < 100
+
+
+def test_failing_target_does_not_stop_other_transitions_or_the_loop():
+    def resolve(target):
+        if target == "group:gone":
+            raise LookupError(target)
+        return [target]
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        state = LightingState(FIXTURES)
+        executor = ScheduleExecutor(
+            LightingController(FIXTURES, state),
+            resolve_targets=resolve,
+            clock=lambda: DAY + 6 * 3600 - 0.05 + (loop.time() - start),
+            tz=timezone.utc,
+        )
+        executor.start()
+        executor.upsert_schedule(Schedule("bad", "Gone", "group:gone", time(6, 0), time(18, 0), 50))
+        executor.upsert_schedule(Schedule("s1", "Day", "bay-1", time(6, 0), time(18, 0), 70))
+        await asyncio.sleep(0.2)
+        running = not executor._task.done()
+        await executor.stop()
+        return executor, state, running
+
+    executor, state, running = asyncio.run(scenario())
+    assert running
+    assert state.get_state("bay-1")["brightness"] == 70
+    assert executor.stats()["errors"] == 1
+
+
+def test_schedule_delete_endpoints_cancel_pending_transitions():
+    from fastapi.testclient import TestClient
+
+    from backend.server import app
+    from backend.state import GroupScheduleStore, ScheduleStore
+
+    executor, _ = _executor(FakeClock(_at(5)))
+    fixed = Schedule("s1", "Day", "bay-1", time(6, 0), time(18, 0), 90)
+    config = PhotoperiodScheduleConfig(start=time(8, 0), duration_hours=12, ramp_up_minutes=0, ramp_down_minutes=0)
+    ramped = GroupSchedule("group:LG-A", None, date(2024, 6, 1), config)
+    schedules, group_schedules = ScheduleStore(), GroupScheduleStore()
+    schedules.upsert(fixed)
+    group_schedules.upsert(ramped)
+    executor.upsert_schedule(fixed)
+    executor.upsert_group_schedule(ramped)
+
+    names = ("SCHEDULES", "GROUP_SCHEDULES", "SCHEDULE_EXECUTOR")
+    previous = [getattr(app.state, name) for name in names]
+    app.state.SCHEDULES, app.state.GROUP_SCHEDULES, app.state.SCHEDULE_EXECUTOR = schedules, group_schedules, executor
+    try:
+        client = TestClient(app)
+        assert client.delete("/sched", params={"deviceId": "group:LG-A"}).status_code == 403
+        allowed = {"X-User-Groups": "LG-A"}
+        assert client.delete("/sched", params={"deviceId": "group:LG-A"}, headers=allowed).status_code == 200
+        assert group_schedules.get("group:LG-A") is None
+        assert client.delete("/sched", params={"deviceId": "group:LG-A"}, headers=allowed).status_code == 404
+
+        assert client.delete("/schedules/s1").status_code == 403
+        bay = {"X-User-Groups": "bay-1"}
+        assert client.delete("/schedules/s1", headers=bay).status_code == 200
+        assert schedules.list() == [] and client.delete("/schedules/s1", headers=bay).status_code == 404
+    finally:
+        for name, value in zip(names, previous):
+            setattr(app.state, name, value)
+
+    assert executor.stats()["schedules"] == 0
+    assert executor.next_due() is None
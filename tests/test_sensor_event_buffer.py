@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.device_models import SensorEvent
+from backend.state import SensorEventBuffer
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _event(topic: str, second: int) -> SensorEvent:
+    return SensorEvent(topic=topic, payload={"n": second}, received_at=BASE + timedelta(seconds=second))
+
+
+def test_buffer_keeps_latest_per_topic_across_eviction():
+    buffer = SensorEventBuffer(max_events=3)
+    for second, topic in enumerate(["a", "b", "a", "c", "c"]):
+        buffer.add_event(_event(topic, second))
+
+    assert buffer.latest().payload == {"n": 4}
+    assert buffer.latest("a").payload == {"n": 2}
+    assert buffer.latest("b") is None
+    assert [event.payload["n"] for event in buffer.by_topic("c")] == [3, 4]
+    assert [event.payload["n"] for event in buffer.by_topic("c", 1)] == [4]
+
+
+def test_since_returns_newer_events_in_order():
+    buffer = SensorEventBuffer(max_events=10)
+    for second in range(5):
+        buffer.add_event(_event("lux", second))
+
+    assert [event.payload["n"] for event in buffer.since(BASE + timedelta(seconds=2))] == [3, 4]
+    assert buffer.since(BASE + timedelta(seconds=9)) == []
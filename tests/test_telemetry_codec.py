@@ -0,0 +1,89 @@
+import random
+from datetime import datetime, timezone
+
+from backend.state import EnvironmentTelemetryStore
+from backend.telemetry import SAMPLE_DROPPED, SampleRing
+from backend.telemetry_codec import CompressedSeries, decode_timestamps, decode_values, encode_timestamps, encode_values
+
+
+def test_codec_round_trips_timestamps_and_values_bit_exactly():
+    rng = random.Random(3)
+    timestamps = sorted(1_700_000_000 + 5 * index + rng.choice((0, 0, 0, 0.25, -1)) for index in range(1000))
+    values = [round(21 + rng.gauss(0, 0.4), 2) for _ in timestamps]
+    values += [0.0, -0.0, float("inf"), -1e300, 5e-324]
+    timestamps += [timestamps[-1] + 10 ** index for index in range(1, 6)]
+
+    decoded_ts = decode_timestamps(encode_timestamps(timestamps), len(timestamps))
+    assert list(decoded_ts) == [round(ts * 1000) / 1000 for ts in timestamps]
+    decoded_values = decode_values(encode_values(values), len(values))
+    assert [repr(value) for value in decoded_values] == [repr(value) for value in values]
+
+
+def test_compressed_series_matches_sample_ring_semantics():
+    rng = random.Random(11)
+    ring, series = SampleRing(5000), CompressedSeries(block_size=64)
+    timestamps = [1_700_000_000.0 + 5 * index for index in range(1000)]
+    for ts in timestamps:
+        value = round(rng.uniform(400, 900))
+        ring.upsert(ts, value)
+        series.upsert(ts, value)
+    for ts in (timestamps[3] + 1, timestamps[500], timestamps[998] + 2, timestamps[0] - 7):
+        assert series.upsert(ts, -1.0) == ring.upsert(ts, -1.0)
+
+    assert len(series) == len(ring)
+    bounds = ring.bounds(timestamps[100], timestamps[900])
+    assert series.bounds(timestamps[100], timestamps[900]) == bounds
+    assert [list(column) for column in series.columns(*bounds)] == [list(column) for column in ring.columns(*bounds)]
+    assert series.drop_older_than(timestamps[250]) == ring.drop_older_than(timestamps[250])
+    assert list(series.iter_newest_first(timestamps[700])) == list(ring.iter_newest_first(timestamps[700]))
+    assert series.newest() == ring.newest()
+    assert series.nbytes < len(series) * 16
+
+
+def test_compressed_series_evicts_oldest_blocks_past_budget():
+    series = CompressedSeries(budget_bytes=400, block_size=32)
+    for index in range(2000):
+        series.upsert(1_700_000_000.0 + index, float(index % 7))
+
+    assert series.full
+    assert series.oldest_ts() > 1_700_000_000.0
+    assert series.nbytes < 400 + 32 * 16
+
+
+def test_compressed_series_inserts_late_samples_before_any_block_is_sealed():
+    series = CompressedSeries(1024)
+    series.upsert(100.0, 1.0)
+    series.upsert(200.0, 2.0)
+
+    assert series.upsert(50.0, 3.0) is None
+    assert list(series.iter_newest_first()) == [(200.0, 2.0), (100.0, 1.0), (50.0, 3.0)]
+    assert len(series) == 3
+
+
+def test_samples_older_than_evicted_history_are_dropped_not_counted():
+    series = CompressedSeries(budget_bytes=400, block_size=32)
+    for index in range(2000):
+        series.upsert(1_700_000_000.0 + index, float(index % 7))
+    assert series.upsert(1_700_000_000.0, 1.0) is SAMPLE_DROPPED
+
+    store = EnvironmentTelemetryStore(max_samples=10, compressed_budget_bytes=1024)
+    now = datetime.now(timezone.utc).timestamp()
+    for index in range(800):
+        store.add_reading("Room A", datetime.fromtimestamp(now - 800 + index, timezone.utc), {"rh": 40 + index * 0.37 % 20})
+    before = store.get_zone("Room A", stats_only=True)["sensors"]["rh"]["stats"]
+    store.add_reading("Room A", datetime.fromtimestamp(now - 900, timezone.utc), {"rh": 90})
+    after = store.get_zone("Room A", stats_only=True)["sensors"]["rh"]["stats"]
+    assert after == before
+
+
+def test_store_serves_full_resolution_history_from_compressed_blocks():
+    store = EnvironmentTelemetryStore(max_samples=10, compressed_budget_bytes=64 * 1024)
+    now = datetime.now(timezone.utc).timestamp()
+    for index in range(600):
+        moment = datetime.fromtimestamp(now - (600 - index) * 5, timezone.utc)
+        store.add_reading("Room A", moment, {"rh": 50 + index % 3})
+
+    rh = store.get_zone("Room A", range_seconds=3600)["sensors"]["rh"]
+    assert rh["resolution"] == "raw"
+    assert len(rh["history"]) == 600
+    assert rh["history"][:3] == [52.0, 51.0, 50.0]
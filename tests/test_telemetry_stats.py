@@ -0,0 +1,61 @@
+import random
+import statistics
+
+from backend.telemetry_stats import QuantileSketch, RunningStats, WindowedStats
+
+
+def test_running_stats_match_exact_statistics_and_merge():
+    rng = random.Random(7)
+    values = [rng.gauss(22.0, 1.5) for _ in range(2000)]
+    left, right = RunningStats(), RunningStats()
+    for value in values[:700]:
+        left.add(value)
+    for value in values[700:]:
+        right.add(value)
+    left.merge(right)
+
+    summary = left.summary()
+    assert summary["count"] == 2000
+    assert abs(summary["mean"] - statistics.fmean(values)) < 1e-9
+    assert abs(summary["stddev"] - statistics.stdev(values)) < 1e-9
+    assert summary["min"] == min(values) and summary["max"] == max(values)
+    exact_p95 = sorted(values)[int(0.95 * 1999)]
+    assert abs(summary["p95"] - exact_p95) <= 0.011 * abs(exact_p95)
+
+
+def test_quantile_sketch_handles_negative_zero_and_removal():
+    sketch = QuantileSketch()
+    for value in (-10.0, -5.0, 0.0, 5.0, 10.0):
+        sketch.add(value)
+    assert abs(sketch.quantile(0.0) + 10.0) < 0.2
+    assert sketch.quantile(0.5) == 0.0
+    sketch.remove(10.0)
+    assert abs(sketch.quantile(1.0) - 5.0) < 0.1
+
+
+def test_quantile_sketch_removal_after_collapse_keeps_counts_consistent():
+    sketch = QuantileSketch(max_buckets=4)
+    low = [1.0, 2.0, 4.0, 8.0]
+    for value in low + [100.0, 200.0]:
+        sketch.add(value)
+    for value in low:
+        sketch.remove(value)
+
+    assert sketch.count == 2
+    assert sum(sketch._positive.values()) == 2
+    assert abs(sketch.quantile(0.0) - 100.0) < 2.0
+    sketch.remove(100.0)
+    sketch.remove(200.0)
+    assert sketch.count == 0 and not sketch._positive
+
+
+def test_windowed_stats_roll_off_old_slots_and_replace_duplicates():
+    window = WindowedStats(3600, slots=12)
+    for minute in range(120):
+        window.add(minute * 60.0, float(minute))
+    window.replace(119 * 60.0, 119.0, 1000.0)
+
+    recent = window.merged(119 * 60.0)
+    assert recent.count == 60
+    assert recent.maximum == 1000.0
+    assert recent.minimum == 60.0
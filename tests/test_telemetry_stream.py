@@ -0,0 +1,65 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from backend.state import EnvironmentTelemetryStore
+from backend.telemetry_stream import TelemetryBroadcaster, sse_events
+
+
+def _at(seconds_ago: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+
+
+def test_store_emits_one_delta_per_scope_with_newest_sample():
+    store = EnvironmentTelemetryStore()
+    deltas = []
+    store.subscribe(deltas.append)
+
+    store.add_reading("Room A", _at(60), {"temperature": 21.5})
+    store.add_readings(
+        [
+            ("Room A", _at(30), {"rh": 50}, None),
+            ("Room A", _at(20), {"rh": 52}, None),
+            ("Room B", _at(20), {"co2": 700}, None),
+        ]
+    )
+
+    assert [delta["scope"] for delta in deltas] == ["Room A", "Room A", "Room B"]
+    assert deltas[0]["sensors"]["tempC"]["current"] == 21.5
+    rh = deltas[1]["sensors"]["rh"]
+    assert rh["sample"]["value"] == 52.0 and rh["current"] == 52.0
+    assert set(deltas[1]["sensors"]) == {"rh"}
+
+    store.unsubscribe(deltas.append)
+    store.add_reading("Room A", _at(5), {"rh": 53})
+    assert len(deltas) == 3
+
+
+def test_broadcaster_filters_scopes_and_drops_slow_subscribers():
+    async def scenario():
+        broadcaster = TelemetryBroadcaster(queue_size=2)
+        broadcaster.attach(asyncio.get_running_loop())
+        follower = broadcaster.subscribe(["room a"])
+        slow = broadcaster.subscribe()
+
+        for value in range(2):
+            broadcaster.publish({"scope": "Room A", "name": "Room A", "value": value})
+        broadcaster.publish({"scope": "Room B", "name": "Room B", "value": 9})
+
+        assert slow.dropped and not follower.dropped
+        assert broadcaster.subscriber_count() == 1
+
+        async def never_disconnected():
+            return False
+
+        chunks = []
+        async for chunk in sse_events(slow, never_disconnected, keepalive_seconds=0.01):
+            chunks.append(chunk)
+        assert chunks[-1].startswith("event: overflow")
+
+        stream = sse_events(follower, never_disconnected, keepalive_seconds=0.01)
+        assert (await stream.__anext__()).startswith("retry:")
+        first = await stream.__anext__()
+        assert json.loads(first.split("data: ", 1)[1])["value"] == 0
+
+    asyncio.run(scenario())